@@ -0,0 +1,451 @@
+"""
+Motor de respuestas con varios backends y peticiones de cobertura (hedging)
+
+Se pregunta primero a Perplexity. Si no ha respondido cuando se supera el
+percentil 95 de su latencia reciente, se lanza la misma pregunta a Gemini.
+Gana la primera respuesta válida y la otra petición se cancela (se cortan
+sus sockets en vuelo). Los proveedores marcados como caídos por el circuit
+breaker se saltan, y si ninguno responde se usa la última respuesta
+guardada para la misma pregunta.
+
+Con historial de conversación, los turnos anteriores se envían como
+mensajes previos para que las preguntas de seguimiento tengan contexto.
+"""
+
+import logging
+import socket
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from cancellation import CancelToken, Cancelled
+from config import Config
+from metrics import metrics
+from resilience import resilience
+
+
+log = logging.getLogger('jarvis')
+
+
+class AnswerError(Exception):
+    """Fallo de un backend de respuestas"""
+
+    def __init__(self, message, timeout=False):
+        super().__init__(message)
+        self.timeout = timeout
+
+
+class AbortableAdapter(HTTPAdapter):
+    """Adaptador HTTP que permite cortar desde otro hilo las conexiones en vuelo"""
+
+    def __init__(self, *args, **kwargs):
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        def tracked(base):
+            class TrackedConnection(base):
+                def connect(self):
+                    super().connect()
+                    with adapter._lock:
+                        adapter._connections.add(self)
+            return TrackedConnection
+
+        class TrackedHTTPPool(HTTPConnectionPool):
+            ConnectionCls = tracked(HTTPConnection)
+
+        class TrackedHTTPSPool(HTTPSConnectionPool):
+            ConnectionCls = tracked(HTTPSConnection)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TrackedHTTPPool,
+            'https': TrackedHTTPSPool
+        }
+
+    def abort(self):
+        """Cierra los sockets abiertos; la petición en curso falla al instante"""
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            sock = getattr(conn, 'sock', None)
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+                metrics.inc('cancel.http_aborted')
+            except OSError:
+                pass
+
+
+class PerplexityBackend:
+    """Búsqueda con la API de Perplexity"""
+
+    name = 'perplexity'
+
+    def __init__(self, url=None, api_key=None, timeout=None):
+        self.url = url or Config.PERPLEXITY_URL
+        self.api_key = api_key or Config.PERPLEXITY_KEY
+        self.timeout = timeout or Config.ANSWER_TIMEOUT
+
+    def ask(self, query, call, timeout=None, history=None):
+        """
+        Pregunta a Perplexity
+
+        Args:
+            query: Pregunta del usuario
+            call: CancelToken de la petición
+            timeout: Plazo en segundos (por defecto el configurado)
+            history: Mensajes previos user/assistant (opcional)
+
+        Returns:
+            tuple: (respuesta, citations)
+
+        Raises:
+            AnswerError: Si la petición falla o se cancela
+        """
+        payload = {
+            "model": Config.PERPLEXITY_MODEL,
+            "messages": [
+                {"role": "system", "content": Config.SYSTEM_PROMPT},
+                *(history or []),
+                {"role": "user", "content": query}
+            ],
+            "temperature": Config.PERPLEXITY_TEMPERATURE,
+            "max_tokens": Config.PERPLEXITY_MAX_TOKENS
+        }
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        # Sesión propia por petición para poder cortar su conexión
+        session = requests.Session()
+        adapter = AbortableAdapter()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        call.on_cancel(adapter.abort)
+
+        try:
+            response = session.post(
+                self.url,
+                json=payload,
+                headers=headers,
+                timeout=min(timeout or self.timeout, self.timeout)
+            )
+
+            if response.status_code != 200:
+                log.error(f"❌ Status code: {response.status_code}")
+                log.error(f"❌ Response: {response.text}")
+            response.raise_for_status()
+
+            result = response.json()
+            return result['choices'][0]['message']['content'], result.get('citations', [])
+        except requests.exceptions.Timeout:
+            raise AnswerError("Timeout en Perplexity", timeout=True)
+        except requests.exceptions.RequestException as e:
+            if call.cancelled:
+                raise AnswerError("Perplexity cancelado")
+            raise AnswerError(f"Error en Perplexity API: {e}")
+        except (KeyError, IndexError, ValueError) as e:
+            raise AnswerError(f"Error procesando respuesta de Perplexity: {e}")
+        finally:
+            session.close()
+
+
+class GeminiBackend:
+    """Respuestas con el modelo Gemini ya configurado"""
+
+    name = 'gemini'
+
+    def __init__(self, model, timeout=None):
+        self.model = model
+        self.timeout = timeout or Config.ANSWER_TIMEOUT
+
+    def ask(self, query, call, timeout=None, history=None):
+        """
+        Pregunta a Gemini (sin citas)
+
+        Returns:
+            tuple: (respuesta, [])
+
+        Raises:
+            AnswerError: Si la petición falla
+        """
+        contents = query
+        if history:
+            # Gemini usa 'model' en lugar de 'assistant'
+            contents = [
+                {'role': 'model' if m['role'] == 'assistant' else 'user', 'parts': [m['content']]}
+                for m in history
+            ]
+            contents.append({'role': 'user', 'parts': [query]})
+
+        try:
+            response = self.model.generate_content(
+                contents,
+                generation_config={
+                    'temperature': Config.PERPLEXITY_TEMPERATURE,
+                    'max_output_tokens': Config.PERPLEXITY_MAX_TOKENS
+                },
+                request_options={'timeout': min(timeout or self.timeout, self.timeout)}
+            )
+            answer = response.text
+        except Exception as e:
+            raise AnswerError(f"Error en Gemini: {e}", timeout='deadline' in str(e).lower())
+
+        if call.cancelled:
+            raise AnswerError("Gemini cancelado")
+        return answer, []
+
+
+class AnswerCache:
+    """Últimas respuestas correctas, para responder si todos los proveedores fallan"""
+
+    def __init__(self, max_entries=100):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query):
+        return ' '.join(query.lower().split())
+
+    def put(self, query, answer, citations):
+        with self._lock:
+            key = self._key(query)
+            self.entries[key] = (answer, citations)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get(self, query):
+        with self._lock:
+            return self.entries.get(self._key(query))
+
+
+class AnswerEngine:
+    """Pregunta al backend principal y cubre con los secundarios si tarda"""
+
+    def __init__(self, primary, hedges=(), sessions=1):
+        """
+        Args:
+            primary: Backend principal
+            hedges: Backends de cobertura, en orden
+            sessions: Preguntas simultáneas previstas (modo servidor)
+        """
+        self.primary = primary
+        self.hedges = list(hedges)
+        self.cache = AnswerCache()
+        self.executor = ThreadPoolExecutor(max_workers=4 * sessions, thread_name_prefix='answer')
+
+    def hedge_deadline(self):
+        """Segundos a esperar al principal antes de lanzar la cobertura"""
+        p95 = resilience.endpoint(self.primary.name).percentile(95)
+        if p95 is None:
+            return Config.HEDGE_INITIAL_DEADLINE
+        return min(Config.HEDGE_MAX_DEADLINE, max(Config.HEDGE_MIN_DEADLINE, p95))
+
+    def _run(self, backend, query, call, history=None):
+        """Ejecuta un backend con plazo adaptativo, registrando su salud"""
+        endpoint = resilience.endpoint(backend.name)
+        start = time.perf_counter()
+        try:
+            result = backend.ask(query, call, endpoint.deadline(), history=history)
+        except AnswerError:
+            if call.cancelled:
+                # Cancelada por perder la carrera: no es culpa del proveedor
+                endpoint.breaker.release()
+            else:
+                endpoint.breaker.record_failure()
+            raise
+
+        elapsed = time.perf_counter() - start
+        endpoint.breaker.record_success()
+        endpoint.record_latency(elapsed)
+        metrics.set_gauge(f'answer.{backend.name}.last_ms', elapsed * 1000)
+        return result
+
+    def ask(self, query, token=None, history=None):
+        """
+        Obtiene la primera respuesta válida
+
+        Args:
+            query: Pregunta del usuario
+            token: CancelToken del turno (cancelarlo aborta todas las peticiones)
+            history: Mensajes previos de la conversación (opcional)
+
+        Returns:
+            tuple: (respuesta, citations, nombre del backend)
+
+        Raises:
+            AnswerError: Si todos los backends fallan y no hay respuesta guardada
+            Cancelled: Si el turno se cancela antes de tener respuesta
+        """
+        # Futuro centinela para despertar la espera al cancelar el turno
+        cancel_waiter = Future()
+        if token is not None:
+            token.on_cancel(lambda: cancel_waiter.done() or cancel_waiter.set_result(None))
+
+        calls = {}
+        pending = set()
+        remaining = [self.primary] + self.hedges
+        last_error = None
+
+        def launch_next():
+            """Lanza el siguiente backend disponible (salta los caídos)"""
+            nonlocal last_error
+            while remaining:
+                backend = remaining.pop(0)
+                if not resilience.endpoint(backend.name).breaker.allow():
+                    last_error = AnswerError(f"{backend.name} no disponible")
+                    continue
+                call = token.child() if token is not None else CancelToken()
+                future = self.executor.submit(self._run, backend, query, call, history)
+                calls[future] = (backend, call)
+                pending.add(future)
+                return True
+            return False
+
+        launch_next()
+        deadline = time.perf_counter() + self.hedge_deadline()
+
+        try:
+            while pending:
+                timeout = None
+                if remaining:
+                    timeout = max(0.0, deadline - time.perf_counter())
+
+                done, _ = wait(pending | {cancel_waiter}, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if cancel_waiter in done:
+                    raise Cancelled(token.reason)
+
+                if not done:
+                    # El principal tarda más de lo habitual: lanzar cobertura
+                    if launch_next():
+                        log.info("⏳ Respuesta lenta, consultando también otro proveedor...")
+                        metrics.inc('answer.hedges')
+                    continue
+
+                for future in done:
+                    pending.discard(future)
+                    backend, _ = calls[future]
+                    try:
+                        answer, citations = future.result()
+                        if not answer:
+                            raise AnswerError(f"Respuesta vacía de {backend.name}")
+                    except AnswerError as e:
+                        log.warning(f"⚠️ {e}")
+                        metrics.inc(f'answer.{backend.name}.failures')
+                        last_error = e
+                        # Fallo rápido: no esperar al plazo para la cobertura
+                        if not pending:
+                            launch_next()
+                        continue
+
+                    metrics.inc(f'answer.wins.{backend.name}')
+                    # Con historial la respuesta depende del contexto: no se guarda
+                    if not history:
+                        self.cache.put(query, answer, citations)
+                    return answer, citations, backend.name
+        finally:
+            # Cancelar las peticiones perdedoras que siguen en curso (las que
+            # ya terminaron no gastan nada más)
+            for future in pending:
+                if future.done():
+                    continue
+                backend, call = calls[future]
+                if call.cancel('hedge'):
+                    metrics.inc('answer.cancelled')
+
+        # Todos los proveedores fallaron: usar una respuesta guardada si existe
+        cached = self.cache.get(query) if not history else None
+        if cached:
+            log.info("📦 Proveedores no disponibles, usando respuesta guardada")
+            metrics.inc('answer.cache_fallbacks')
+            return cached[0], cached[1], 'cache'
+
+        raise last_error or AnswerError("Sin respuesta")
+
+    def shutdown(self):
+        """Libera el pool de hilos"""
+        self.executor.shutdown(wait=False)
+
+
+def _stub_server(delay, answer):
+    """Servidor local que imita la API de Perplexity con latencia inyectada"""
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(delay[0])
+            body = json.dumps({'choices': [{'message': {'content': answer}}]}).encode()
+            try:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    # Comprobación con servidores locales: el principal se vuelve lento
+    primary_delay = [0.05]
+    primary_server = _stub_server(primary_delay, 'principal')
+    hedge_server = _stub_server([0.1], 'cobertura')
+
+    def stub_backend(name, server):
+        backend = PerplexityBackend(
+            url=f"http://127.0.0.1:{server.server_address[1]}/",
+            api_key='stub',
+            timeout=10
+        )
+        backend.name = name
+        return backend
+
+    engine = AnswerEngine(
+        stub_backend('principal', primary_server),
+        [stub_backend('cobertura', hedge_server)]
+    )
+
+    for _ in range(10):
+        engine.ask('calentamiento')
+    print(f"Plazo de cobertura tras calentar: {engine.hedge_deadline() * 1000:.0f} ms")
+
+    primary_delay[0] = 5.0
+    start = time.perf_counter()
+    answer, _, winner = engine.ask('pregunta')
+    elapsed = time.perf_counter() - start
+    print(f"Ganador: {winner} en {elapsed * 1000:.0f} ms")
+
+    # La cobertura debe ganar poco después del plazo, sin esperar al principal
+    ok = winner == 'cobertura' and elapsed < Config.HEDGE_MAX_DEADLINE + 1.0
+    metrics.report()
+    print("✅ Hedging correcto" if ok else "❌ Hedging incorrecto")
+    engine.shutdown()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,151 @@
+"""
+Extracción vectorizada de características de audio (solo NumPy)
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+
+def pcm_to_float(pcm):
+    """
+    Convierte audio int16 (bytes o array) a float32 en [-1, 1]
+
+    Args:
+        pcm: Bytes o array numpy int16
+
+    Returns:
+        np.ndarray: Muestras float32
+    """
+    if isinstance(pcm, (bytes, bytearray, memoryview)):
+        pcm = np.frombuffer(pcm, dtype=np.int16)
+    return np.asarray(pcm, dtype=np.float32) / 32768.0
+
+
+def frame_signal(samples, frame_length, hop_length):
+    """
+    Divide la señal en frames solapados (vista sin copia)
+
+    Returns:
+        np.ndarray: Matriz (n_frames, frame_length)
+    """
+    samples = np.ascontiguousarray(samples)
+    if len(samples) < frame_length:
+        samples = np.pad(samples, (0, frame_length - len(samples)))
+    n_frames = 1 + (len(samples) - frame_length) // hop_length
+    return np.lib.stride_tricks.as_strided(
+        samples,
+        shape=(n_frames, frame_length),
+        strides=(samples.strides[0] * hop_length, samples.strides[0]),
+        writeable=False
+    )
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(n_fft, n_mels, sample_rate):
+    """Banco de filtros triangulares en escala mel (n_mels, n_fft // 2 + 1)"""
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+
+    filters = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            filters[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            filters[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return filters
+
+
+@lru_cache(maxsize=8)
+def _dct_matrix(n_mfcc, n_mels):
+    """Matriz DCT-II ortonormal para calcular MFCC"""
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)[:, None]
+    matrix = np.cos(np.pi / n_mels * (n + 0.5) * k) * np.sqrt(2.0 / n_mels)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+def log_mel_spectrogram(samples, sample_rate=16000, n_mels=40,
+                        frame_ms=25, hop_ms=10):
+    """
+    Espectrograma log-mel de la señal
+
+    Args:
+        samples: Muestras float32
+        sample_rate: Frecuencia de muestreo
+        n_mels: Número de bandas mel
+
+    Returns:
+        np.ndarray: Matriz (n_frames, n_mels)
+    """
+    frame_length = int(sample_rate * frame_ms / 1000)
+    hop_length = int(sample_rate * hop_ms / 1000)
+    n_fft = 1 << (frame_length - 1).bit_length()
+
+    frames = frame_signal(samples, frame_length, hop_length) * np.hanning(frame_length)
+    power = np.abs(np.fft.rfft(frames, n=n_fft)) ** 2
+    mel = power @ mel_filterbank(n_fft, n_mels, sample_rate).T
+    return np.log(mel + 1e-10).astype(np.float32)
+
+
+def mfcc(samples, sample_rate=16000, n_mfcc=13, n_mels=40):
+    """
+    Coeficientes cepstrales en escala mel con normalización de media
+
+    Returns:
+        np.ndarray: Matriz (n_frames, n_mfcc)
+    """
+    log_mel = log_mel_spectrogram(samples, sample_rate, n_mels)
+    coeffs = log_mel @ _dct_matrix(n_mfcc, n_mels).T
+    return coeffs - coeffs.mean(axis=0)
+
+
+def trim_to_energy(samples, sample_rate=16000, margin_db=30.0):
+    """
+    Recorta los extremos de baja energía de la señal
+
+    Args:
+        samples: Muestras float32
+        margin_db: dB por debajo del pico que se consideran silencio
+
+    Returns:
+        np.ndarray: Muestras recortadas
+    """
+    hop = int(sample_rate * 0.01)
+    frames = frame_signal(samples, hop, hop)
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-12)
+    active = np.flatnonzero(energy_db > energy_db.max() - margin_db)
+    if len(active) == 0:
+        return samples
+    return samples[active[0] * hop:(active[-1] + 1) * hop]
+
+
+def fixed_length_embedding(samples, sample_rate=16000, steps=24, n_mels=32):
+    """
+    Embedding de longitud fija: log-mel normalizado y remuestreado en el tiempo
+
+    Args:
+        samples: Muestras float32 (una palabra o frase corta)
+        steps: Número de pasos temporales del embedding
+
+    Returns:
+        np.ndarray: Vector normalizado (steps * n_mels,)
+    """
+    log_mel = log_mel_spectrogram(trim_to_energy(samples, sample_rate), sample_rate, n_mels)
+    log_mel = log_mel - log_mel.mean(axis=0)
+
+    # Interpolar cada banda a un número fijo de pasos temporales
+    source = np.linspace(0, 1, len(log_mel))
+    target = np.linspace(0, 1, steps)
+    resampled = np.stack([np.interp(target, source, log_mel[:, b]) for b in range(n_mels)], axis=1)
+
+    vector = resampled.ravel()
+    return vector / (np.linalg.norm(vector) + 1e-10)
@@ -0,0 +1,408 @@
+"""
+Front-end de audio en un proceso aparte
+
+El micrófono, Porcupine y el VAD viven en su propio proceso (con su propio
+GIL y, en la Raspberry Pi, en otro núcleo), de modo que ni el JSON de las
+respuestas ni la decodificación del TTS pueden retrasar la lectura del
+micrófono. Los frames de 30 ms, junto con la decisión del VAD, se publican
+en un buffer circular de multiprocessing.shared_memory que el asistente lee
+a su ritmo; los eventos (wake word, errores) llegan por una cola.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import struct
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from audio_monitor import PUBLISH_EVERY, MonitoredInput
+from config import Config
+from flight_recorder import recorder
+from metrics import metrics
+from vad_stage import VadStage
+
+
+FRAME_SAMPLES = 480  # 30 ms a 16 kHz (tamaño válido para webrtcvad)
+
+
+class AudioFrontendError(Exception):
+    """El proceso de audio no arrancó o se ha detenido"""
+
+
+def _attach_shared_memory(name):
+    """
+    Abre un bloque existente sin registrarlo de nuevo
+
+    Con spawn el hijo comparte el resource_tracker del padre, que es quien
+    crea y borra el bloque. En Python < 3.13 no existe track=False, pero
+    registrar el mismo nombre dos veces no tiene efecto.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedRing:
+    """
+    Buffer circular de frames PCM en memoria compartida
+
+    Un solo escritor (el proceso de audio) y cualquier número de lectores,
+    cada uno con su propio cursor. Cada hueco guarda el número de secuencia
+    del frame que contiene; el escritor lo invalida antes de sobrescribirlo,
+    así que un lector detecta si el frame cambió mientras lo copiaba.
+    """
+
+    # Cabecera: siguiente secuencia y estadísticas del micrófono que publica el proceso de audio
+    HEADER_FIELDS = 8
+    SEQ, OVERRUNS, VAD_ERRORS, BUFFER_FRAMES, QUEUE_US_MAX, READ_US_AVG, READ_US_MAX = range(7)
+    WRITING = np.uint64(2 ** 64 - 1)
+
+    def __init__(self, slots, frame_samples=FRAME_SAMPLES, name=None):
+        """
+        Args:
+            slots: Frames que caben en el buffer
+            frame_samples: Muestras int16 por frame
+            name: Bloque existente al que conectarse (None = crear uno nuevo)
+        """
+        self.slots = slots
+        self.frame_samples = frame_samples
+        self.owner = name is None
+
+        size = 8 * self.HEADER_FIELDS + 8 * slots + 2 * slots * frame_samples + slots
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = _attach_shared_memory(name)
+
+        buf = self.shm.buf
+        offset = 0
+        self.header = np.ndarray((self.HEADER_FIELDS,), dtype=np.uint64, buffer=buf, offset=offset)
+        offset += 8 * self.HEADER_FIELDS
+        self.slot_seq = np.ndarray((slots,), dtype=np.uint64, buffer=buf, offset=offset)
+        offset += 8 * slots
+        self.pcm = np.ndarray((slots, frame_samples), dtype=np.int16, buffer=buf, offset=offset)
+        offset += 2 * slots * frame_samples
+        self.flags = np.ndarray((slots,), dtype=np.uint8, buffer=buf, offset=offset)
+
+        if self.owner:
+            self.header[:] = 0
+            self.slot_seq[:] = self.WRITING
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def write_seq(self):
+        """Secuencia del próximo frame que se escribirá"""
+        return int(self.header[self.SEQ])
+
+    def write(self, frame, speech):
+        """Publica un frame (array int16 de frame_samples muestras)"""
+        seq = int(self.header[self.SEQ])
+        idx = seq % self.slots
+        self.slot_seq[idx] = self.WRITING
+        self.pcm[idx] = frame
+        self.flags[idx] = speech
+        self.slot_seq[idx] = seq
+        self.header[self.SEQ] = seq + 1
+
+    def frame(self, seq):
+        """
+        Copia un frame
+
+        Returns:
+            tuple or None: (pcm, es_voz), o None si el hueco ya contiene otro frame
+        """
+        idx = seq % self.slots
+        pcm = self.pcm[idx].tobytes()
+        speech = bool(self.flags[idx])
+        if int(self.slot_seq[idx]) != seq:
+            return None
+        return pcm, speech
+
+    def recent(self, end_seq, count):
+        """Audio de los count frames anteriores a end_seq que sigan disponibles"""
+        start = max(0, end_seq - count, self.write_seq - self.slots + 1)
+        frames = [self.frame(seq) for seq in range(start, end_seq)]
+        return b''.join(f[0] for f in frames if f is not None)
+
+    def close(self):
+        # Las vistas de numpy deben soltarse antes de cerrar el bloque
+        del self.header, self.slot_seq, self.pcm, self.flags
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingReader:
+    """
+    Cursor de lectura sobre el buffer circular
+
+    Misma interfaz que MicrophoneCapture: read() -> (pcm, es_voz).
+    """
+
+    POLL_INTERVAL = 0.005
+
+    def __init__(self, ring, seq=None, check=None):
+        """
+        Args:
+            ring: SharedRing
+            seq: Primer frame a leer (None = a partir de ahora)
+            check: Función que lanza una excepción si el escritor ha muerto
+        """
+        self.ring = ring
+        self.seq = ring.write_seq if seq is None else seq
+        self.check = check
+
+    def read(self, timeout=1.0):
+        """
+        Siguiente frame, esperando a que llegue
+
+        Returns:
+            tuple: (pcm, es_voz)
+        """
+        waited = 0.0
+        while True:
+            head = self.ring.write_seq
+            if head - self.seq >= self.ring.slots:
+                # El lector se quedó atrás una vuelta entera: saltar a la mitad del buffer
+                skip_to = head - self.ring.slots // 2
+                metrics.inc('audio_frontend.reader_overruns')
+                metrics.inc('audio_frontend.frames_skipped', skip_to - self.seq)
+                self.seq = skip_to
+
+            if self.seq < head:
+                frame = self.ring.frame(self.seq)
+                if frame is not None:
+                    # Retraso del lector respecto al micrófono
+                    metrics.set_gauge('audio_frontend.reader_lag_frames', head - self.seq - 1)
+                    self.seq += 1
+                    return frame
+                continue
+
+            time.sleep(self.POLL_INTERVAL)
+            waited += self.POLL_INTERVAL
+            if waited >= timeout:
+                waited = 0.0
+                if self.check:
+                    self.check()
+
+    def close(self):
+        pass
+
+
+class MicrophoneCapture:
+    """Captura con VAD en el propio proceso (sin front-end de audio)"""
+
+    def __init__(self, pa, vad, sample_rate=None, frame_samples=FRAME_SAMPLES):
+        """
+        Args:
+            pa: Instancia de PyAudio
+            vad: VadStage (se conserva entre capturas para no perder el suelo de ruido)
+        """
+        self.vad = vad
+        self.sample_rate = sample_rate or Config.SAMPLE_RATE
+        self.stream = MonitoredInput(pa, self.sample_rate, frame_samples, name='capture')
+        self.ready = deque()
+
+    def read(self):
+        if not self.ready:
+            # Los frames que ya esperan en el driver se analizan en el mismo bloque
+            frames = [self.stream.read() for _ in range(1 + self.stream.available_frames())]
+            frames, speech = self.vad.process(frames)
+            self.ready.extend(zip(frames, speech.tolist()))
+        return self.ready.popleft()
+
+    def close(self):
+        self.stream.close()
+
+
+def _frontend_main(shm_name, slots, frame_samples, events, stop):
+    """Proceso de audio: micrófono -> VadStage -> buffer circular, y Porcupine -> eventos"""
+    # Ctrl+C llega a todo el grupo; el cierre lo ordena el proceso principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    ring = SharedRing(slots, frame_samples, name=shm_name)
+    try:
+        import pvporcupine
+        import pyaudio
+        from low_power import EnergyGate
+
+        if Config.AUDIO_FRONTEND_NICE:
+            try:
+                os.nice(Config.AUDIO_FRONTEND_NICE)
+            except (OSError, AttributeError):
+                pass
+
+        porcupine = pvporcupine.create(
+            access_key=Config.PICOVOICE_KEY,
+            keywords=[Config.WAKE_WORD],
+            sensitivities=[0.7]
+        )
+        vad = VadStage(porcupine.sample_rate, frame_samples)
+        gate = EnergyGate(porcupine.frame_length, porcupine.sample_rate) if Config.LOW_POWER_MODE else None
+        pa = pyaudio.PyAudio()
+        stream = MonitoredInput(pa, porcupine.sample_rate, porcupine.frame_length, name='frontend')
+    except Exception as e:
+        events.put({'type': 'error', 'message': str(e)})
+        ring.close()
+        return
+
+    # El asistente crea el archivo del grabador de vuelo; aquí se escribe el PCM
+    if Config.FLIGHT_RECORDER_ENABLED:
+        try:
+            recorder.attach()
+        except (OSError, ValueError):
+            pass
+
+    events.put({'type': 'ready', 'sample_rate': porcupine.sample_rate, 'pid': os.getpid()})
+
+    frame_length = porcupine.frame_length
+    unpack = struct.Struct("h" * frame_length).unpack_from
+    process = lambda pcm: porcupine.process(unpack(pcm))
+    pending = np.zeros(0, dtype=np.int16)
+
+    header = ring.header
+    try:
+        while not stop.is_set():
+            # Los desbordamientos se cuentan (y amplían el buffer) en MonitoredInput
+            pcm = stream.read()
+            if stream.reads % PUBLISH_EVERY == 0:
+                # Las métricas de este proceso se publican en la cabecera compartida
+                header[ring.OVERRUNS] = stream.overruns
+                header[ring.BUFFER_FRAMES] = stream.buffer_frames
+                header[ring.QUEUE_US_MAX] = int(stream.queue_ms_max * 1000)
+                header[ring.READ_US_AVG] = int(stream.read_ms_avg * 1000)
+                header[ring.READ_US_MAX] = int(stream.read_ms_max * 1000)
+
+            # Frames de 30 ms completos, analizados juntos, con su decisión de VAD
+            pending = np.concatenate([pending, np.frombuffer(pcm, dtype=np.int16)])
+            complete = len(pending) // frame_samples
+            if complete:
+                frames = [pending[i * frame_samples:(i + 1) * frame_samples].tobytes() for i in range(complete)]
+                pending = pending[complete * frame_samples:]
+                frames, speech = vad.process(frames)
+                for frame, is_speech in zip(frames, speech):
+                    ring.write(np.frombuffer(frame, dtype=np.int16), is_speech)
+                header[ring.VAD_ERRORS] = vad.errors
+
+            keyword_index = gate.detect(pcm, process) if gate else process(pcm)
+            if keyword_index >= 0:
+                events.put({'type': 'wake', 'seq': ring.write_seq, 'time': time.time()})
+    finally:
+        del header
+        stream.close()
+        pa.terminate()
+        porcupine.delete()
+        if gate:
+            gate.report()
+        recorder.close()
+        ring.close()
+
+
+class AudioFrontend:
+    """Lanza y controla el proceso de audio desde el asistente"""
+
+    def __init__(self, seconds=None, frame_samples=FRAME_SAMPLES):
+        seconds = seconds or Config.AUDIO_FRONTEND_RING_SECONDS
+        self.frame_samples = frame_samples
+        self.sample_rate = Config.SAMPLE_RATE
+        self.ring = SharedRing(int(seconds * Config.SAMPLE_RATE / frame_samples), frame_samples)
+        self._published_overruns = 0
+
+        # spawn: el hijo no hereda el estado de PyAudio/pygame del padre
+        ctx = multiprocessing.get_context('spawn')
+        self.events = ctx.Queue()
+        self._stop = ctx.Event()
+        self.process = ctx.Process(
+            target=_frontend_main,
+            args=(self.ring.name, self.ring.slots, frame_samples, self.events, self._stop),
+            name='audio-frontend',
+            daemon=True
+        )
+
+    def start(self, timeout=15.0):
+        """Arranca el proceso y espera a que el micrófono esté abierto"""
+        self.process.start()
+        event = self.wait_event(timeout)
+        if event is None or event['type'] != 'ready':
+            raise AudioFrontendError("El front-end de audio no respondió")
+        self.sample_rate = event['sample_rate']
+        self.pid = event['pid']
+
+    def _check(self):
+        if not self.process.is_alive():
+            raise AudioFrontendError("El proceso de audio se ha detenido")
+
+    def wait_event(self, timeout=None):
+        """
+        Siguiente evento del proceso de audio
+
+        Returns:
+            dict or None: Evento, o None si no llegó ninguno a tiempo
+        """
+        self.publish_metrics()
+        try:
+            event = self.events.get(timeout=timeout)
+        except queue.Empty:
+            self._check()
+            return None
+
+        if event['type'] == 'error':
+            raise AudioFrontendError(event['message'])
+        return event
+
+    def wait_wake(self, timeout=None):
+        """Espera una detección del wake word (None si no hubo)"""
+        event = self.wait_event(timeout)
+        while event is not None and event['type'] != 'wake':
+            event = self.wait_event(0)
+        return event
+
+    def clear_events(self):
+        """Descarta las detecciones antiguas (de mientras se hablaba o grababa)"""
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def reader(self, seq=None):
+        """Cursor para leer frames a partir de seq (por defecto, desde ahora)"""
+        return RingReader(self.ring, seq, check=self._check)
+
+    def recent(self, end_seq, seconds):
+        """Audio de los segundos anteriores a end_seq"""
+        return self.ring.recent(end_seq, int(seconds * self.sample_rate / self.frame_samples))
+
+    def publish_metrics(self):
+        """Pasa a las métricas de este proceso lo que publicó el proceso de audio"""
+        header = self.ring.header
+        overruns = int(header[SharedRing.OVERRUNS])
+        if overruns > self._published_overruns:
+            delta = overruns - self._published_overruns
+            metrics.inc('audio.frontend.overruns', delta)
+            metrics.inc('audio.overruns', delta)
+            self._published_overruns = overruns
+        metrics.set_gauge('audio.frontend.buffer_frames', int(header[SharedRing.BUFFER_FRAMES]))
+        metrics.set_gauge('audio.frontend.queue_ms_max', header[SharedRing.QUEUE_US_MAX] / 1000)
+        metrics.set_gauge('audio.frontend.read_ms_avg', header[SharedRing.READ_US_AVG] / 1000)
+        metrics.set_gauge('audio.frontend.read_ms_max', header[SharedRing.READ_US_MAX] / 1000)
+        metrics.set_gauge('audio_frontend.vad_errors', int(header[SharedRing.VAD_ERRORS]))
+        metrics.set_gauge('audio_frontend.frames', self.ring.write_seq)
+
+    def stop(self):
+        self.publish_metrics()
+        self._stop.set()
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.ring.close()
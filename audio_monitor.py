@@ -0,0 +1,232 @@
+"""
+Contabilidad de entrada y salida de audio
+
+PyAudio descarta en silencio los frames perdidos si se lee con
+exception_on_overflow=False. MonitoredInput lee con la excepción activada,
+cuenta cada desbordamiento, mide cuánto bloquea cada lectura y cuánto audio
+espera en el buffer del driver, y si los desbordamientos se mantienen
+vuelve a abrir el stream con un buffer mayor. Si el micrófono no admite
+la frecuencia de trabajo en mono, se abre en su formato nativo y se
+convierte aquí (resampler.py). PlaybackMonitor vigila el bucle de
+reproducción, que es lo único observable con pygame.mixer.music.
+"""
+
+import logging
+import time
+from collections import deque
+
+import numpy as np
+
+from config import Config
+from flight_recorder import recorder
+from metrics import metrics
+from resampler import CaptureConverter
+
+
+log = logging.getLogger('jarvis')
+
+PUBLISH_EVERY = 100  # Lecturas entre volcados a las métricas (~3 s)
+
+
+class MonitoredInput:
+    """Stream de entrada de PyAudio con contadores y buffer adaptativo"""
+
+    # Tamaño aprendido por tipo de stream: los que se abran después ya empiezan con él
+    _learned_multiple = {}
+    # Formato del micrófono negociado (una vez por proceso y frecuencia de trabajo)
+    _device_format = {}
+
+    def __init__(self, pa, rate, frame_length, name='capture'):
+        """
+        Args:
+            pa: Instancia de PyAudio
+            rate: Frecuencia de muestreo
+            frame_length: Muestras por lectura
+            name: Prefijo de las métricas (audio.<name>.*)
+        """
+        import pyaudio
+
+        self._overflow_errno = pyaudio.paInputOverflowed
+        self._format = pyaudio.paInt16
+        self.pa = pa
+        self.rate = rate
+        self.frame_length = frame_length
+        self.name = name
+        self.multiple = self._learned_multiple.get(name, Config.AUDIO_BUFFER_MULTIPLE)
+
+        # Formato nativo del micrófono y conversión a rate mono si hace falta
+        self.device_rate, self.channels = self._negotiate(pa, rate)
+        self.converter = None
+        self.device_frames = frame_length
+        if (self.device_rate, self.channels) != (rate, 1):
+            self.converter = CaptureConverter(self.device_rate, self.channels, rate)
+            self.device_frames = -(-frame_length * self.device_rate // rate)
+            self.pending = np.zeros(0, dtype=np.int16)
+
+        self.overrun_times = deque()
+        self.reads = 0
+        self.overruns = 0
+        self.queue_ms = 0.0
+        self.queue_ms_max = 0.0
+        self.read_ms_avg = 0.0
+        self.read_ms_max = 0.0
+        self._published = {'reads': 0, 'overruns': 0}
+
+        self._open()
+
+    @classmethod
+    def _negotiate(cls, pa, rate):
+        """
+        Formato en que se abre el micrófono: rate mono si lo admite, si no el nativo
+
+        Returns:
+            tuple: (frecuencia, canales)
+        """
+        import pyaudio
+
+        if rate in cls._device_format:
+            return cls._device_format[rate]
+
+        if Config.AUDIO_DEVICE_RATE or Config.AUDIO_DEVICE_CHANNELS:
+            device_format = (Config.AUDIO_DEVICE_RATE or rate, Config.AUDIO_DEVICE_CHANNELS or 1)
+        else:
+            device_format = (rate, 1)
+            try:
+                info = pa.get_default_input_device_info()
+            except (IOError, OSError):
+                info = None
+
+            if info:
+                native = int(info['defaultSampleRate'])
+                for candidate in [(rate, 1), (native, 1), (native, min(2, int(info['maxInputChannels'])))]:
+                    try:
+                        if pa.is_format_supported(candidate[0], input_device=info['index'],
+                                                  input_channels=candidate[1], input_format=pyaudio.paInt16):
+                            device_format = candidate
+                            break
+                    except ValueError:
+                        continue
+
+        if device_format != (rate, 1):
+            log.info(f"🎚️ Micrófono a {device_format[0]} Hz x{device_format[1]}: se convierte a {rate} Hz mono")
+        cls._device_format[rate] = device_format
+        return device_format
+
+    @property
+    def buffer_frames(self):
+        return self.device_frames * self.multiple
+
+    def _open(self):
+        self.stream = self.pa.open(
+            rate=self.device_rate,
+            channels=self.channels,
+            format=self._format,
+            input=True,
+            frames_per_buffer=self.buffer_frames
+        )
+        metrics.set_gauge(f'audio.{self.name}.buffer_frames', self.buffer_frames)
+
+    def available_frames(self):
+        """Frames completos que se pueden leer ya sin esperar al micrófono"""
+        queued = self.stream.get_read_available() * self.rate // self.device_rate
+        if self.converter is not None:
+            queued += len(self.pending)
+        return queued // self.frame_length
+
+    def _read_device(self, frames):
+        try:
+            return self.stream.read(frames, exception_on_overflow=True)
+        except IOError as e:
+            if getattr(e, 'errno', None) != self._overflow_errno:
+                raise
+            self._overrun()
+            return self.stream.read(frames, exception_on_overflow=False)
+
+    def read(self):
+        """Lee un frame (bytes int16 mono a rate) contando desbordamientos y latencia"""
+        queued = self.stream.get_read_available()
+        start = time.perf_counter()
+        if self.converter is None:
+            data = self._read_device(self.frame_length)
+        else:
+            # Cada bloque convertido trae un número variable de muestras
+            while len(self.pending) < self.frame_length:
+                converted = self.converter.process(self._read_device(self.device_frames))
+                self.pending = np.concatenate([self.pending, converted])
+            data = self.pending[:self.frame_length].tobytes()
+            self.pending = self.pending[self.frame_length:]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        # Todo el audio del micrófono pasa por aquí (en este proceso o en el front-end)
+        recorder.write_pcm(data, self.rate)
+
+        self.reads += 1
+        self.queue_ms = queued * 1000 / self.device_rate
+        self.queue_ms_max = max(self.queue_ms_max, self.queue_ms)
+        self.read_ms_avg += 0.05 * (elapsed_ms - self.read_ms_avg)
+        self.read_ms_max = max(self.read_ms_max, elapsed_ms)
+
+        if self.reads % PUBLISH_EVERY == 0:
+            self.publish()
+        return data
+
+    def _overrun(self):
+        """Cuenta un desbordamiento y amplía el buffer si se repiten"""
+        self.overruns += 1
+        now = time.monotonic()
+        self.overrun_times.append(now)
+        while self.overrun_times and now - self.overrun_times[0] > Config.AUDIO_OVERRUN_WINDOW:
+            self.overrun_times.popleft()
+
+        if (len(self.overrun_times) >= Config.AUDIO_OVERRUN_THRESHOLD and
+                self.multiple < Config.AUDIO_BUFFER_MAX_MULTIPLE):
+            self.multiple *= 2
+            self._learned_multiple[self.name] = self.multiple
+            self.overrun_times.clear()
+            log.warning(f"⚠️ Desbordamientos repetidos en {self.name}: buffer ampliado a {self.buffer_frames} muestras")
+            metrics.inc(f'audio.{self.name}.buffer_grows')
+            self.stream.close()
+            self._open()
+
+    def publish(self):
+        """Vuelca los contadores (por diferencia) y medidores en las métricas"""
+        prefix = f'audio.{self.name}'
+        for key in ('reads', 'overruns'):
+            delta = getattr(self, key) - self._published[key]
+            if delta:
+                metrics.inc(f'{prefix}.{key}', delta)
+                self._published[key] += delta
+                if key == 'overruns':
+                    # Total de todos los streams (se guarda por turno en el registro)
+                    metrics.inc('audio.overruns', delta)
+        metrics.set_gauge(f'{prefix}.queue_ms', self.queue_ms)
+        metrics.set_gauge(f'{prefix}.queue_ms_max', max(self.queue_ms_max, metrics.get(f'{prefix}.queue_ms_max', 0.0)))
+        metrics.set_gauge(f'{prefix}.read_ms_avg', self.read_ms_avg)
+        metrics.set_gauge(f'{prefix}.read_ms_max', max(self.read_ms_max, metrics.get(f'{prefix}.read_ms_max', 0.0)))
+
+    def close(self):
+        self.publish()
+        self.stream.close()
+
+
+class PlaybackMonitor:
+    """
+    Vigila el bucle que espera a pygame durante la reproducción
+
+    pygame no expone los underruns de su buffer, pero un tick que llega muy
+    tarde indica que el proceso no pudo atender al audio (GIL, CPU).
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.last = None
+        metrics.inc('audio.playback.started')
+
+    def tick(self):
+        now = time.perf_counter()
+        if self.last is not None:
+            lag_ms = (now - self.last - self.interval) * 1000
+            if lag_ms > self.interval * 1000:
+                metrics.inc('audio.playback.stalls')
+            if lag_ms > metrics.get('audio.playback.lag_ms_max', 0.0):
+                metrics.set_gauge('audio.playback.lag_ms_max', lag_ms)
+        self.last = now
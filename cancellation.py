@@ -0,0 +1,101 @@
+"""
+Cancelación cooperativa del trabajo de cada turno
+
+Cada turno (wake word → respuesta) tiene un CancelToken. Las llamadas de red
+y la reproducción registran en él cómo abortarse (cerrar sockets, cancelar
+la llamada gRPC, parar el audio). Una interrupción o un "para" cancela el
+turno y todo lo que cuelga de él se libera al momento.
+"""
+
+import itertools
+import logging
+import threading
+import time
+
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+
+class Cancelled(Exception):
+    """El trabajo se abandonó porque su turno fue cancelado"""
+
+
+class CancelToken:
+    """Señal de cancelación con callbacks y tokens hijos"""
+
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self.reason = None
+
+        if parent is not None:
+            parent.on_cancel(lambda: self.cancel(parent.reason))
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def on_cancel(self, callback):
+        """
+        Registra una función que se ejecuta al cancelar
+
+        Si el token ya está cancelado, la función se ejecuta al momento.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self, reason=None):
+        """
+        Cancela el token y ejecuta sus callbacks
+
+        Returns:
+            bool: True si esta llamada fue la que canceló
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                log.warning(f"⚠️ Error cancelando: {e}")
+        return True
+
+    def child(self):
+        """Token que se cancela junto con este (o por separado)"""
+        return CancelToken(parent=self)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def wait(self, timeout=None):
+        """Espera a la cancelación; retorna True si se canceló"""
+        return self._event.wait(timeout)
+
+
+class TurnContext:
+    """Contexto de un turno de diálogo con su token de cancelación"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.id = next(self._ids)
+        self.token = CancelToken()
+        self.started = time.monotonic()
+
+    def cancel(self, reason):
+        """Cancela todo el trabajo pendiente del turno"""
+        if self.token.cancel(reason):
+            metrics.inc('cancel.turns')
+            metrics.inc(f'cancel.reason.{reason}')
@@ -0,0 +1,213 @@
+"""
+Reconocimiento local de comandos cortos (vocabulario pequeño)
+
+Las frases de control más habituales ("para", "qué hora es", "gracias"...)
+se reconocen en el propio dispositivo comparando los MFCC del audio con
+plantillas mediante DTW. Las plantillas se aprenden solas: cada vez que
+Google STT transcribe exactamente una frase del vocabulario, su audio se
+guarda como ejemplo. Si no hay coincidencia clara se usa la nube.
+
+Las frases cortas que no son del vocabulario también se guardan, como
+plantillas de relleno: un audio que se parece más a ellas se manda a la
+nube. Además hacen falta al menos dos clases que compitan (dos frases, o
+una frase y el relleno): con una sola no hay margen que comparar y
+cualquier audio corto pasaría por ese comando.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+import wave
+
+import numpy as np
+
+from audio_features import pcm_to_float, mfcc, trim_to_energy
+from config import Config
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+
+# Clase de rechazo: frases cortas transcritas que no son comandos
+FILLER = '_relleno'
+
+
+def normalize_phrase(text):
+    """Minúsculas, sin tildes ni signos de puntuación"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def dtw_distance(a, b):
+    """
+    Distancia DTW normalizada entre dos secuencias de características
+
+    Usa pasos (1,1), (1,2) y (2,1), de modo que cada fila solo depende de
+    las dos anteriores y se calcula de forma vectorizada.
+
+    Args:
+        a: Matriz (n, d)
+        b: Matriz (m, d)
+
+    Returns:
+        float: Coste medio del alineamiento (inf si no es posible)
+    """
+    n, m = len(a), len(b)
+    if n == 0 or m == 0 or n > 2 * m or m > 2 * n:
+        return float('inf')
+
+    cost = np.sqrt(((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2))
+
+    inf_row = np.full(m, np.inf)
+    prev2 = inf_row
+    prev1 = np.full(m, np.inf)
+    prev1[0] = cost[0, 0]
+
+    for i in range(1, n):
+        diag = np.concatenate(([np.inf], prev1[:-1]))
+        horiz = np.concatenate(([np.inf, np.inf], prev1[:-2]))
+        vert = np.concatenate(([np.inf], prev2[:-1]))
+        row = cost[i] + np.minimum(np.minimum(diag, horiz), vert)
+        prev2, prev1 = prev1, row
+
+    return float(prev1[-1] / (n + m))
+
+
+class CommandSpotter:
+    """Reconocedor de comandos por plantillas MFCC + DTW"""
+
+    def __init__(self, data_file=None, vocabulary=None):
+        self.data_file = data_file or Config.LOCAL_COMMANDS_FILE
+        self.vocabulary = {
+            normalize_phrase(p): p for p in (vocabulary or Config.LOCAL_COMMANDS)
+        }
+        self.templates = {}  # frase normalizada -> lista de matrices MFCC
+        self.load_templates()
+
+    def load_templates(self):
+        """Carga las plantillas guardadas desde archivo"""
+        if not os.path.exists(self.data_file):
+            return
+
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.templates = {
+                phrase: [np.array(t, dtype=np.float32) for t in items]
+                for phrase, items in data.items()
+                if phrase in self.vocabulary or phrase == FILLER
+            }
+            total = sum(len(items) for items in self.templates.values())
+            print(f"✅ {total} plantillas de comandos locales cargadas")
+        except Exception as e:
+            print(f"⚠️ Error cargando plantillas de comandos: {e}")
+            self.templates = {}
+
+    def save_templates(self):
+        """Guarda las plantillas en archivo"""
+        try:
+            data = {
+                phrase: [np.round(t, 3).tolist() for t in items]
+                for phrase, items in self.templates.items()
+            }
+            with open(self.data_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        except Exception as e:
+            log.error(f"❌ Error guardando plantillas de comandos: {e}")
+
+    def _features(self, audio_file):
+        """MFCC del tramo con voz, o None si es demasiado largo para ser un comando"""
+        with wave.open(audio_file, 'rb') as wf:
+            sample_rate = wf.getframerate()
+            samples = pcm_to_float(wf.readframes(wf.getnframes()))
+
+        samples = trim_to_energy(samples, sample_rate)
+        if len(samples) > Config.LOCAL_COMMANDS_MAX_DURATION * sample_rate:
+            return None
+        return mfcc(samples, sample_rate)
+
+    def spot(self, audio_file):
+        """
+        Intenta reconocer un comando del vocabulario
+
+        Args:
+            audio_file: Path del archivo WAV capturado
+
+        Returns:
+            str: Frase reconocida, o None si hay que usar STT en la nube
+        """
+        if len(self.templates) < 2:
+            # Sin competidores el margen no dice nada
+            return None
+
+        start = time.perf_counter()
+        try:
+            features = self._features(audio_file)
+        except Exception as e:
+            log.warning(f"⚠️ Error en reconocimiento local: {e}")
+            return None
+
+        if features is None:
+            metrics.inc('commands.cloud_fallbacks')
+            return None
+
+        # Mejor distancia por frase
+        scores = sorted(
+            (min(dtw_distance(features, t) for t in items), phrase)
+            for phrase, items in self.templates.items()
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.set_gauge('commands.spot_ms', elapsed_ms)
+
+        best_distance, best_phrase = scores[0]
+        second_distance = scores[1][0] if len(scores) > 1 else float('inf')
+
+        if (best_phrase != FILLER and
+                best_distance <= Config.LOCAL_COMMANDS_MAX_DISTANCE and
+                best_distance * Config.LOCAL_COMMANDS_MARGIN <= second_distance):
+            metrics.inc('commands.local_hits')
+            log.info(f"⚡ Comando local reconocido en {elapsed_ms:.0f} ms (distancia {best_distance:.2f})")
+            return self.vocabulary[best_phrase]
+
+        metrics.inc('commands.cloud_fallbacks')
+        return None
+
+    def learn(self, audio_file, text):
+        """
+        Guarda el audio como plantilla del comando, o de relleno si no lo es
+
+        Args:
+            audio_file: Path del archivo WAV
+            text: Transcripción obtenida en la nube
+        """
+        phrase = normalize_phrase(text or '')
+        if not phrase:
+            return
+        if phrase not in self.vocabulary:
+            phrase = FILLER
+
+        try:
+            features = self._features(audio_file)
+        except Exception as e:
+            log.warning(f"⚠️ Error guardando plantilla de comando: {e}")
+            return
+
+        if features is None:
+            return
+
+        items = self.templates.setdefault(phrase, [])
+        items.append(features)
+        if phrase == FILLER:
+            del items[:-Config.LOCAL_COMMANDS_MAX_FILLER]
+        else:
+            del items[:-Config.LOCAL_COMMANDS_MAX_TEMPLATES]
+
+        self.save_templates()
+        if phrase != FILLER:
+            log.info(f"📝 Plantilla de comando aprendida: '{self.vocabulary[phrase]}'")
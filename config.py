@@ -31,30 +31,199 @@ class Config:
     # ==================== WAKE WORD ====================
     WAKE_WORD = os.getenv('WAKE_WORD', 'jarvis')
     
+    # Verificación local del wake word (segunda etapa)
+    WAKE_VERIFY_ENABLED = os.getenv('WAKE_VERIFY_ENABLED', 'true').lower() == 'true'
+    WAKE_VERIFY_FILE = str(BASE_DIR / 'wake_templates.json')
+    WAKE_VERIFY_THRESHOLD = 0.45    # Similitud mínima con las plantillas (0-1)
+    WAKE_VERIFY_ENROLL_THRESHOLD = 0.75  # Similitud mínima para aprender una activación como plantilla
+    WAKE_VERIFY_MAX_TEMPLATES = 20  # Plantillas recientes que se conservan
+    WAKE_VERIFY_WINDOW = 1.2        # Segundos de audio previos a la detección
+    
     # ==================== AUDIO CONFIG ====================
     SAMPLE_RATE = 16000  # Hz (16kHz es estándar para voz)
     CHUNK_SIZE = 512     # Tamaño de frame para Porcupine
     
+    # Micrófono, Porcupine y VAD en un proceso aparte (buffer circular compartido)
+    AUDIO_FRONTEND_ENABLED = os.getenv('AUDIO_FRONTEND_ENABLED', 'true').lower() == 'true'
+    AUDIO_FRONTEND_RING_SECONDS = 10    # Audio que conserva el buffer circular
+    AUDIO_FRONTEND_NICE = -5            # Prioridad del proceso de audio (requiere permisos)
+    
+    # Desbordamientos del micrófono: si se repiten, el buffer del driver se duplica
+    AUDIO_BUFFER_MULTIPLE = 1           # Buffer inicial, en frames de lectura
+    AUDIO_BUFFER_MAX_MULTIPLE = 8       # Tope al que puede crecer
+    AUDIO_OVERRUN_WINDOW = 10.0         # Segundos en los que se cuentan los desbordamientos
+    AUDIO_OVERRUN_THRESHOLD = 3         # Desbordamientos en la ventana para ampliar el buffer
+    
+    # Formato nativo del micrófono (0 = detectar); se convierte a SAMPLE_RATE mono
+    AUDIO_DEVICE_RATE = int(os.getenv('AUDIO_DEVICE_RATE', '0'))
+    AUDIO_DEVICE_CHANNELS = int(os.getenv('AUDIO_DEVICE_CHANNELS', '0'))
+    
     # ==================== SPEECH-TO-TEXT ====================
     LANGUAGE = os.getenv('LANGUAGE', 'es-ES')
     
+    # Backends de transcripción: 'fallback' (del más rápido al más lento) o 'race'
+    STT_POLICY = os.getenv('STT_POLICY', 'fallback')
+    STT_INITIAL_LATENCY = {'google': 1.5, 'local': 3.0}  # Segundos estimados al arrancar
+    STT_MIN_CONFIDENCE = 0.4    # Por debajo, la transcripción se rechaza y se reintenta con otra
+    
+    # ASR local (SpeechBrain, CPU) para operar con red degradada
+    LOCAL_ASR_ENABLED = os.getenv('LOCAL_ASR_ENABLED', 'false').lower() == 'true'
+    LOCAL_ASR_MODEL = os.getenv('LOCAL_ASR_MODEL', 'speechbrain/asr-wav2vec2-commonvoice-14-es')
+    LOCAL_ASR_DIR = str(BASE_DIR / 'pretrained_models' / 'asr')
+    
+    # Comandos cortos reconocidos en local (sin Google STT)
+    LOCAL_COMMANDS_ENABLED = os.getenv('LOCAL_COMMANDS_ENABLED', 'true').lower() == 'true'
+    LOCAL_COMMANDS = [
+        'para', 'cállate', 'basta', 'qué hora es', 'qué día es', 'gracias', 'hola'
+    ]
+    LOCAL_COMMANDS_FILE = str(BASE_DIR / 'command_templates.json')
+    LOCAL_COMMANDS_MAX_DURATION = 2.0   # Segundos de voz máximos para un comando
+    LOCAL_COMMANDS_MAX_DISTANCE = 4.0   # Distancia DTW máxima para aceptar
+    LOCAL_COMMANDS_MARGIN = 1.2         # La segunda frase debe estar este factor más lejos
+    LOCAL_COMMANDS_MAX_TEMPLATES = 5    # Ejemplos guardados por frase
+    LOCAL_COMMANDS_MAX_FILLER = 10      # Frases cortas que no son comandos (clase de rechazo)
+    
     # ==================== TEXT-TO-SPEECH ====================
     VOICE_NAME = os.getenv('VOICE_NAME', 'es-ES-Neural2-G')
     TTS_SPEAKING_RATE = 1.0  # Velocidad (0.25 - 4.0)
     TTS_PITCH = 0.0          # Tono (-20.0 - 20.0)
+    TTS_PHRASE_CACHE_SIZE = 50          # Frases cortas guardadas en memoria
+    TTS_PHRASE_CACHE_MAX_CHARS = 80     # Longitud máxima de una frase guardable
+    TTS_PREPARED_SIZE = 20              # Textos presintetizados (trozos de las respuestas precargadas)
+    TTS_DISK_CACHE_ENABLED = os.getenv('TTS_DISK_CACHE_ENABLED', 'true').lower() == 'true'
+    TTS_DISK_CACHE_DIR = str(BASE_DIR / 'cache' / 'tts')
+    TTS_DISK_CACHE_MAX_BYTES = 200 * 1024 * 1024    # Al pasarse se borran los audios menos usados
+    TTS_STREAM_ENABLED = os.getenv('TTS_STREAM_ENABLED', 'true').lower() == 'true'
+    TTS_STREAM_CHUNK_CHARS = 250        # Tras la primera frase, frases juntas hasta esta longitud
+    TTS_STREAM_LOOKAHEAD = 2            # Trozos sintetizándose por delante de la reproducción
+    TTS_STREAM_SAMPLE_RATE = 24000      # Trozos en WAV (LINEAR16) para encadenarlos sin huecos
+    TTS_WARM_PHRASES = [
+        '¿Señor?',
+        'Entendido, señor',
+        'Disculpe, no le he entendido',
+        'Disculpe, no le he entendido bien. Por favor, repita',
+        'Lo siento señor, no he podido obtener una respuesta',
+        'No he recibido ninguna pregunta, señor'
+    ]
     
     # ==================== VAD (Voice Activity Detection) ====================
     VAD_AGGRESSIVENESS = 1   # 0-3 (3 = más agresivo filtrando ruido)
+    VAD_NOISE_WINDOW = 2.0       # Segundos en los que se busca el suelo de ruido (mínimo)
+    VAD_NOISE_MARGIN_DB = 6.0    # dB sobre el suelo de ruido para considerar voz
+    VAD_MAX_FLATNESS = 0.45      # Planitud espectral máxima de la voz (ruido blanco ≈ 0.56)
+    # Procesado del audio que se envía a transcribir (ligero, desactivado por defecto)
+    VAD_NOISE_SUPPRESSION = os.getenv('VAD_NOISE_SUPPRESSION', 'false').lower() == 'true'
+    VAD_NS_MIN_GAIN = 0.2        # Atenuación máxima de la resta espectral
+    VAD_AGC = os.getenv('VAD_AGC', 'false').lower() == 'true'
+    VAD_AGC_TARGET_DBFS = -20.0  # Nivel de voz objetivo
+    VAD_AGC_MAX_GAIN = 8.0       # Ganancia máxima (+18 dB)
     
     # ==================== RECORDING CONFIG ====================
     SILENCE_DURATION = 1.0      # Segundos de silencio para terminar grabación
     MAX_RECORDING_TIME = 15     # Máximo tiempo de grabación en segundos
     SILENCE_THRESHOLD = 500     # Umbral de audio (ajustar según micrófono)
+    UPLOAD_PAD_MS = 300         # Margen de audio que se conserva antes/después de la voz
+    
+    # ==================== LOW POWER ====================
+    LOW_POWER_MODE = os.getenv('LOW_POWER_MODE', 'false').lower() == 'true'
+    LOW_POWER_LOOKBACK = 0.6    # Segundos de audio previo que se pasan a Porcupine
+    LOW_POWER_HANGOVER = 1.0    # Segundos que la puerta sigue abierta tras la actividad
+    LOW_POWER_MARGIN_DB = 6.0   # dB sobre el suelo de ruido para considerar actividad
+    LOW_POWER_FLOOR_WINDOW = 5.0  # Segundos de actividad continua tras los que el suelo sube a su mínimo
     
     # ==================== PERPLEXITY CONFIG ====================
     PERPLEXITY_MODEL = "sonar"
     PERPLEXITY_TEMPERATURE = 0.2
     PERPLEXITY_MAX_TOKENS = 250
+    PERPLEXITY_URL = os.getenv('PERPLEXITY_URL', 'https://api.perplexity.ai/chat/completions')
+    
+    # ==================== ANSWER ENGINE ====================
+    ANSWER_TIMEOUT = 15             # Timeout de cada backend (segundos)
+    HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'true').lower() == 'true'
+    HEDGE_INITIAL_DEADLINE = 4.0    # Plazo antes de cubrir con Gemini sin historial
+    HEDGE_MIN_DEADLINE = 1.5        # Límites del plazo basado en el p95 de Perplexity
+    HEDGE_MAX_DEADLINE = 8.0
+    
+    # ==================== KNOWLEDGE BASE ====================
+    # Respuestas previas para contestar al instante preguntas repetidas
+    KNOWLEDGE_ENABLED = os.getenv('KNOWLEDGE_ENABLED', 'true').lower() == 'true'
+    KNOWLEDGE_DB_FILE = str(BASE_DIR / 'knowledge.db')
+    KNOWLEDGE_MAX_AGE = 7 * 24 * 3600   # Segundos que una respuesta se considera fresca
+    KNOWLEDGE_MAX_ENTRIES = 2000
+    KNOWLEDGE_CANDIDATES = 10           # Candidatas propuestas por FTS5
+    
+    # ==================== PREFETCH ====================
+    # Preguntas frecuentes a cada hora (tiempo, noticias...) respondidas por adelantado
+    PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true'
+    PREFETCH_LOG_FILE = str(BASE_DIR / 'query_log.db')
+    PREFETCH_HISTORY_DAYS = 14      # Días de registro usados para aprender
+    PREFETCH_MIN_COUNT = 3          # Veces a la misma hora para considerarla previsible
+    PREFETCH_MAX_QUERIES = 5        # Preguntas precargadas a la vez
+    PREFETCH_LOOKAHEAD = 15 * 60    # Segundos de antelación (incluye la hora siguiente)
+    PREFETCH_TTL = 30 * 60          # Segundos que una respuesta precargada es válida
+    PREFETCH_INTERVAL = 5 * 60      # Segundos entre revisiones
+    PREFETCH_START_DELAY = 30
+    PREFETCH_DAILY_BUDGET = 40      # Llamadas a APIs (respuestas + síntesis) por día
+    
+    # ==================== CONVERSATION ====================
+    # Tras cada respuesta se sigue escuchando unos segundos sin pedir el wake word
+    FOLLOW_UP_ENABLED = os.getenv('FOLLOW_UP_ENABLED', 'true').lower() == 'true'
+    FOLLOW_UP_WINDOW = 5.0          # Segundos para empezar a hablar
+    HISTORY_MAX_TURNS = 6           # Intercambios recordados
+    HISTORY_TOKEN_BUDGET = 600      # Tokens máximos de historial por petición
+    HISTORY_TTL = 120               # Segundos sin hablar para olvidar la conversación
+    
+    # ==================== SERVER (multi-sala) ====================
+    # Solo esta máquina; para satélites en otras salas, SERVER_HOST=0.0.0.0 y SERVER_TOKEN
+    SERVER_HOST = os.getenv('SERVER_HOST', '127.0.0.1')
+    SERVER_PORT = int(os.getenv('SERVER_PORT', '8765'))
+    SERVER_TOKEN = os.getenv('SERVER_TOKEN', '')    # Secreto compartido que el satélite envía en HELLO
+    SERVER_MAX_FRAME_BYTES = 1024 * 1024            # Tramas mayores cierran la conexión
+    # Frases procesadas a la vez: casi todo es espera de red, así que más que núcleos
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', str((os.cpu_count() or 2) * 4)))
+    SERVER_NO_SPEECH_TIMEOUT = 5.0  # Segundos tras el wake word sin voz antes de rendirse
+    # Satélite: dirección del servidor y nombre de la sala
+    SATELLITE_SERVER = os.getenv('SATELLITE_SERVER', '127.0.0.1:8765')
+    SATELLITE_ROOM = os.getenv('SATELLITE_ROOM', 'salon')
+
+    # ==================== LOGGING ====================
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')     # DEBUG muestra los detalles internos
+    TURN_LOG_ENABLED = os.getenv('TURN_LOG_ENABLED', 'true').lower() == 'true'
+    TURN_LOG_FILE = str(BASE_DIR / 'logs' / 'turns.jsonl')
+    TURN_LOG_MAX_BYTES = 5 * 1024 * 1024    # Tamaño a partir del cual se rota
+    TURN_LOG_BACKUPS = 5                    # Archivos rotados (comprimidos) que se conservan
+    TURN_LOG_QUEUE_SIZE = 1000              # Registros en cola antes de descartar
+    TURN_LOG_BATCH = 64                     # Registros escritos de una vez
+    TURN_LOG_FSYNC_INTERVAL = 2.0           # Segundos entre fsync
+    
+    # ==================== DIAGNOSTICS ====================
+    # Socket local de control (perfilado bajo demanda, métricas...)
+    CONTROL_SOCKET_ENABLED = os.getenv('CONTROL_SOCKET_ENABLED', 'true').lower() == 'true'
+    CONTROL_SOCKET = os.getenv('CONTROL_SOCKET', str(BASE_DIR / 'jarvis.sock'))
+    CONTROL_PORT = int(os.getenv('CONTROL_PORT', '8766'))  # Solo si no hay sockets Unix (127.0.0.1)
+    # Perfilador por muestreo (se activa con SIGUSR1 o "profile" en el socket)
+    PROFILE_INTERVAL = 0.01         # Segundos entre muestras (100 Hz)
+    PROFILE_SECONDS = 30            # Duración por defecto de una sesión
+    PROFILE_MAX_SECONDS = 600       # Límite de una sesión
+    PROFILE_DIR = str(BASE_DIR / 'logs' / 'profiles')
+    # Grabador de vuelo: últimos minutos de audio y eventos, en un archivo mapeado en memoria
+    FLIGHT_RECORDER_ENABLED = os.getenv('FLIGHT_RECORDER_ENABLED', 'true').lower() == 'true'
+    FLIGHT_RECORDER_FILE = str(BASE_DIR / 'logs' / 'flight_recorder.bin')
+    FLIGHT_RECORDER_SECONDS = int(os.getenv('FLIGHT_RECORDER_SECONDS', '300'))  # 5 min a 16 kHz = 9,6 MB
+    FLIGHT_RECORDER_EVENTS = 4096   # Eventos que se conservan
+    FLIGHT_RECORDER_DUMP_DIR = str(BASE_DIR / 'logs' / 'flight')
+    
+    # ==================== RESILIENCE ====================
+    # Plazos (mín, máx) en segundos por endpoint; el real sale del p99 observado
+    ENDPOINT_DEADLINES = {
+        'perplexity': (3.0, 15.0),
+        'gemini': (3.0, 15.0),
+        'google_stt': (2.0, 10.0),
+        'google_tts': (1.5, 8.0)
+    }
+    DEADLINE_FACTOR = 1.5           # Margen sobre el p99 de latencia
+    BREAKER_FAILURE_THRESHOLD = 3   # Fallos seguidos para marcar un proveedor como caído
+    BREAKER_COOLDOWN = 30           # Segundos antes de volver a probar
     
     # ==================== SYSTEM PROMPTS ====================
     SYSTEM_PROMPT = """Eres Jarvis, el asistente personal de Iron Man. 
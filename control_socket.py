@@ -0,0 +1,178 @@
+"""
+Socket local de control
+
+Permite dar órdenes al asistente en marcha sin reiniciarlo ni abrir puertos
+a la red: un socket Unix (solo el usuario que ejecuta Jarvis puede usarlo)
+o, donde no los hay, un puerto TCP en 127.0.0.1. Cada conexión envía una
+línea con un comando y sus argumentos y recibe una respuesta de texto.
+
+Los módulos registran sus comandos con ControlServer.register(); por
+defecto hay 'help', 'status' y 'metrics'.
+
+Uso:
+    python control_socket.py help
+    python control_socket.py profile 20
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from config import Config
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+MAX_COMMAND_BYTES = 4096
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(MAX_COMMAND_BYTES).decode('utf-8', 'replace').strip()
+        reply = self.server.control.dispatch(line)
+        self.wfile.write((reply.rstrip('\n') + '\n').encode('utf-8'))
+
+
+if hasattr(socket, 'AF_UNIX'):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ControlServer:
+    """Servidor de comandos de una línea en un hilo aparte"""
+
+    def __init__(self, path=None, port=None):
+        """
+        Args:
+            path: Socket Unix (por defecto Config.CONTROL_SOCKET)
+            port: Puerto TCP local si no hay sockets Unix (por defecto Config.CONTROL_PORT)
+        """
+        self.path = path or Config.CONTROL_SOCKET
+        self.port = port or Config.CONTROL_PORT
+        self.commands = {}
+        self.started = time.time()
+        self.server = None
+        self.address = None
+
+        self.register('help', self._help, "Lista de comandos")
+        self.register('status', self._status, "PID, tiempo encendido e hilos")
+        self.register('metrics', self._metrics, "Contadores y medidores (JSON)")
+
+    def register(self, name, handler, help_text=''):
+        """
+        Añade un comando
+
+        Args:
+            name: Primera palabra de la línea
+            handler: Función lista de argumentos -> texto de respuesta
+            help_text: Descripción para 'help'
+        """
+        self.commands[name] = (handler, help_text)
+
+    def dispatch(self, line):
+        """Ejecuta una línea de comando y retorna la respuesta"""
+        parts = line.split()
+        if not parts:
+            return "Comando vacío (prueba 'help')"
+
+        name, args = parts[0].lower(), parts[1:]
+        if name not in self.commands:
+            return f"Comando desconocido: {name} (prueba 'help')"
+
+        metrics.inc('control.commands')
+        log.debug(f"🎛️ Comando de control: {line}")
+        try:
+            return str(self.commands[name][0](args))
+        except Exception as e:
+            log.error(f"❌ Error en comando de control '{name}': {e}")
+            return f"Error: {e}"
+
+    def _help(self, args):
+        return "\n".join(f"{name:10s} {help_text}" for name, (_, help_text) in sorted(self.commands.items()))
+
+    def _status(self, args):
+        uptime = time.time() - self.started
+        return f"PID {os.getpid()}, encendido {uptime / 3600:.1f} h, {threading.active_count()} hilos"
+
+    def _metrics(self, args):
+        return json.dumps(metrics.snapshot(), ensure_ascii=False, sort_keys=True, default=str)
+
+    def start(self):
+        """Empieza a atender comandos en segundo plano"""
+        if hasattr(socket, 'AF_UNIX'):
+            # Un socket que quedó de una ejecución anterior impide el bind
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            old_umask = os.umask(0o177)
+            try:
+                self.server = _UnixServer(self.path, _Handler)
+            finally:
+                os.umask(old_umask)
+            self.address = self.path
+        else:
+            self.server = _TCPServer(('127.0.0.1', self.port), _Handler)
+            self.address = f"127.0.0.1:{self.port}"
+
+        self.server.control = self
+        threading.Thread(target=self.server.serve_forever, name='control', daemon=True).start()
+        log.info(f"🎛️ Socket de control en {self.address}")
+
+    def shutdown(self):
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        if hasattr(socket, 'AF_UNIX') and os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = None
+
+
+def send_command(line, path=None, port=None, timeout=10.0):
+    """
+    Envía un comando al asistente en marcha
+
+    Returns:
+        str: Respuesta
+    """
+    if hasattr(socket, 'AF_UNIX'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = path or Config.CONTROL_SOCKET
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = ('127.0.0.1', port or Config.CONTROL_PORT)
+
+    sock.settimeout(timeout)
+    with sock:
+        sock.connect(address)
+        sock.sendall((line.strip() + '\n').encode('utf-8'))
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b''.join(chunks).decode('utf-8').rstrip('\n')
+
+
+def main():
+    line = ' '.join(sys.argv[1:]) or 'help'
+    try:
+        print(send_command(line))
+    except (OSError, socket.timeout) as e:
+        print(f"❌ No se pudo conectar con Jarvis: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Historial de la conversación para preguntas de seguimiento
+
+Guarda los últimos intercambios pregunta/respuesta y los entrega como
+mensajes para el proveedor, recortados a un presupuesto de tokens para que
+el contexto no encarezca ni ralentice cada petición. Si pasa un rato sin
+hablar, la conversación se da por terminada y se empieza de cero.
+"""
+
+import threading
+import time
+from collections import deque
+
+from config import Config
+
+
+def estimate_tokens(text):
+    """
+    Estimación rápida de tokens sin tokenizador (~4 caracteres por token)
+
+    Returns:
+        int: Tokens aproximados
+    """
+    return len(text) // 4 + 1
+
+
+class ConversationHistory:
+    """Últimos turnos de la conversación con presupuesto de tokens"""
+
+    def __init__(self, max_turns=None, token_budget=None, ttl=None):
+        self.max_turns = max_turns or Config.HISTORY_MAX_TURNS
+        self.token_budget = token_budget or Config.HISTORY_TOKEN_BUDGET
+        self.ttl = ttl or Config.HISTORY_TTL
+        self.turns = deque(maxlen=self.max_turns)
+        self.last_activity = 0.0
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        if self.turns and time.monotonic() - self.last_activity > self.ttl:
+            self.turns.clear()
+
+    def add(self, query, answer):
+        """Guarda un intercambio completo"""
+        with self._lock:
+            self._expire()
+            self.turns.append((query, answer))
+            self.last_activity = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self.turns.clear()
+
+    def messages(self):
+        """
+        Turnos recientes como mensajes user/assistant, del más antiguo al
+        más nuevo, sin superar el presupuesto de tokens
+
+        Returns:
+            list: [{'role': 'user'|'assistant', 'content': str}, ...]
+        """
+        with self._lock:
+            self._expire()
+            turns = list(self.turns)
+
+        selected = []
+        used = 0
+        # Se recorre desde el más reciente: si no cabe, se descartan los antiguos
+        for query, answer in reversed(turns):
+            cost = estimate_tokens(query) + estimate_tokens(answer)
+            if used + cost > self.token_budget:
+                break
+            selected.append((query, answer))
+            used += cost
+
+        messages = []
+        for query, answer in reversed(selected):
+            messages.append({'role': 'user', 'content': query})
+            messages.append({'role': 'assistant', 'content': answer})
+        return messages
@@ -0,0 +1,365 @@
+"""
+Máquina de estados del diálogo
+
+Sustituye al bucle anidado de run() y a la recursión de
+handle_interruption(): cada turno avanza de estado en estado de forma
+iterativa según una tabla, así que las interrupciones encadenadas no hacen
+crecer la pila. Todos los caminos (wake word, saludo, interrupción) pasan
+por los mismos estados.
+
+Tras cada respuesta se abre una ventana de seguimiento: si el usuario
+vuelve a hablar en unos segundos, la pregunta se procesa sin wake word.
+
+La máquina solo habla con el asistente a través de estos métodos, de modo
+que puede probarse con un objeto falso sin hardware de audio:
+
+    listen_for_wake_word_and_capture() -> (bool, archivo o None)
+    capture_question(start_timeout) -> archivo o None
+    transcribe(archivo, delete_after) -> texto o None
+    after_transcription(archivo)
+    classify_intent(texto) -> (intención, respuesta)
+    register_user(nombre, archivo) -> bool
+    search_perplexity(texto) -> (respuesta, citations)
+    speak(texto, interruptible)
+    smart_greeting() -> str
+    begin_turn(motivo)
+    log_turn(registro)
+    should_stop_speaking, turn_record (atributos)
+
+Cada turno lleva un TurnRecord (tiempos por estado, pregunta, intención...)
+que el asistente puede completar y que se entrega a log_turn() al terminar.
+"""
+
+import logging
+import os
+import time
+
+from config import Config
+from metrics import metrics
+from turn_log import TurnRecord
+
+
+log = logging.getLogger('jarvis')
+
+
+# Estado al que lleva cada intención devuelta por classify_intent
+INTENT_STATES = {
+    'register_user': 'register',
+    'identity_query': 'identity',
+    'stop': 'stop',
+    'greeting': 'greeting',
+    'local': 'local',
+    'question': 'answer'
+}
+
+
+class TurnState:
+    """Datos del turno en curso (se reinician al volver a esperar el wake word)"""
+
+    def __init__(self):
+        self.audio_file = None
+        self.query = None
+        self.intent = None
+        self.response = None
+        self.retries = 0
+        self.prompt_text = None
+        self.no_input_text = None
+        self.follow_up = False
+
+
+class DialogStateMachine:
+    """Máquina de estados dirigida por tabla para los turnos del asistente"""
+
+    MAX_RETRIES = 2
+
+    def __init__(self, assistant):
+        self.assistant = assistant
+        self.state = 'wait_wake'
+        self.turn = TurnState()
+        self.turn_count = 0
+        self.record = None
+        self._new_record()
+
+        # Tabla de estados: nombre -> manejador que retorna el siguiente estado
+        self.handlers = {
+            'wait_wake': self._wait_wake,
+            'prompt': self._prompt,
+            'transcribe': self._transcribe,
+            'classify': self._classify,
+            'register': self._register,
+            'identity': self._identity,
+            'stop': self._stop,
+            'greeting': self._greeting,
+            'local': self._local,
+            'answer': self._answer,
+            'interrupted': self._interrupted,
+            'follow_up': self._follow_up,
+            'end_turn': self._end_turn
+        }
+
+    # ==================== Bucle principal ====================
+
+    def step(self):
+        """
+        Ejecuta el estado actual y avanza al siguiente
+
+        Returns:
+            str: Nuevo estado ('shutdown' al terminar)
+        """
+        state = self.state
+        start = time.perf_counter()
+        try:
+            next_state = self.handlers[state]()
+        except Exception as e:
+            # Un fallo en un estado cierra el turno, no el asistente
+            log.error(f"❌ Error en estado '{state}': {e}")
+            metrics.inc('dialog.errors')
+            self.record.set(error=f"{state}: {e}")
+            self.assistant.speak("Disculpe señor, hubo un error", interruptible=False)
+            next_state = 'end_turn' if state != 'end_turn' else 'wait_wake'
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            metrics.inc(f'dialog.{state}.count')
+            metrics.set_gauge(f'dialog.{state}.last_ms', elapsed_ms)
+            # La espera del wake word es tiempo ocioso, no parte del turno
+            if state != 'wait_wake':
+                self.record.add_stage(state, elapsed_ms)
+
+        self.state = next_state
+        return next_state
+
+    def run(self, max_steps=None):
+        """
+        Ejecuta la máquina hasta 'shutdown'
+
+        Args:
+            max_steps: Límite de pasos (para pruebas); None = sin límite
+        """
+        steps = 0
+        try:
+            while self.state != 'shutdown':
+                if max_steps is not None and steps >= max_steps:
+                    break
+                self.step()
+                steps += 1
+        finally:
+            self._discard_audio()
+
+    # ==================== Utilidades ====================
+
+    def _new_record(self, **fields):
+        """Empieza el registro de un turno nuevo y lo comparte con el asistente"""
+        self.turn_count += 1
+        self.record = TurnRecord(self.turn_count)
+        self.record.set(**fields)
+        self.assistant.turn_record = self.record
+
+    def _finish_record(self, outcome):
+        """Entrega el registro del turno (una sola vez)"""
+        if self.record.logged:
+            return
+        self.record.logged = True
+        self.record.set(outcome=outcome)
+        self.assistant.log_turn(self.record.to_dict())
+
+    def _discard_audio(self):
+        """Elimina el audio temporal del turno si aún existe"""
+        audio_file = self.turn.audio_file
+        self.turn.audio_file = None
+        if audio_file and os.path.exists(audio_file):
+            try:
+                os.remove(audio_file)
+            except OSError:
+                pass
+
+    def _set_audio(self, audio_file):
+        """Sustituye el audio del turno eliminando el anterior"""
+        self._discard_audio()
+        self.turn.audio_file = audio_file
+
+    def _speak_answer(self, text, interruptible):
+        """Habla y decide si hay que atender una interrupción o seguir escuchando"""
+        self.assistant.speak(text, interruptible=interruptible)
+        if interruptible and self.assistant.should_stop_speaking:
+            return 'interrupted'
+        return 'follow_up' if Config.FOLLOW_UP_ENABLED else 'end_turn'
+
+    # ==================== Estados ====================
+
+    def _wait_wake(self):
+        """Espera el wake word y captura lo que venga detrás"""
+        self.turn = TurnState()
+
+        detected, audio_file = self.assistant.listen_for_wake_word_and_capture()
+        if not detected:
+            return 'shutdown'
+
+        self._new_record(trigger='wake')
+
+        if audio_file:
+            self._set_audio(audio_file)
+            return 'transcribe'
+
+        # No dijo nada tras el wake word: saludar y esperar la pregunta
+        self.turn.prompt_text = self.assistant.smart_greeting() + ". Dígame"
+        self.turn.no_input_text = "No he recibido ninguna pregunta, señor"
+        return 'prompt'
+
+    def _prompt(self):
+        """Habla (si procede) y captura una nueva pregunta"""
+        if self.turn.prompt_text:
+            self.assistant.speak(self.turn.prompt_text, interruptible=False)
+
+        audio_file = self.assistant.capture_question()
+        if not audio_file:
+            if self.turn.no_input_text:
+                self.assistant.speak(self.turn.no_input_text, interruptible=False)
+            else:
+                log.info("⏸️ Usuario no respondió, volviendo a esperar wake word")
+            self.record.set(outcome='no_input')
+            return 'end_turn'
+
+        self._set_audio(audio_file)
+        return 'transcribe'
+
+    def _transcribe(self):
+        """Transcribe el audio; reintenta primero con el mismo audio y luego pide repetir"""
+        audio_file = self.turn.audio_file
+
+        query = self.assistant.transcribe(audio_file, delete_after=False)
+        if not query:
+            # Sin texto o con poca confianza: con el mismo audio, otro backend o
+            # la siguiente alternativa memorizada, sin repetir la subida
+            query = self.assistant.transcribe(audio_file, delete_after=False)
+
+        if query:
+            self.turn.query = query
+            self.record.set(query=query, retries=self.turn.retries)
+            self.assistant.after_transcription(audio_file)
+            return 'classify'
+
+        if self.turn.follow_up:
+            # Probablemente ruido en la ventana de seguimiento: no insistir
+            return 'end_turn'
+
+        self.turn.retries += 1
+        if self.turn.retries < self.MAX_RETRIES:
+            self.turn.prompt_text = "Disculpe, no le he entendido bien. Por favor, repita"
+            self.turn.no_input_text = None
+            self._discard_audio()
+            return 'prompt'
+
+        self.assistant.speak("Lo siento señor, sigo sin entenderle", interruptible=False)
+        self.record.set(outcome='not_understood')
+        return 'end_turn'
+
+    def _classify(self):
+        """Clasifica la intención y elige el estado que la atiende"""
+        intent, response = self.assistant.classify_intent(self.turn.query)
+        log.debug(f"🧠 Intención detectada: {intent}")
+        self.record.set(intent=intent)
+
+        self.turn.intent = intent
+        self.turn.response = response
+
+        # El audio solo hace falta para registrar usuarios
+        if intent != 'register_user':
+            self._discard_audio()
+
+        return INTENT_STATES.get(intent, 'answer')
+
+    def _register(self):
+        """Registra al usuario con el audio del turno"""
+        name = self.turn.response
+        try:
+            if self.assistant.register_user(name, self.turn.audio_file):
+                greeting = self.assistant.smart_greeting()
+                self.assistant.speak(f"Encantado de conocerle, {greeting}", interruptible=False)
+            else:
+                self.assistant.speak("Disculpe señor, hubo un error al registrarle", interruptible=False)
+        except Exception as e:
+            log.error(f"❌ Error registrando usuario: {e}")
+            self.assistant.speak("Disculpe señor, hubo un error al registrarle", interruptible=False)
+        return 'end_turn'
+
+    def _identity(self):
+        prefix = self.assistant.smart_greeting()
+        self.assistant.speak(f"{prefix}. {self.turn.response}", interruptible=False)
+        return 'end_turn'
+
+    def _stop(self):
+        # Abortar lo que quede pendiente y confirmar
+        self.assistant.begin_turn('stop')
+        self.assistant.speak(self.turn.response, interruptible=False)
+        return 'end_turn'
+
+    def _greeting(self):
+        """Responde al saludo y espera la pregunta sin volver a pedir el wake word"""
+        self.turn.prompt_text = self.turn.response
+        self.turn.no_input_text = None
+        self.turn.retries = 0
+        return 'prompt'
+
+    def _local(self):
+        """Comando local (hora, fecha, despedidas...)"""
+        prefix = self.assistant.smart_greeting()
+        query = self.turn.query.lower()
+        response = self.turn.response
+
+        if any(word in query for word in ['hora', 'horas', 'fecha', 'día']):
+            full_answer = f"{prefix}, {response.lower()}"
+        else:
+            full_answer = f"{prefix}. {response}"
+
+        return self._speak_answer(full_answer, interruptible=False)
+
+    def _answer(self):
+        """Pregunta real: buscar y responder (interrumpible)"""
+        answer, citations = self.assistant.search_perplexity(self.turn.query)
+
+        if not answer:
+            self.assistant.speak("Lo siento señor, no he podido obtener una respuesta", interruptible=False)
+            self.record.set(outcome='no_answer')
+            return 'end_turn'
+
+        self.record.set(answer_chars=len(answer), citations=len(citations or []))
+
+        prefix = self.assistant.smart_greeting()
+        return self._speak_answer(f"{prefix}. {answer}", interruptible=True)
+
+    def _interrupted(self):
+        """Interrumpido con el wake word: pedir la nueva instrucción"""
+        log.info("\n💬 Jarvis fue interrumpido, esperando nueva instrucción...")
+        self._finish_record('interrupted')
+        self._new_record(trigger='interruption')
+        self.assistant.should_stop_speaking = False
+        self.assistant.begin_turn('interruption')
+
+        self.turn = TurnState()
+        self.turn.prompt_text = "¿Señor?"
+        self.turn.no_input_text = "Entendido, señor"
+        return 'prompt'
+
+    def _follow_up(self):
+        """Sigue escuchando unos segundos tras la respuesta, sin wake word"""
+        log.info(f"👂 Escuchando seguimiento ({Config.FOLLOW_UP_WINDOW:.0f}s)...")
+        self._discard_audio()
+
+        audio_file = self.assistant.capture_question(start_timeout=Config.FOLLOW_UP_WINDOW)
+        if not audio_file:
+            return 'end_turn'
+
+        metrics.inc('dialog.follow_ups')
+        self._finish_record('answered')
+        self._new_record(trigger='follow_up')
+        self.assistant.begin_turn('follow_up')
+        self.turn = TurnState()
+        self.turn.follow_up = True
+        self.turn.audio_file = audio_file
+        return 'transcribe'
+
+    def _end_turn(self):
+        self._discard_audio()
+        self._finish_record(self.record.fields.get('outcome', 'answered'))
+        log.info("\n" + "-" * 60 + "\n")
+        return 'wait_wake'
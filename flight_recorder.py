@@ -0,0 +1,419 @@
+"""
+Grabador de vuelo: últimos minutos de audio y eventos del diálogo
+
+Cuando alguien dice "Jarvis me ha cortado" o "no me ha oído" no hay nada
+que mirar: el audio se borra nada más transcribirlo. El grabador guarda
+siempre, en un archivo de tamaño fijo mapeado en memoria, los últimos
+FLIGHT_RECORDER_SECONDS de PCM del micrófono y los últimos
+FLIGHT_RECORDER_EVENTS eventos con su marca de tiempo (wake word, cambios
+del VAD, fin de frase, transcripción, intención, inicio y fin de la
+reproducción...).
+
+- El camino caliente no reserva memoria: el PCM se copia en el mapa con
+  memoryview y los contadores se escriben con struct.pack_into.
+- Cada evento guarda la posición del audio en ese instante, así que se
+  puede situar sobre la grabación. Sin front-end de audio solo se graba
+  mientras alguien lee el micrófono; en los huecos los eventos comparten
+  posición.
+- Con front-end de audio el PCM lo escribe el proceso de audio y los
+  eventos el asistente, sobre el mismo archivo.
+- Al ser un archivo, sobrevive a un cuelgue: al arrancar, el de la
+  ejecución anterior se conserva como *.prev.bin.
+
+El volcado crea un paquete (audio.wav, events.jsonl, meta.json) que se
+puede reproducir offline con el VAD actual para analizarlo o medir.
+
+Todo lo que se escribe contiene audio de la habitación: el archivo, su
+*.prev y los paquetes se crean solo legibles por el usuario (0600, 0700).
+
+Uso:
+    python control_socket.py dump                 # desde el asistente en marcha
+    python flight_recorder.py dump                # leyendo el archivo (también tras un cuelgue)
+    python flight_recorder.py dump --file logs/flight_recorder.prev.bin
+    python flight_recorder.py replay logs/flight/flight-20250101-120000
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import wave
+
+from config import Config
+from metrics import metrics
+
+
+MAGIC = b'JRVSFLT1'
+_HEADER = struct.Struct('<8sIIQQIIQd')  # magic, versión, Hz, capacidad PCM, PCM escrito, huecos, -, eventos, creado
+HEADER_SIZE = 64
+OFF_WRITTEN = 24
+OFF_COUNT = 40
+
+_U64 = struct.Struct('<Q')
+_EVENT = struct.Struct('<dQ16sH')  # hora, posición del PCM (bytes), tipo, longitud del detalle
+EVENT_SIZE = 128
+EVENT_HEADER = 8 + _EVENT.size     # Secuencia + campos fijos
+DETAIL_BYTES = EVENT_SIZE - EVENT_HEADER
+
+
+def _private_file(path, mode='wb', exclusive=False):
+    """
+    Abre un archivo solo legible por el usuario (0600), aunque ya existiera
+
+    Args:
+        path: Archivo
+        mode: Modo de open() ('wb', 'w+b', 'w'...)
+        exclusive: Fallar si ya existe
+    """
+    flags = os.O_CREAT | (os.O_RDWR if '+' in mode else os.O_WRONLY)
+    flags |= os.O_EXCL if exclusive else os.O_TRUNC
+    fd = os.open(path, flags, 0o600)
+    os.fchmod(fd, 0o600)
+    return os.fdopen(fd, mode, **({} if 'b' in mode else {'encoding': 'utf-8'}))
+
+
+class FlightRecorder:
+    """Buffer circular de PCM y eventos sobre un archivo mapeado en memoria"""
+
+    def __init__(self):
+        self.path = None
+        self.sample_rate = None
+        self.capacity = 0
+        self.event_slots = 0
+        self._mm = None
+        self._pcm = None
+        self._events_offset = 0
+        self._written = 0
+        self._pcm_lock = threading.Lock()
+        self._event_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._mm is not None
+
+    # ==================== Apertura ====================
+
+    def open(self, path=None, seconds=None, sample_rate=None, events=None):
+        """
+        Crea el archivo del grabador (el de la ejecución anterior pasa a *.prev)
+
+        Args:
+            path: Archivo (por defecto Config.FLIGHT_RECORDER_FILE)
+            seconds: Audio que se conserva (por defecto Config.FLIGHT_RECORDER_SECONDS)
+            sample_rate: Frecuencia del PCM (por defecto Config.SAMPLE_RATE)
+            events: Eventos que se conservan (por defecto Config.FLIGHT_RECORDER_EVENTS)
+        """
+        self.close()
+        path = path or Config.FLIGHT_RECORDER_FILE
+        sample_rate = sample_rate or Config.SAMPLE_RATE
+        capacity = int((seconds or Config.FLIGHT_RECORDER_SECONDS) * sample_rate) * 2
+        slots = events or Config.FLIGHT_RECORDER_EVENTS
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path):
+            base, ext = os.path.splitext(path)
+            os.replace(path, f"{base}.prev{ext}")
+            # Puede venir de una versión que lo creaba legible por todos
+            os.chmod(f"{base}.prev{ext}", 0o600)
+
+        size = HEADER_SIZE + capacity + slots * EVENT_SIZE
+        with _private_file(path, 'w+b') as f:
+            f.truncate(size)  # Archivo disperso: solo ocupa lo que se va escribiendo
+            mm = mmap.mmap(f.fileno(), size)
+        _HEADER.pack_into(mm, 0, MAGIC, 1, sample_rate, capacity, 0, slots, 0, 0, time.time())
+        self._map(path, mm)
+
+    def attach(self, path=None, readonly=False):
+        """
+        Abre un archivo ya creado (proceso de audio, o lectura offline)
+
+        Raises:
+            ValueError: Si el archivo no es de un grabador de vuelo
+        """
+        self.close()
+        path = path or Config.FLIGHT_RECORDER_FILE
+        with open(path, 'rb' if readonly else 'r+b') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        if mm[:8] != MAGIC:
+            mm.close()
+            raise ValueError(f"{path} no es un archivo del grabador de vuelo")
+        self._map(path, mm)
+
+    def _map(self, path, mm):
+        _, _, sample_rate, capacity, written, slots, _, _, _ = _HEADER.unpack_from(mm, 0)
+        self.path = path
+        self.sample_rate = sample_rate
+        self.capacity = capacity
+        self.event_slots = slots
+        self._events_offset = HEADER_SIZE + capacity
+        self._written = written
+        self._mm = mm
+        self._pcm = memoryview(mm)[HEADER_SIZE:HEADER_SIZE + capacity]
+
+    def close(self):
+        with self._pcm_lock, self._event_lock:
+            if self._mm is None:
+                return
+            mm, self._mm = self._mm, None
+            self._pcm.release()
+            self._pcm = None
+            mm.close()
+
+    # ==================== Camino caliente ====================
+
+    def write_pcm(self, data, rate=None):
+        """
+        Añade PCM int16 mono al buffer circular
+
+        Args:
+            data: Bytes del frame
+            rate: Frecuencia del frame (se ignora si no es la del grabador)
+        """
+        if self._pcm is None or (rate is not None and rate != self.sample_rate):
+            return
+
+        view = memoryview(data)
+        n = len(view)
+        if n > self.capacity:
+            view = view[n - self.capacity:]
+            n = self.capacity
+
+        with self._pcm_lock:
+            pcm = self._pcm
+            if pcm is None:
+                return
+            pos = self._written % self.capacity
+            first = min(n, self.capacity - pos)
+            pcm[pos:pos + first] = view[:first]
+            if first < n:
+                pcm[:n - first] = view[first:]
+            self._written += n
+            _U64.pack_into(self._mm, OFF_WRITTEN, self._written)
+
+    def event(self, kind, **fields):
+        """
+        Anota un evento con la hora y la posición actual del audio
+
+        Args:
+            kind: Tipo ('wake', 'vad', 'endpoint', 'stt', 'intent'...)
+            **fields: Detalle (JSON, se recorta a DETAIL_BYTES)
+        """
+        if self._mm is None:
+            return
+
+        detail = json.dumps(fields, ensure_ascii=False, separators=(',', ':')).encode('utf-8') if fields else b''
+        detail = detail[:DETAIL_BYTES]
+
+        with self._event_lock:
+            mm = self._mm
+            if mm is None:
+                return
+            seq = _U64.unpack_from(mm, OFF_COUNT)[0]
+            offset = self._events_offset + (seq % self.event_slots) * EVENT_SIZE
+            position = _U64.unpack_from(mm, OFF_WRITTEN)[0]
+            # Secuencia a 0 mientras se escribe: un lector descarta el hueco a medias
+            _U64.pack_into(mm, offset, 0)
+            _EVENT.pack_into(mm, offset + 8, time.time(), position, kind.encode('utf-8')[:16], len(detail))
+            mm[offset + EVENT_HEADER:offset + EVENT_HEADER + len(detail)] = detail
+            _U64.pack_into(mm, offset, seq + 1)
+            _U64.pack_into(mm, OFF_COUNT, seq + 1)
+
+    # ==================== Volcado ====================
+
+    def snapshot(self):
+        """
+        Copia el audio (del más antiguo al más reciente) y los eventos
+
+        Returns:
+            tuple: (bytes PCM, posición absoluta en bytes del primer byte, lista de eventos)
+        """
+        mm = self._mm
+        capacity = self.capacity
+        written = _U64.unpack_from(mm, OFF_WRITTEN)[0]
+
+        if written <= capacity:
+            start = 0
+            audio = bytes(self._pcm[:written])
+        else:
+            start = written - capacity
+            pos = written % capacity
+            audio = bytes(self._pcm[pos:]) + bytes(self._pcm[:pos])
+
+        # Lo que el proceso de audio escribió durante la copia pisó el principio
+        after = _U64.unpack_from(mm, OFF_WRITTEN)[0]
+        lost = max(0, after - capacity - start)
+        lost += lost % 2
+        if lost:
+            audio = audio[lost:]
+            start += lost
+
+        events = []
+        for slot in range(self.event_slots):
+            offset = self._events_offset + slot * EVENT_SIZE
+            seq = _U64.unpack_from(mm, offset)[0]
+            if not seq:
+                continue
+            when, position, kind, length = _EVENT.unpack_from(mm, offset + 8)
+            raw = bytes(mm[offset + EVENT_HEADER:offset + EVENT_HEADER + length]).decode('utf-8', 'replace')
+            try:
+                detail = json.loads(raw) if raw else {}
+            except ValueError:
+                detail = {'raw': raw}  # Detalle recortado
+            sample = (position - start) // 2
+            events.append({
+                'seq': seq,
+                'time': round(when, 3),
+                'kind': kind.rstrip(b'\0').decode('utf-8', 'replace'),
+                'sample': sample,
+                'seconds': round(sample / self.sample_rate, 3),
+                **detail
+            })
+        events.sort(key=lambda e: e['seq'])
+        return audio, start, events
+
+    def dump(self, directory=None):
+        """
+        Escribe un paquete reproducible con el contenido actual
+
+        Returns:
+            str: Directorio del paquete
+        """
+        audio, start, events = self.snapshot()
+        directory = directory or Config.FLIGHT_RECORDER_DUMP_DIR
+        bundle = os.path.join(directory, time.strftime('flight-%Y%m%d-%H%M%S'))
+        suffix = 1
+        while os.path.exists(bundle):
+            bundle = os.path.join(directory, time.strftime('flight-%Y%m%d-%H%M%S') + f"-{suffix}")
+            suffix += 1
+        os.makedirs(bundle, mode=0o700)
+
+        with _private_file(os.path.join(bundle, 'audio.wav'), exclusive=True) as f, wave.open(f, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(audio)
+
+        with _private_file(os.path.join(bundle, 'events.jsonl'), 'w', exclusive=True) as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+        created = _HEADER.unpack_from(self._mm, 0)[8]
+        meta = {
+            'source': self.path,
+            'sample_rate': self.sample_rate,
+            'samples': len(audio) // 2,
+            'seconds': round(len(audio) / 2 / self.sample_rate, 3),
+            'start_sample': start // 2,
+            'events': len(events),
+            'recorder_created': created,
+            'dumped_at': time.time()
+        }
+        with _private_file(os.path.join(bundle, 'meta.json'), 'w', exclusive=True) as f:
+            json.dump(meta, f, indent=2)
+
+        metrics.inc('flight_recorder.dumps')
+        return bundle
+
+    def control_command(self, args):
+        """Comando 'dump' del socket de control: dump [directorio]"""
+        if not self.enabled:
+            return "El grabador de vuelo está desactivado"
+        bundle = self.dump(args[0] if args else None)
+        return f"Paquete guardado en {bundle}"
+
+
+def load_bundle(bundle):
+    """
+    Lee un paquete volcado
+
+    Returns:
+        tuple: (np.ndarray int16, frecuencia, lista de eventos, meta)
+    """
+    import numpy as np
+
+    with wave.open(os.path.join(bundle, 'audio.wav'), 'rb') as wav:
+        sample_rate = wav.getframerate()
+        audio = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    with open(os.path.join(bundle, 'events.jsonl'), encoding='utf-8') as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    with open(os.path.join(bundle, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    return audio, sample_rate, events, meta
+
+
+def replay(bundle, block_frames=100):
+    """
+    Pasa el audio del paquete por el VAD actual y lo compara con lo grabado
+
+    Sirve para ver por qué se cortó una frase y, con la velocidad que se
+    imprime, como banco de pruebas del VAD con audio real.
+    """
+    from vad_stage import VadStage
+
+    audio, sample_rate, events, meta = load_bundle(bundle)
+    frame_samples = int(sample_rate * 0.03)
+    usable = len(audio) - len(audio) % frame_samples
+    frames = [audio[i:i + frame_samples].tobytes() for i in range(0, usable, frame_samples)]
+
+    vad = VadStage(sample_rate, frame_samples)
+    transitions = []
+    speech = False
+    start = time.perf_counter()
+    for i in range(0, len(frames), block_frames):
+        _, decisions = vad.process(frames[i:i + block_frames])
+        for j, decision in enumerate(decisions.tolist()):
+            if decision != speech:
+                speech = decision
+                transitions.append(((i + j) * frame_samples / sample_rate, speech))
+    elapsed = time.perf_counter() - start
+
+    seconds = usable / sample_rate
+    print(f"🎞️ {bundle}: {seconds:.1f}s de audio, {len(events)} eventos")
+
+    timeline = [(e['seconds'], f"{e['kind']:16s} " + json.dumps(
+        {k: v for k, v in e.items() if k not in ('seq', 'time', 'kind', 'sample', 'seconds')},
+        ensure_ascii=False
+    )) for e in events]
+    timeline += [(t, f"{'vad (replay)':16s} {'voz' if s else 'silencio'}") for t, s in transitions]
+    for when, text in sorted(timeline, key=lambda item: item[0]):
+        print(f"  {when:8.2f}s  {text}")
+
+    speed = seconds / elapsed if elapsed else float('inf')
+    print(f"⏱️ VAD: {seconds:.1f}s de audio en {elapsed * 1000:.0f} ms ({speed:.0f}x tiempo real), "
+          f"{vad.speech_frames * 100 / max(1, vad.frames):.0f}% de frames con voz")
+
+
+# Instancia global (el micrófono y el diálogo escriben aquí desde cualquier módulo)
+recorder = FlightRecorder()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grabador de vuelo de Jarvis")
+    sub = parser.add_subparsers(dest='command', required=True)
+    dump = sub.add_parser('dump', help="Vuelca el archivo del grabador a un paquete")
+    dump.add_argument('--file', default=Config.FLIGHT_RECORDER_FILE)
+    dump.add_argument('--out', default=None, help="Directorio de destino")
+    play = sub.add_parser('replay', help="Repite el VAD sobre un paquete volcado")
+    play.add_argument('bundle')
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        replay(args.bundle)
+        return
+
+    source = FlightRecorder()
+    try:
+        source.attach(args.file, readonly=True)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"💾 Paquete guardado en {source.dump(args.out)}")
+    source.close()
+
+
+if __name__ == "__main__":
+    main()
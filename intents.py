@@ -0,0 +1,127 @@
+"""
+Clasificación de intenciones
+
+Decide, sin llamadas externas, si una frase es un registro de usuario, una
+consulta de identidad, una parada, un saludo, un comando local o una
+pregunta que hay que buscar. La usan tanto el asistente de una sala como el
+servidor multi-sala.
+"""
+
+import re
+
+from utils import is_local_command
+
+
+def classify_intent(text, skills=None, current_user=None, greet=None):
+    """
+    Clasifica la intención del texto para decidir si buscar o no
+    
+    Args:
+        text: Texto transcrito del usuario
+        skills: SkillRegistry con las habilidades locales (opcional)
+        current_user: Nombre del usuario identificado (o None)
+        greet: Función que retorna el saludo (solo se llama si es un saludo)
+        
+    Returns:
+        tuple: (intención, respuesta o None)
+    """
+    text_lower = text.lower()
+    words = text_lower.split()
+    # Detectar comando de registro de usuario de forma más específica
+    # Solo si la frase es CORTA y directa
+    if len(words) <= 8:  # Máximo 5 palabras
+        if 'soy' in text_lower or 'me llamo' in text_lower or 'mi nombre es' in text_lower:
+            patterns = [
+                r'^soy\s+([a-záéíóúñ]+)$',  # "soy Maxi"
+                r'^me llamo\s+([a-záéíóúñ]+)$',  # "me llamo Maxi"
+                r'^mi nombre es\s+([a-záéíóúñ]+)$'  # "mi nombre es Maxi"
+            ]
+            
+            for pattern in patterns:
+                match = re.search(pattern, text_lower.strip())
+                if match:
+                    name = match.group(1).capitalize()
+                    return 'register_user', name
+    
+    # Detectar preguntas sobre identidad propia
+    if len(words) <= 6:  # Solo frases cortas
+        identity_patterns = [
+            'cómo me llamo', 'como me llamo',
+            'cuál es mi nombre', 'cual es mi nombre',
+            'quién soy yo', 'quien soy yo',  
+            'quién soy', 'quien soy',  # Mantener pero solo en frases cortas
+            'cómo me dices', 'como me dices',
+            'mi nombre'
+        ]
+        
+        # Verificar que el patrón sea la pregunta principal, no parte de algo más grande
+        if any(text_lower == pattern or text_lower.startswith(pattern + ' ') for pattern in identity_patterns):
+            if current_user:
+                return 'identity_query', f"Su nombre es {current_user}, señor"
+            else:
+                return 'identity_query', "Disculpe, aún no me ha dicho su nombre. Puede decirme 'me llamo [su nombre]'"
+    
+    # HABILIDADES LOCALES (antes de las paradas: "para el temporizador")
+    skill_response = skills.dispatch(text) if skills else None
+    if skill_response:
+        return 'local', skill_response
+    
+    # COMANDOS DE PARADA
+    stop_patterns = [
+        'para', 'detente', 'cállate', 'basta', 'silencio', 'stop', 'calla',
+        'nada', 'olvida', 'déjalo', 'vale', 'ok', 'está bien',
+        'no hace falta', 'no necesito', 'no importa', 'no pasa nada',
+        'ya está', 'suficiente', 'no más', 'no sigas', 'no continues'
+    ]
+    
+    if any(pattern in text_lower for pattern in stop_patterns):
+        return 'stop', 'Entendido, señor'
+    
+    # SALUDOS
+    greeting_patterns = [
+        'hola', 'buenos días', 'buenas tardes', 'buenas noches', 
+        'qué tal', 'cómo estás', 'hey', 'buenas'
+    ]
+    
+    if any(pattern in text_lower for pattern in greeting_patterns):
+        greeting = greet() if greet else "Señor"
+        return 'greeting', f"{greeting}. ¿En qué puedo ayudarle?"
+    
+    # COMANDOS LOCALES (hora, fecha, etc.)
+    local_response = is_local_command(text)
+    if local_response:
+        return 'local', local_response
+    
+    # AFIRMACIONES/NEGACIONES SIMPLES
+    simple_responses = [
+        'sí', 'si', 'no', 'claro', 'por supuesto', 'evidentemente',
+        'tal vez', 'quizás', 'puede ser'
+    ]
+    
+    if len(words) <= 2 and any(word in simple_responses for word in words):
+        return 'stop', 'Entendido, señor'
+    
+    # DETECTAR PREGUNTAS REALES
+    question_words = [
+        'qué', 'que', 'quién', 'quien', 'cuál', 'cual', 'cuáles', 'cuales',
+        'cómo', 'como', 'cuándo', 'cuando', 'cuánto', 'cuanto', 'cuánta', 'cuanta',
+        'dónde', 'donde', 'por qué', 'por que', 'para qué', 'para que'
+    ]
+    
+    search_verbs = [
+        'busca', 'buscar', 'dime', 'cuéntame', 'explícame', 'háblame',
+        'necesito saber', 'quiero saber', 'investiga', 'averigua', 'quiero que'
+    ]
+    
+    has_question_word = any(word in text_lower for word in question_words)
+    has_search_verb = any(verb in text_lower for verb in search_verbs)
+    
+    if has_question_word or has_search_verb:
+        return 'question', None
+    
+    # RESPUESTAS SIMPLES
+    if len(words) <= 4:
+        return 'stop', 'Entendido, señor'
+    
+    # POR DEFECTO: pregunta
+    return 'question', None
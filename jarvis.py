@@ -10,11 +10,10 @@ import struct
 import threading
 import numpy as np
 import speech_recognition as sr
-import webrtcvad
 from google.cloud import texttospeech
 import google.generativeai as genai
-import requests
 import pygame
+import logging
 import os
 import sys
 import tempfile
@@ -24,11 +23,38 @@ from config import Config
 from utils import (
     save_audio_to_wav, 
     get_greeting, 
-    is_local_command,
     format_citations,
     clean_text_for_speech
 )
 from user_manager import UserManager
+from low_power import EnergyGate
+from audio_frontend import AudioFrontend, AudioFrontendError, MicrophoneCapture
+from audio_monitor import MonitoredInput, PlaybackMonitor
+from vad_stage import VadStage
+from wake_verifier import WakeWordVerifier
+from command_spotter import CommandSpotter
+from transcribers import GoogleTranscriber, LocalTranscriber, TranscriptionPolicy
+from upload_payload import PayloadTracker, trim_frames
+from answer_engine import AnswerEngine, AnswerError, PerplexityBackend, GeminiBackend
+from tts import TTSEngine, TTSUnavailable, beep_wav
+from tts_cache import TTSDiskCache
+from tts_stream import ChunkPlayer, split_sentences
+from cancellation import CancelToken, TurnContext, Cancelled
+from conversation import ConversationHistory
+from knowledge_base import KnowledgeBase
+from prefetch import Prefetcher
+from skills import build_registry
+from intents import classify_intent
+from turn_log import TurnLogWriter, TurnRecord, setup_console_logging
+from dialog import DialogStateMachine
+from metrics import metrics
+from profiler import profiler
+from flight_recorder import recorder
+from control_socket import ControlServer
+from resilience import resilience
+
+
+log = logging.getLogger('jarvis')
 
 class JarvisAssistant:
     """Asistente de voz Jarvis con detección de wake word y procesamiento de consultas"""
@@ -48,11 +74,16 @@ class JarvisAssistant:
             sys.exit(1)
         
         # Inicializar componentes
+        self._init_recorder()
         self._init_wake_word()
         self._init_stt()
         self._init_llm()
+        self._init_answer_engine()
         self._init_tts()
         self._init_audio()
+        self._init_skills()
+        self._init_prefetch()
+        self._init_control()
         
         # Estado interno
         self.is_recording = False
@@ -64,21 +95,60 @@ class JarvisAssistant:
         #  Control de interrupción
         self.is_speaking = False
         self.should_stop_speaking = False
+        # Turno actual: todo su trabajo de red y reproducción es cancelable
+        self.turn = TurnContext()
+        # Registro estructurado del turno (lo renueva la máquina de estados)
+        self.turn_record = TurnRecord()
+        self.turn_log = TurnLogWriter() if Config.TURN_LOG_ENABLED else None
         print("\n" + "=" * 60)
         print("✅ JARVIS LISTO PARA SERVIR")
         print("=" * 60)
         print(f"📢 Di '{Config.WAKE_WORD.upper()}' seguido de tu pregunta")
         print("🛑 Presiona Ctrl+C para salir\n")
     
+    def _init_recorder(self):
+        """Grabador de vuelo (antes que el micrófono: el front-end escribe en él)"""
+        if not Config.FLIGHT_RECORDER_ENABLED:
+            return
+        try:
+            recorder.open()
+            print(f"✅ Grabador de vuelo: últimos {Config.FLIGHT_RECORDER_SECONDS}s de audio y eventos")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Grabador de vuelo no disponible: {e}")
+    
     def _init_wake_word(self):
-        """Inicializa detección de wake word con Porcupine"""
+        """Inicializa detección de wake word con Porcupine (aquí o en el front-end de audio)"""
+        self.frontend = None
+        self.wake_gate = None
         try:
-            self.porcupine = pvporcupine.create(
-                access_key=Config.PICOVOICE_KEY,
-                keywords=[Config.WAKE_WORD],
-                sensitivities=[0.7]  #  0.0-1.0 (más alto = más sensible)
-            )
-            print(f"✅ Wake word '{Config.WAKE_WORD}' configurado (sensibilidad: 0.7)")
+            if Config.AUDIO_FRONTEND_ENABLED:
+                # Micrófono, Porcupine y VAD en su propio proceso: nunca esperan al asistente
+                self.frontend = AudioFrontend()
+                self.frontend.start()
+                self.wake_sample_rate = self.frontend.sample_rate
+                print(f"✅ Wake word '{Config.WAKE_WORD}' en el front-end de audio (PID {self.frontend.pid})")
+                if Config.LOW_POWER_MODE:
+                    print("🔋 Modo bajo consumo activado")
+            else:
+                self.porcupine = pvporcupine.create(
+                    access_key=Config.PICOVOICE_KEY,
+                    keywords=[Config.WAKE_WORD],
+                    sensitivities=[0.7]  #  0.0-1.0 (más alto = más sensible)
+                )
+                self.wake_sample_rate = self.porcupine.sample_rate
+                print(f"✅ Wake word '{Config.WAKE_WORD}' configurado (sensibilidad: 0.7)")
+                
+                # Modo bajo consumo: solo procesar frames con actividad
+                if Config.LOW_POWER_MODE:
+                    self.wake_gate = EnergyGate(
+                        self.porcupine.frame_length,
+                        self.porcupine.sample_rate
+                    )
+                    print("🔋 Modo bajo consumo activado")
+            
+            # Verificación local antes de gastar llamadas a la nube
+            self.wake_verifier = WakeWordVerifier() if Config.WAKE_VERIFY_ENABLED else None
+            self.last_wake_audio = None
         except Exception as e:
             print(f"❌ Error inicializando Porcupine: {e}")
             print("💡 Verifica tu PICOVOICE_ACCESS_KEY en .env")
@@ -92,17 +162,48 @@ class JarvisAssistant:
         self.recognizer.dynamic_energy_threshold = True
         self.recognizer.pause_threshold = 0.8
         print("✅ Google Speech-to-Text configurado")
+        
+        # Backends de transcripción (nube + ASR local opcional)
+        self.payload_tracker = PayloadTracker()
+        backends = [GoogleTranscriber(self.recognizer, self.payload_tracker)]
+        if Config.LOCAL_ASR_ENABLED:
+            print("⏳ Cargando ASR local en segundo plano...")
+            backends.append(LocalTranscriber())
+        self.stt_policy = TranscriptionPolicy(backends)
+        
+        # Comandos cortos reconocidos en local antes de usar la nube
+        self.command_spotter = CommandSpotter() if Config.LOCAL_COMMANDS_ENABLED else None
     
     def _init_llm(self):
         """Inicializa Gemini LLM (opcional, se usa Perplexity principalmente)"""
         try:
             genai.configure(api_key=Config.GOOGLE_API_KEY)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
+            self.model = genai.GenerativeModel(
+                'gemini-2.5-flash',
+                system_instruction=Config.SYSTEM_PROMPT
+            )
             print("✅ Gemini LLM configurado")
         except Exception as e:
             print(f"⚠️ Gemini no disponible: {e}")
             self.model = None
     
+    def _init_answer_engine(self):
+        """Inicializa el motor de respuestas (Perplexity con cobertura de Gemini)"""
+        hedges = []
+        if self.model and Config.HEDGE_ENABLED:
+            hedges.append(GeminiBackend(self.model))
+        
+        self.answer_engine = AnswerEngine(PerplexityBackend(), hedges)
+        self.conversation = ConversationHistory()
+        self.knowledge = None
+        if Config.KNOWLEDGE_ENABLED:
+            self.knowledge = KnowledgeBase()
+        
+        if hedges:
+            print("✅ Motor de respuestas: Perplexity + cobertura con Gemini")
+        else:
+            print("✅ Motor de respuestas: Perplexity")
+    
     def _init_tts(self):
         """Inicializa Text-to-Speech con Google"""
         try:
@@ -123,18 +224,87 @@ class JarvisAssistant:
                 speaking_rate=Config.TTS_SPEAKING_RATE,
                 pitch=Config.TTS_PITCH
             )
+            
+            disk_cache = TTSDiskCache() if Config.TTS_DISK_CACHE_ENABLED else None
+            self.tts = TTSEngine(self.tts_client, self.voice, self.audio_config, disk_cache)
+            # Frases fijas guardadas para seguir hablando si Google TTS cae
+            self.tts.warm_up(Config.TTS_WARM_PHRASES)
+            
+            # Respuestas de varias frases: trozos WAV que se encadenan según llegan
+            self.stream_tts = TTSEngine(
+                self.tts_client,
+                self.voice,
+                texttospeech.AudioConfig(
+                    audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+                    sample_rate_hertz=Config.TTS_STREAM_SAMPLE_RATE,
+                    speaking_rate=Config.TTS_SPEAKING_RATE,
+                    pitch=Config.TTS_PITCH
+                ),
+                disk_cache,
+                # El WAV ocupa diez veces más que el MP3: la reutilización queda en disco
+                phrase_cache_size=0
+            )
             print("✅ Google Text-to-Speech configurado")
         except Exception as e:
             print(f"❌ Error inicializando TTS: {e}")
             print("💡 Verifica google-credentials.json")
             sys.exit(1)
     
+    def _init_skills(self):
+        """Inicializa las habilidades locales (temporizadores, alarmas, cálculos...)"""
+        # Evita que un aviso de temporizador se solape con otra respuesta
+        self.speech_lock = threading.RLock()
+        self.skills, self.scheduler = build_registry(self.announce)
+        print(f"✅ Habilidades locales: {', '.join(s.name for s in self.skills.skills)}")
+    
+    def _init_prefetch(self):
+        """Inicializa la precarga de respuestas previsibles según la hora"""
+        self.prefetcher = None
+        if not Config.PREFETCH_ENABLED:
+            return
+        
+        def render(answer):
+            # Mismo texto que se hablará, para aprovechar el audio presintetizado
+            user_name = self.user_manager.get_current_user()
+            user_suffix = f" {user_name}" if user_name else ""
+            return clean_text_for_speech(f"Señor{user_suffix}. {answer}")
+        
+        # Las respuestas empiezan por "Señor." y siempre se hablan por trozos
+        # con stream_tts: se preparan esos trozos. Solo el del saludo puede
+        # cambiar ("Buenos días, señor"); el resto es idéntico
+        if Config.TTS_STREAM_ENABLED:
+            self.prefetcher = Prefetcher(self.answer_engine, self.stream_tts, render, split=split_sentences)
+        else:
+            self.prefetcher = Prefetcher(self.answer_engine, self.tts, render)
+        self.prefetcher.start()
+        print("✅ Precarga de respuestas activada")
+    
+    def _init_control(self):
+        """Perfilado bajo demanda (SIGUSR1) y socket local de control"""
+        if profiler.install_signal():
+            print(f"🔬 Perfilador disponible: kill -USR1 {os.getpid()}")
+        
+        self.control = None
+        if not Config.CONTROL_SOCKET_ENABLED:
+            return
+        
+        self.control = ControlServer()
+        self.control.register('profile', profiler.control_command, "Perfil por muestreo: profile [segundos|stop|status]")
+        self.control.register('dump', recorder.control_command, "Vuelca el grabador de vuelo: dump [directorio]")
+        try:
+            self.control.start()
+            print(f"✅ Socket de control en {self.control.address}")
+        except OSError as e:
+            print(f"⚠️ Socket de control no disponible: {e}")
+            self.control = None
+    
     def _init_audio(self):
         """Inicializa sistema de audio (PyAudio y pygame)"""
         try:
             self.pa = pyaudio.PyAudio()
             pygame.mixer.init()
-            self.vad = webrtcvad.Vad(Config.VAD_AGGRESSIVENESS)
+            # VAD con suelo de ruido (se conserva entre capturas)
+            self.vad = VadStage()
             print("✅ Sistema de audio configurado")
         except Exception as e:
             print(f"❌ Error inicializando audio: {e}")
@@ -177,313 +347,323 @@ class JarvisAssistant:
         return f"Señor{user_suffix}"
 
 
+    @profiler.marked('listen')
     def listen_for_wake_word_and_capture(self):
         """
         Escucha el wake word Y captura automáticamente lo que viene después
         """
+        log.info(f"\n🎤 Escuchando '{Config.WAKE_WORD}'...")
+        
+        try:
+            self.last_wake_audio = self._wait_for_wake()
+            self.begin_turn('wake')
+            
+            log.info(f"✅ '{Config.WAKE_WORD.upper()}' detectado!")
+            self.play_confirmation_sound()
+            log.info("🎧 Capturando pregunta...")
+            
+            post_wake_frames = []
+            speech_flags = []
+            speech_detected = False
+            
+            # Tiempo de audio leído, no de reloj: con el micrófono es lo mismo,
+            # y con audio simulado más rápido que tiempo real (soak_test.py) también
+            max_wait_time = 5  # Máximo 5 segundos de espera
+            silence_duration = 2  # 2 segundos de silencio para terminar
+            
+            audio_time = 0.0
+            last_speech_time = 0.0
+            was_speech = False
+            
+            source = self._open_capture()
+            recorder.event('capture', mode='wake')
+            
+            while True:
+                frame, is_speech = source.read()
+                post_wake_frames.append(frame)
+                speech_flags.append(is_speech)
+                audio_time += len(frame) / 2 / Config.SAMPLE_RATE
+                
+                if is_speech != was_speech:
+                    was_speech = bool(is_speech)
+                    recorder.event('vad', speech=was_speech)
+                
+                if is_speech:
+                    speech_detected = True
+                    last_speech_time = audio_time
+                
+                # Tiempo transcurrido desde última voz
+                silence_time = audio_time - last_speech_time
+                total_time = audio_time
+                
+                # Si detectó voz y luego 2 segundos de silencio, terminar
+                if speech_detected and silence_time >= silence_duration:
+                    log.info("🛑 Pregunta capturada (2 segundos de silencio)")
+                    recorder.event('endpoint', reason='silence')
+                    break
+                
+                # Si pasaron 5 segundos sin detectar voz, asumir que no dijo nada
+                if not speech_detected and total_time >= max_wait_time:
+                    log.info("⏸️ No se detectó pregunta continua")
+                    recorder.event('endpoint', reason='no_speech')
+                    break
+                
+                # Timeout máximo de 10 segundos total
+                if total_time >= 10:
+                    log.info("⏱️ Tiempo máximo alcanzado")
+                    recorder.event('endpoint', reason='max_time')
+                    break
+            
+            source.close()
+            
+            if not speech_detected:
+                return True, None
+            
+            return True, self._save_capture(post_wake_frames, speech_flags)
+                    
+        except KeyboardInterrupt:
+            log.info("\n\n👋 Apagando Jarvis...")
+            return False, None
+        except AudioFrontendError as e:
+            # Sin micrófono no hay nada que hacer: apagar en lugar de reintentar en bucle
+            log.error(f"❌ Front-end de audio detenido: {e}")
+            return False, None
+    
+    @profiler.marked('wake_loop')
+    def _wait_for_wake(self):
+        """
+        Bloquea hasta detectar (y verificar) el wake word
+        
+        Returns:
+            bytes: Audio previo a la detección (para el verificador)
+        """
+        if self.frontend:
+            # Las detecciones de mientras se hablaba o grababa ya no cuentan
+            self.frontend.clear_events()
+        
+        while True:
+            if self.frontend:
+                event = self.frontend.wait_wake(timeout=0.5)
+                if event is None:
+                    continue
+                wake_audio = self.frontend.recent(event['seq'], 2)
+            else:
+                wake_audio = self._detect_wake_in_process()
+            
+            if self.wake_verifier and not self.wake_verifier.verify(
+                wake_audio, self.wake_sample_rate
+            ):
+                recorder.event('wake_rejected')
+                continue
+            recorder.event('wake')
+            return wake_audio
+    
+    def _detect_wake_in_process(self):
+        """Porcupine en este proceso (sin front-end de audio); retorna los 2 s previos"""
         from collections import deque
         
-        audio_stream = self.pa.open(
-            rate=self.porcupine.sample_rate,
-            channels=1,
-            format=pyaudio.paInt16,
-            input=True,
-            frames_per_buffer=self.porcupine.frame_length
+        audio_stream = MonitoredInput(
+            self.pa,
+            self.porcupine.sample_rate,
+            self.porcupine.frame_length,
+            name='wake'
         )
         
-        print(f"\n🎤 Escuchando '{Config.WAKE_WORD}'...")
-        
         buffer_seconds = 2
         buffer_size = int(buffer_seconds * self.porcupine.sample_rate / self.porcupine.frame_length)
         audio_buffer = deque(maxlen=buffer_size)
         
         try:
             while True:
-                pcm = audio_stream.read(
-                    self.porcupine.frame_length, 
-                    exception_on_overflow=False
-                )
-                pcm_unpacked = struct.unpack_from(
-                    "h" * self.porcupine.frame_length, 
-                    pcm
-                )
+                pcm = audio_stream.read()
                 
                 audio_buffer.append(pcm)
-                keyword_index = self.porcupine.process(pcm_unpacked)
+                
+                if self.wake_gate:
+                    keyword_index = self.wake_gate.detect(pcm, self._process_wake_frame)
+                else:
+                    keyword_index = self._process_wake_frame(pcm)
                 
                 if keyword_index >= 0:
-                    print(f"✅ '{Config.WAKE_WORD.upper()}' detectado!")
-                    self.play_confirmation_sound()
-                    print("🎧 Capturando pregunta...")
-                    
-                    post_wake_frames = []
-                    speech_detected = False
-                    
-                    # Usar tiempo real 
-                    max_wait_time = 5  # Máximo 5 segundos de espera
-                    silence_duration = 2  # 2 segundos de silencio para terminar
-                    
-                    last_speech_time = time.time()
-                    start_time = time.time()
-                    
-                    vad_stream = self.pa.open(
-                        rate=16000,
-                        channels=1,
-                        format=pyaudio.paInt16,
-                        input=True,
-                        frames_per_buffer=480
-                    )
-                    
-                    while True:
-                        frame = vad_stream.read(480, exception_on_overflow=False)
-                        post_wake_frames.append(frame)
-                        
-                        # Detectar si hay voz
-                        try:
-                            is_speech = self.vad.is_speech(frame, 16000)
-                        except:
-                            is_speech = False
-                        
-                        if is_speech:
-                            speech_detected = True
-                            last_speech_time = time.time()
-                        
-                        # Tiempo transcurrido desde última voz
-                        silence_time = time.time() - last_speech_time
-                        total_time = time.time() - start_time
-                        
-                        # Si detectó voz y luego 2 segundos de silencio, terminar
-                        if speech_detected and silence_time >= silence_duration:
-                            print("🛑 Pregunta capturada (2 segundos de silencio)")
-                            break
-                        
-                        # Si pasaron 5 segundos sin detectar voz, asumir que no dijo nada
-                        if not speech_detected and total_time >= max_wait_time:
-                            print("⏸️ No se detectó pregunta continua")
-                            break
-                        
-                        # Timeout máximo de 10 segundos total
-                        if total_time >= 10:
-                            print("⏱️ Tiempo máximo alcanzado")
-                            break
-                    
-                    vad_stream.close()
-                    audio_stream.close()
-                    
-                    if not speech_detected:
-                        return True, None
-                    
-                    audio_data = b''.join(post_wake_frames)
-                    temp_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-                    temp_filename = temp_file.name
-                    temp_file.close()
-                    
-                    audio_array = np.frombuffer(audio_data, dtype=np.int16)
-                    save_audio_to_wav(temp_filename, audio_array, 16000)
-                    
-                    return True, temp_filename
-                    
-        except KeyboardInterrupt:
-            print("\n\n👋 Apagando Jarvis...")
+                    return b''.join(audio_buffer)
+        finally:
             audio_stream.close()
-            return False, None
+    
+    def _open_capture(self):
+        """
+        Fuente de frames de 30 ms con su decisión de VAD
         
-    def capture_question(self):
+        Returns:
+            Objeto con read() -> (pcm, es_voz) y close()
         """
-        Captura la pregunta del usuario después del wake word usando VAD
+        if self.frontend:
+            return self.frontend.reader()
+        return MicrophoneCapture(self.pa, self.vad)
+    
+    def begin_turn(self, reason):
+        """
+        Empieza un turno nuevo cancelando lo que quede pendiente del anterior
+        
+        Args:
+            reason: Motivo ('wake', 'interruption', 'stop'...)
+        """
+        self.turn.cancel(reason)
+        self.turn = TurnContext()
+        recorder.event('turn', reason=reason)
+    
+    def _save_capture(self, frames, speech_flags):
         """
-        audio_stream = self.pa.open(
-            rate=Config.SAMPLE_RATE,
-            channels=1,
-            format=pyaudio.paInt16,
-            input=True,
-            frames_per_buffer=480
+        Recorta el silencio de la captura y la guarda en un WAV temporal
+        
+        Args:
+            frames: Frames de 30 ms capturados (bytes)
+            speech_flags: Decisión del VAD para cada frame
+            
+        Returns:
+            str: Path del archivo WAV
+        """
+        pad_frames = int(Config.UPLOAD_PAD_MS / 30)
+        trimmed = trim_frames(frames, speech_flags, pad_frames)
+        
+        audio_data = b''.join(trimmed)
+        temp_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+        temp_filename = temp_file.name
+        temp_file.close()
+        
+        audio_array = np.frombuffer(audio_data, dtype=np.int16)
+        save_audio_to_wav(temp_filename, audio_array, Config.SAMPLE_RATE)
+        
+        self.payload_tracker.record_capture(
+            temp_filename,
+            sum(len(f) for f in frames),
+            len(audio_data)
         )
+        return temp_filename
+    
+    def _process_wake_frame(self, pcm):
+        """Pasa un frame (bytes) por Porcupine y retorna el índice de keyword"""
+        pcm_unpacked = struct.unpack_from(
+            "h" * self.porcupine.frame_length, 
+            pcm
+        )
+        return self.porcupine.process(pcm_unpacked)
+        
+    @profiler.marked('capture')
+    def capture_question(self, start_timeout=None):
+        """
+        Captura la pregunta del usuario después del wake word usando VAD
+        
+        Args:
+            start_timeout: Segundos máximos para empezar a hablar (None = sin límite
+                aparte del máximo de grabación); se usa en la ventana de seguimiento
+        """
+        source = self._open_capture()
+        
+        log.info("🎧 Escuchando tu pregunta...")
         
-        print("🎧 Escuchando tu pregunta...")
+        from collections import deque
         
         frames = []
+        speech_flags = []
         speech_started = False
+        # Margen previo a la voz para no cortar el inicio
+        pre_roll = deque(maxlen=int(Config.UPLOAD_PAD_MS / 30))
         
-        # ✅ NUEVO: Usar tiempo real
+        # Tiempo de audio leído (frames de 30 ms), no de reloj
         silence_duration = 2.0  # 2 segundos de silencio
         max_recording_time = 15  # Máximo 10 segundos
         min_speech_duration = 0.3  # Mínimo 0.3 segundos de voz
         
-        last_speech_time = time.time()
-        start_time = time.time()
+        audio_time = 0.0
+        last_speech_time = 0.0
         speech_start_time = None
+        was_speech = False
+        recorder.event('capture', mode='question', start_timeout=start_timeout)
         
         try:
             while True:
-                frame = audio_stream.read(480, exception_on_overflow=False)
+                frame, is_speech = source.read()
+                audio_time += len(frame) / 2 / Config.SAMPLE_RATE
                 
-                # Detectar si hay voz
-                try:
-                    is_speech = self.vad.is_speech(frame, Config.SAMPLE_RATE)
-                except:
-                    is_speech = False
+                if is_speech != was_speech:
+                    was_speech = bool(is_speech)
+                    recorder.event('vad', speech=was_speech)
                 
                 if is_speech:
                     if not speech_started:
                         speech_started = True
-                        speech_start_time = time.time()
-                    last_speech_time = time.time()
+                        speech_start_time = audio_time
+                        frames.extend(pre_roll)
+                        speech_flags.extend([False] * len(pre_roll))
+                    last_speech_time = audio_time
                     frames.append(frame)
+                    speech_flags.append(True)
                 elif speech_started:
                     frames.append(frame)
+                    speech_flags.append(False)
+                else:
+                    pre_roll.append(frame)
                 
                 # Calcular tiempos
-                current_time = time.time()
+                current_time = audio_time
                 silence_time = current_time - last_speech_time
-                total_time = current_time - start_time
+                total_time = current_time
                 
                 # Si hay suficiente silencio después de hablar, terminar
                 if speech_started:
                     speech_duration = current_time - speech_start_time
                     
                     if silence_time >= silence_duration and speech_duration >= min_speech_duration:
-                        print("🛑 Pregunta capturada (2 segundos de silencio)")
+                        log.info("🛑 Pregunta capturada (2 segundos de silencio)")
+                        recorder.event('endpoint', reason='silence')
                         break
                 
+                # Nadie empezó a hablar dentro de la ventana
+                if not speech_started and start_timeout is not None and total_time >= start_timeout:
+                    recorder.event('endpoint', reason='no_speech')
+                    break
+                
                 # Timeout máximo
                 if total_time >= max_recording_time:
-                    print("⏱️ Tiempo máximo alcanzado")
+                    log.info("⏱️ Tiempo máximo alcanzado")
+                    recorder.event('endpoint', reason='max_time')
                     break
             
-            audio_stream.close()
+            source.close()
             
             # Verificar que hubo suficiente voz
-            if not speech_started or (speech_start_time and (time.time() - speech_start_time) < min_speech_duration):
-                print("⚠️ No se detectó suficiente voz")
+            if not speech_started or (speech_start_time and (audio_time - speech_start_time) < min_speech_duration):
+                log.warning("⚠️ No se detectó suficiente voz")
                 return None
             
-            # Convertir frames a audio
-            audio_data = b''.join(frames)
-            temp_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            temp_filename = temp_file.name
-            temp_file.close()
-            
-            audio_array = np.frombuffer(audio_data, dtype=np.int16)
-            save_audio_to_wav(temp_filename, audio_array, Config.SAMPLE_RATE)
-            
-            return temp_filename
+            return self._save_capture(frames, speech_flags)
             
         except Exception as e:
-            print(f"❌ Error capturando audio: {e}")
-            audio_stream.close()
+            log.error(f"❌ Error capturando audio: {e}")
+            source.close()
             return None
 
 
 
+    @profiler.marked('classify_intent')
     def classify_intent(self, text):
         """
         Clasifica la intención del texto para decidir si buscar o no
         """
-        text_lower = text.lower()
-        words = text_lower.split()
-        # Detectar comando de registro de usuario de forma más específica
-        # Solo si la frase es CORTA y directa
-        if len(words) <= 8:  # Máximo 5 palabras
-            if 'soy' in text_lower or 'me llamo' in text_lower or 'mi nombre es' in text_lower:
-                import re
-                
-                patterns = [
-                    r'^soy\s+([a-záéíóúñ]+)$',  # "soy Maxi"
-                    r'^me llamo\s+([a-záéíóúñ]+)$',  # "me llamo Maxi"
-                    r'^mi nombre es\s+([a-záéíóúñ]+)$'  # "mi nombre es Maxi"
-                ]
-                
-                for pattern in patterns:
-                    match = re.search(pattern, text_lower.strip())
-                    if match:
-                        name = match.group(1).capitalize()
-                        return 'register_user', name
-        
-        # Detectar preguntas sobre identidad propia
-        if len(words) <= 6:  # Solo frases cortas
-            identity_patterns = [
-                'cómo me llamo', 'como me llamo',
-                'cuál es mi nombre', 'cual es mi nombre',
-                'quién soy yo', 'quien soy yo',  
-                'quién soy', 'quien soy',  # Mantener pero solo en frases cortas
-                'cómo me dices', 'como me dices',
-                'mi nombre'
-            ]
-            
-            # Verificar que el patrón sea la pregunta principal, no parte de algo más grande
-            if any(text_lower == pattern or text_lower.startswith(pattern + ' ') for pattern in identity_patterns):
-                user_name = self.user_manager.get_current_user()
-                
-                if user_name:
-                    return 'identity_query', f"Su nombre es {user_name}, señor"
-                else:
-                    return 'identity_query', "Disculpe, aún no me ha dicho su nombre. Puede decirme 'me llamo [su nombre]'"
-        
-        # COMANDOS DE PARADA
-        stop_patterns = [
-            'para', 'detente', 'cállate', 'basta', 'silencio', 'stop', 'calla',
-            'nada', 'olvida', 'déjalo', 'vale', 'ok', 'está bien',
-            'no hace falta', 'no necesito', 'no importa', 'no pasa nada',
-            'ya está', 'suficiente', 'no más', 'no sigas', 'no continues'
-        ]
-        
-        if any(pattern in text_lower for pattern in stop_patterns):
-            return 'stop', 'Entendido, señor'
-        
-        # SALUDOS
-        greeting_patterns = [
-            'hola', 'buenos días', 'buenas tardes', 'buenas noches', 
-            'qué tal', 'cómo estás', 'hey', 'buenas'
-        ]
-        
-        if any(pattern in text_lower for pattern in greeting_patterns):
-            greeting = self.smart_greeting()
-            return 'greeting', f"{greeting}. ¿En qué puedo ayudarle?"
-        
-        # COMANDOS LOCALES (hora, fecha, etc.)
-        local_response = is_local_command(text)
-        if local_response:
-            return 'local', local_response
-        
-        # AFIRMACIONES/NEGACIONES SIMPLES
-        simple_responses = [
-            'sí', 'si', 'no', 'claro', 'por supuesto', 'evidentemente',
-            'tal vez', 'quizás', 'puede ser'
-        ]
-        
-        if len(words) <= 2 and any(word in simple_responses for word in words):
-            return 'stop', 'Entendido, señor'
-        
-        # DETECTAR PREGUNTAS REALES
-        question_words = [
-            'qué', 'que', 'quién', 'quien', 'cuál', 'cual', 'cuáles', 'cuales',
-            'cómo', 'como', 'cuándo', 'cuando', 'cuánto', 'cuanto', 'cuánta', 'cuanta',
-            'dónde', 'donde', 'por qué', 'por que', 'para qué', 'para que'
-        ]
-        
-        search_verbs = [
-            'busca', 'buscar', 'dime', 'cuéntame', 'explícame', 'háblame',
-            'necesito saber', 'quiero saber', 'investiga', 'averigua', 'quiero que'
-        ]
-        
-        has_question_word = any(word in text_lower for word in question_words)
-        has_search_verb = any(verb in text_lower for verb in search_verbs)
-        
-        if has_question_word or has_search_verb:
-            return 'question', None
-        
-        # RESPUESTAS SIMPLES
-        if len(words) <= 4:
-            return 'stop', 'Entendido, señor'
-        
-        # POR DEFECTO: pregunta
-        return 'question', None
+        intent, response = classify_intent(
+            text,
+            skills=self.skills,
+            current_user=self.user_manager.get_current_user(),
+            greet=self.smart_greeting
+        )
+        recorder.event('intent', intent=intent)
+        return intent, response
 
     
+    @profiler.marked('transcribe')
     def transcribe(self, audio_file, delete_after=True):
         """
-        Transcribe audio a texto usando Google Speech-to-Text
+        Transcribe audio a texto (comandos locales, Google STT o ASR local)
         
         Args:
             audio_file: Path del archivo de audio
@@ -493,14 +673,25 @@ class JarvisAssistant:
             str: Texto transcrito, o None si falla
         """
         try:
-            with sr.AudioFile(audio_file) as source:
-                audio = self.recognizer.record(source)
+            # Comandos cortos: reconocer en local sin ir a la nube
+            text = self.command_spotter.spot(audio_file) if self.command_spotter else None
+            backend = 'spotter'
             
-            text = self.recognizer.recognize_google(
-                audio, 
-                language=Config.LANGUAGE
-            )
-            print(f"📝 Transcripción: '{text}'")
+            if not text:
+                text, backend = self.stt_policy.transcribe(audio_file, self.turn.token)
+                
+                if not text:
+                    log.warning("⚠️ No pude entender el audio")
+                    recorder.event('stt', backend=backend, text=None)
+                    return None
+                
+                # Aprender plantilla: comando conocido, o relleno si es otra frase corta
+                if self.command_spotter and backend == 'google':
+                    self.command_spotter.learn(audio_file, text)
+            
+            log.info(f"📝 Transcripción: '{text}'")
+            self.turn_record.set(stt_backend=backend)
+            recorder.event('stt', backend=backend, text=text[:60])
             
             #  Solo eliminar si se indica
             if delete_after:
@@ -511,513 +702,355 @@ class JarvisAssistant:
             
             return text
             
-        except sr.UnknownValueError:
-            print("⚠️ No pude entender el audio")
-            return None
-        except sr.RequestError as e:
-            print(f"❌ Error en Google STT: {e}")
+        except Cancelled:
+            log.info("⏹️ Transcripción cancelada")
             return None
         except Exception as e:
-            print(f"❌ Error en transcripción: {e}")
+            log.error(f"❌ Error en transcripción: {e}")
             return None
 
     
+    @profiler.marked('answer')
     def search_perplexity(self, query):
         """
-        Busca información usando Perplexity API
+        Busca información: primero en la base de conocimiento local y, si no
+        hay una respuesta equivalente, con el motor de respuestas (Perplexity
+        primero, Gemini como cobertura si Perplexity tarda más de lo habitual)
         
         Args:
             query: Pregunta del usuario
             
         Returns:
-            tuple: (respuesta, citations) o (None, []) si falla
+            tuple: (respuesta, citations)
         """
-        url = "https://api.perplexity.ai/chat/completions"
-        
-        payload = {
-            "model": "sonar",  # Modelo más pequeño y estable
-            "messages": [
-                {
-                    "role": "system",
-                    "content": Config.SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": query
-                }
-            ],
-            "temperature": Config.PERPLEXITY_TEMPERATURE,
-            "max_tokens": Config.PERPLEXITY_MAX_TOKENS
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {Config.PERPLEXITY_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         try:
-            print("🔍 Buscando información...")
-            response = requests.post(
-                url, 
-                json=payload, 
-                headers=headers, 
-                timeout=15
-            )
+            # Con conversación en curso "¿y cuántos habitantes tiene?" depende
+            # de lo anterior: ni se anota ni vale una respuesta guardada
+            history = self.conversation.messages()
             
-            # Debug: mostrar respuesta si hay error
-            if response.status_code != 200:
-                print(f"❌ Status code: {response.status_code}")
-                print(f"❌ Response: {response.text}")
+            if self.prefetcher and not history:
+                self.prefetcher.record(query)
+                
+                # Respuesta previsible ya refrescada en segundo plano
+                prefetched = self.prefetcher.lookup(query)
+                if prefetched:
+                    log.info("🔮 Respuesta precargada")
+                    self.turn_record.set(source='prefetch', cache_hit=True)
+                    self.conversation.add(query, prefetched[0])
+                    return prefetched
             
-            response.raise_for_status()
+            # Pregunta ya respondida (aunque sea con otras palabras)
+            known = self.knowledge.lookup(query) if self.knowledge and not history else None
+            if known:
+                answer, citations, similarity = known
+                log.info(f"📚 Respuesta local (similitud {similarity:.2f})")
+                self.turn_record.set(source='knowledge', cache_hit=True, similarity=round(similarity, 3))
+                self.conversation.add(query, answer)
+                return answer, citations
             
-            result = response.json()
-            answer = result['choices'][0]['message']['content']
-            citations = result.get('citations', [])
+            log.info("🔍 Buscando información...")
+            answer, citations, backend = self.answer_engine.ask(query, self.turn.token, history)
+            log.info(f"💡 Respuesta obtenida ({backend})")
+            if citations:
+                log.info(format_citations(citations))
+            self.turn_record.set(source=backend, cache_hit=backend == 'cache', history_messages=len(history))
+            self.conversation.add(query, answer)
             
-            print("💡 Respuesta obtenida")
+            # Solo las respuestas que no dependen del contexto de la conversación
+            if self.knowledge and not history and backend != 'cache':
+                self.knowledge.store(query, answer, citations)
             return answer, citations
             
-        except requests.exceptions.Timeout:
-            print("⏱️ Timeout en Perplexity")
-            return "Disculpe señor, la búsqueda está tardando demasiado", []
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Error en Perplexity API: {e}")
+        except Cancelled:
+            log.info("⏹️ Búsqueda cancelada")
+            return None, []
+        except AnswerError as e:
+            if e.timeout:
+                return "Disculpe señor, la búsqueda está tardando demasiado", []
             return "Lo siento señor, no puedo acceder a la búsqueda en este momento", []
         except Exception as e:
-            print(f"❌ Error procesando respuesta: {e}")
+            log.error(f"❌ Error procesando respuesta: {e}")
             return "Lo siento señor, hubo un error al procesar la respuesta", []
     
-    def speak(self, text, interruptible=True):
+    @profiler.marked('speak')
+    def speak(self, text, interruptible=True, token=None):
         """
         Convierte texto a voz y lo reproduce
         
         Args:
             text: Texto a sintetizar
             interruptible: Si se puede interrumpir con "Jarvis para"
+            token: CancelToken propio (por defecto el del turno en curso)
         """
-        try:
-            # Limpiar texto
-            clean_text = clean_text_for_speech(text)
+        # Un aviso de temporizador espera a que termine la respuesta en curso
+        with self.speech_lock:
+            try:
+                # Limpiar texto
+                clean_text = clean_text_for_speech(text)
             
-            print(f"\n🗣️  Jarvis: {clean_text}\n")
+                log.info(f"\n🗣️  Jarvis: {clean_text}\n")
             
-            synthesis_input = texttospeech.SynthesisInput(text=clean_text)
+                token = token or self.turn.token
+                started = time.perf_counter()
+                chunks = split_sentences(clean_text) if Config.TTS_STREAM_ENABLED else [clean_text]
+                if len(chunks) > 1:
+                    self._speak_chunks(chunks, token, interruptible)
+                    return
             
-            response = self.tts_client.synthesize_speech(
-                input=synthesis_input,
-                voice=self.voice,
-                audio_config=self.audio_config
-            )
+                try:
+                    audio_content = self.tts.synthesize(clean_text, token)
+                except Cancelled:
+                    log.info("⏹️ Síntesis cancelada")
+                    return
+                except TTSUnavailable as e:
+                    # Sin voz disponible: la respuesta ya se ha mostrado por consola
+                    log.warning(f"🔇 Voz no disponible: {e}")
+                    recorder.event('tts_unavailable')
+                    return
             
-            # Guardar audio
-            temp_filename = "jarvis_temp_audio.mp3"
+                # Guardar audio
+                temp_filename = "jarvis_temp_audio.mp3"
             
-            with open(temp_filename, 'wb') as out:
-                out.write(response.audio_content)
+                with open(temp_filename, 'wb') as out:
+                    out.write(audio_content)
             
-            time.sleep(0.1)
+                time.sleep(0.1)
             
-            #  Iniciar escucha de interrupción en paralelo
-            self.is_speaking = True
-            self.should_stop_speaking = False
+                #  Iniciar escucha de interrupción en paralelo
+                self.is_speaking = True
+                self.should_stop_speaking = False
             
-            if interruptible:
-                interrupt_thread = threading.Thread(target=self.listen_for_interruption, daemon=True)
-                interrupt_thread.start()
+                if interruptible:
+                    interrupt_thread = threading.Thread(target=self.listen_for_interruption, daemon=True)
+                    interrupt_thread.start()
             
-            # Reproducir
-            pygame.mixer.music.load(temp_filename)
-            pygame.mixer.music.play()
+                # Reproducir
+                pygame.mixer.music.load(temp_filename)
+                pygame.mixer.music.play()
+                recorder.event('playback_start', chars=len(clean_text), interruptible=interruptible)
+                if interruptible:
+                    self.turn_record.set(first_audio_ms=round((time.perf_counter() - started) * 1000, 1))
             
-            # Esperar mientras reproduce (o hasta interrupción)
-            while pygame.mixer.music.get_busy():
-                if self.should_stop_speaking:
-                    pygame.mixer.music.stop()
-                    print("⏹️ Reproducción detenida")
-                    break
-                pygame.time.Clock().tick(10)
+                # Esperar mientras reproduce (o hasta interrupción)
+                playback = PlaybackMonitor()
+                while pygame.mixer.music.get_busy():
+                    if self.should_stop_speaking or token.cancelled:
+                        pygame.mixer.music.stop()
+                        metrics.inc('cancel.playback_stopped')
+                        log.info("⏹️ Reproducción detenida")
+                        break
+                    pygame.time.Clock().tick(10)
+                    playback.tick()
             
-            # Finalizar
-            self.is_speaking = False
-            pygame.mixer.music.unload()
+                # Finalizar
+                self.is_speaking = False
+                pygame.mixer.music.unload()
+                if self.should_stop_speaking:
+                    recorder.event('playback_stop', reason='barge_in')
+                else:
+                    recorder.event('playback_stop', reason='cancelled' if token.cancelled else 'done')
             
-            time.sleep(0.1)
+                time.sleep(0.1)
             
-            try:
-                os.remove(temp_filename)
-            except:
-                pass
+                try:
+                    os.remove(temp_filename)
+                except:
+                    pass
             
-            # Si fue interrumpido, confirmar
-            if self.should_stop_speaking:
-                # No usar speak() aquí para evitar recursión
-                print("✅ Detenido")
+                # Si fue interrumpido, confirmar
+                if self.should_stop_speaking:
+                    # No usar speak() aquí para evitar recursión
+                    log.info("✅ Detenido")
             
-        except Exception as e:
-            self.is_speaking = False
-            print(f"❌ Error en TTS: {e}")
-            import traceback
-            traceback.print_exc()
-
+            except Exception as e:
+                self.is_speaking = False
+                log.exception(f"❌ Error en TTS: {e}")
 
-    
-    def process_query(self, query):
+    def _speak_chunks(self, chunks, token, interruptible):
         """
-        Procesa la consulta del usuario
+        Reproduce una respuesta de varias frases mientras se sintetiza
         
-        Args:
-            query: Pregunta transcrita
-            
-        Returns:
-            str: Respuesta a devolver
+        Empieza a sonar con la primera frase; las siguientes se piden por
+        adelantado y se encadenan en el mismo canal.
         """
-        # Verificar comandos locales primero (más rápido)
-        local_response = is_local_command(query)
-        if local_response:
-            print(f"⚡ Comando local detectado")
-            return local_response
+        player = ChunkPlayer(self.stream_tts, pygame.mixer, chunks, token)
+        self.should_stop_speaking = False
+        playback = None
+        reason = 'done'
         
-        # Si no es comando local, buscar en Perplexity
-        answer, citations = self.search_perplexity(query)
+        try:
+            while True:
+                if self.should_stop_speaking or token.cancelled:
+                    if playback:
+                        metrics.inc('cancel.playback_stopped')
+                        log.info("⏹️ Reproducción detenida")
+                    reason = 'barge_in' if self.should_stop_speaking else 'cancelled'
+                    break
+                
+                try:
+                    playing = player.pump()
+                except Cancelled:
+                    log.info("⏹️ Síntesis cancelada")
+                    reason = 'cancelled'
+                    break
+                except TTSUnavailable as e:
+                    log.warning(f"🔇 Voz no disponible: {e}")
+                    recorder.event('tts_unavailable')
+                    reason = 'tts_unavailable'
+                    break
+                
+                if playback is None and player.played:
+                    # Primer trozo sonando: desde aquí se puede interrumpir
+                    self.is_speaking = True
+                    if interruptible:
+                        threading.Thread(target=self.listen_for_interruption, daemon=True).start()
+                    recorder.event('playback_start', chars=sum(map(len, chunks)), interruptible=interruptible,
+                                   chunks=len(chunks))
+                    playback = PlaybackMonitor()
+                
+                if not playing:
+                    break
+                pygame.time.Clock().tick(10)
+                if playback:
+                    playback.tick()
+        finally:
+            player.stop()
+            self.is_speaking = False
         
-        # Mostrar fuentes si están disponibles
-        if citations:
-            print(format_citations(citations))
+        stats = player.stats()
+        if interruptible:
+            self.turn_record.set(**stats)
+        if playback:
+            recorder.event('playback_stop', reason=reason, gaps=stats['audio_gaps'])
+            if self.should_stop_speaking:
+                log.info("✅ Detenido")
+
+    def announce(self, text):
+        """
+        Anuncia un aviso que no pertenece a ningún turno (temporizadores, alarmas)
         
-        return answer
+        Se llama desde el hilo del planificador; speak() espera a que termine
+        la respuesta en curso. Lleva su propio token: un turno nuevo que
+        empiece mientras suena no corta la alarma a media frase.
+        """
+        log.info(f"\n⏰ {text}")
+        self.speak(text, interruptible=False, token=CancelToken())
+
+
+    
     def play_confirmation_sound(self):
         """Reproduce confirmación al detectar wake word"""
-        try:
-            # Opción simple: solo decir "Señor" sin saludar
-            confirmation_text = "¿Señor?"
-            
-            synthesis_input = texttospeech.SynthesisInput(text=confirmation_text)
+        # pygame.mixer.music es compartido: no pisar un aviso de temporizador en curso
+        with self.speech_lock:
+            try:
+                # Opción simple: solo decir "Señor" sin saludar
+                confirmation_text = "¿Señor?"
             
-            response = self.tts_client.synthesize_speech(
-                input=synthesis_input,
-                voice=self.voice,
-                audio_config=self.audio_config
-            )
+                try:
+                    audio_content = self.tts.synthesize(confirmation_text)
+                    temp_file = "confirmation_audio.mp3"
+                except TTSUnavailable:
+                    # Google TTS caído y sin frase guardada: pitido local
+                    audio_content = beep_wav()
+                    temp_file = "confirmation_audio.wav"
             
-            temp_file = "confirmation_audio.mp3"
-            with open(temp_file, 'wb') as out:
-                out.write(response.audio_content)
+                with open(temp_file, 'wb') as out:
+                    out.write(audio_content)
             
-            time.sleep(0.05)
+                time.sleep(0.05)
             
-            pygame.mixer.music.load(temp_file)
-            pygame.mixer.music.play()
+                pygame.mixer.music.load(temp_file)
+                pygame.mixer.music.play()
             
-            while pygame.mixer.music.get_busy():
-                pygame.time.Clock().tick(10)
+                while pygame.mixer.music.get_busy():
+                    pygame.time.Clock().tick(10)
             
-            pygame.mixer.music.unload()
+                pygame.mixer.music.unload()
             
-            try:
-                os.remove(temp_file)
-            except:
-                pass
+                try:
+                    os.remove(temp_file)
+                except:
+                    pass
                 
-        except Exception as e:
-            print(f"⚠️ Error en confirmación: {e}")
+            except Exception as e:
+                log.warning(f"⚠️ Error en confirmación: {e}")
 
+    @profiler.marked('interruption_loop')
     def listen_for_interruption(self):
         """
         Escucha en segundo plano mientras habla para detectar el wake word "Jarvis" y detener la reproducción inmediatamente.
         """
         try:
-            stream = self.pa.open(
-                rate=self.porcupine.sample_rate,
-                channels=1,
-                format=pyaudio.paInt16,
-                input=True,
-                frames_per_buffer=self.porcupine.frame_length
-            )
+            stream = None
+            if self.frontend:
+                # El front-end ya escucha: basta con esperar sus detecciones
+                self.frontend.clear_events()
+                wake_detected = lambda: self.frontend.wait_wake(timeout=0.1) is not None
+            else:
+                stream = MonitoredInput(
+                    self.pa,
+                    self.porcupine.sample_rate,
+                    self.porcupine.frame_length,
+                    name='wake'
+                )
+                
+                def wake_detected():
+                    return self._process_wake_frame(stream.read()) >= 0
             
-            print("🎧 [DEBUG] Thread de interrupción iniciado")
+            log.debug("🎧 Thread de interrupción iniciado")
             
             while self.is_speaking and not self.should_stop_speaking:
-                pcm = stream.read(self.porcupine.frame_length, exception_on_overflow=False)
-                pcm_unpacked = struct.unpack_from("h" * self.porcupine.frame_length, pcm)
-                
-                keyword_index = self.porcupine.process(pcm_unpacked)
-                
-                if keyword_index >= 0:
-                    print("\n⏸️ Wake word 'Jarvis' detectado durante reproducción, deteniendo...")
+                if wake_detected():
+                    log.info("\n⏸️ Wake word 'Jarvis' detectado durante reproducción, deteniendo...")
+                    recorder.event('barge_in')
                     self.should_stop_speaking = True
+                    # Abortar todo lo pendiente del turno (síntesis, búsquedas...)
+                    self.turn.cancel('barge_in')
                     break
             
-            stream.close()
-            print("🔇 [DEBUG] Thread de interrupción terminado")
+            if stream:
+                stream.close()
+            log.debug("🔇 Thread de interrupción terminado")
             
         except Exception as e:
-            print(f"⚠️ Error en detección de interrupción: {e}")
+            log.warning(f"⚠️ Error en detección de interrupción: {e}")
 
-    def handle_interruption(self):
+    def register_user(self, name, audio_file):
+        """Registra un usuario nuevo con su muestra de voz"""
+        return self.user_manager.register_user(name, audio_file)
+
+    def log_turn(self, record):
+        """Encola el registro de un turno terminado (no bloquea)"""
+        if self.turn_log:
+            self.turn_log.write(record)
+
+    def after_transcription(self, audio_file):
         """
-        Maneja el flujo cuando se interrumpe la reproducción con 'Jarvis'
+        Tareas tras una transcripción correcta (antes de clasificar)
+        
+        Args:
+            audio_file: Audio del turno (aún existe)
         """
-        try:
-            # Resetear flag de interrupción
-            self.should_stop_speaking = False
-            
-            # Preguntar qué necesita
-            print("\n💬 Jarvis fue interrumpido, esperando nueva instrucción...")
-            self.speak("¿Señor?", interruptible=False)
-            
-            # Capturar nueva pregunta
-            audio_file = self.capture_question()
-            
-            if not audio_file:
-                self.speak("Entendido, señor", interruptible=False)
-                return
-            
-            # Transcribir
-            query = self.transcribe(audio_file)
-            
-            if not query:
-                self.speak("Disculpe, no le he entendido", interruptible=False)
-                return
-            
-            #  Clasificar intención antes de buscar
-            intent_type, response = self.classify_intent(query)
-            
-            print(f"🧠 [DEBUG] Intención detectada: {intent_type}")
-            
-            if intent_type == 'stop':
-                # Comando de parada → responder directamente
-                self.speak(response, interruptible=False)
-                return
-            
-            elif intent_type == 'greeting':
-                # Saludo → responder y esperar otra pregunta
-                self.speak(response, interruptible=False)
-                
-                # Esperar nueva pregunta
-                audio_file = self.capture_question()
-                if audio_file:
-                    query = self.transcribe(audio_file)
-                    if query:
-                        # Recursión con la nueva pregunta
-                        intent_type, response = self.classify_intent(query)
-                        
-                        if intent_type in ['stop', 'greeting', 'local']:
-                            self.speak(response, interruptible=False)
-                        else:
-                            # Es pregunta real → procesar
-                            answer = self.search_perplexity(query)
-                            if answer[0]:
-                                prefix = self.smart_greeting()
-                                full_answer = f"{prefix}. {answer[0]}"
-                                self.speak(full_answer, interruptible=True)
-                                
-                                if self.should_stop_speaking:
-                                    self.handle_interruption()
-                return
-            
-            elif intent_type == 'local':
-                # Comando local (hora, fecha) → responder directamente
-                prefix = self.smart_greeting()
-                full_answer = f"{prefix}, {response.lower()}"
-                self.speak(full_answer, interruptible=False)
-                return
+        # Activación confirmada y muy parecida a las plantillas: aprender de ella
+        if self.wake_verifier and self.last_wake_audio:
+            self.wake_verifier.enroll_confirmed(
+                self.last_wake_audio, self.wake_verifier.last_score, self.wake_sample_rate
+            )
+            self.last_wake_audio = None
+        
+        if audio_file and os.path.exists(audio_file):
+            user_name, confidence = self.user_manager.identify_user(audio_file, threshold=50)
             
-            elif intent_type == 'question':
-                # Pregunta real → buscar en web
-                answer, citations = self.search_perplexity(query)
-                
-                if answer:
-                    prefix = self.smart_greeting()
-                    full_answer = f"{prefix}. {answer}"
-                    self.speak(full_answer, interruptible=True)
-                    
-                    # Si vuelven a interrumpir, recursión
-                    if self.should_stop_speaking:
-                        self.handle_interruption()
-                else:
-                    self.speak("Lo siento señor, no he podido obtener una respuesta", interruptible=False)
-                return
-                
-        except Exception as e:
-            print(f"❌ Error manejando interrupción: {e}")
-            import traceback
-            traceback.print_exc()
-            self.speak("Disculpe señor, hubo un error", interruptible=False)
-
-
+            self.turn_record.set(user=user_name)
+            if user_name:
+                log.info(f"👤 Usuario identificado: {user_name} ({confidence:.1f}%)")
+            else:
+                log.info("👤 Usuario no identificado")
 
     def run(self):
-        """Loop principal del asistente"""
+        """Loop principal del asistente (máquina de estados del diálogo)"""
         try:
-            while True:
-                # 1. Esperar wake word Y capturar audio simultáneamente
-                detected, audio_file = self.listen_for_wake_word_and_capture()
-                
-                if not detected:
-                    break  # Ctrl+C presionado
-                
-                # 2. Si NO capturó audio después del wake word, saludar y esperar
-                if not audio_file:
-                    greeting = self.smart_greeting() + ". Dígame"
-                    self.speak(greeting, interruptible=False)
-                    
-                    audio_file = self.capture_question()
-                    
-                    if not audio_file:
-                        self.speak("No he recibido ninguna pregunta, señor", interruptible=False)
-                        continue
-                
-                # 3. Transcribir con reintentos
-                max_retries = 2
-                retry_count = 0
-                query = None
-                
-                while retry_count < max_retries and not query:
-                    # NO eliminar el archivo aún (delete_after=False)
-                    query = self.transcribe(audio_file, delete_after=False)
-                    
-                    if not query:
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            self.speak("Disculpe, no le he entendido bien. Por favor, repita", interruptible=False)
-                            
-                            # Eliminar el archivo anterior
-                            try:
-                                os.remove(audio_file)
-                            except:
-                                pass
-                            
-                            # Capturar nueva pregunta
-                            audio_file = self.capture_question()
-                            
-                            if not audio_file:
-                                print("⏸️ Usuario no respondió, volviendo a esperar wake word")
-                                break
-                        else:
-                            self.speak("Lo siento señor, sigo sin entenderle", interruptible=False)
-                            # Eliminar archivo
-                            try:
-                                os.remove(audio_file)
-                            except:
-                                pass
-                            break
-                
-                if not query:
-                    continue
-                if audio_file and os.path.exists(audio_file):
-                    user_name, confidence = self.user_manager.identify_user(audio_file, threshold=50)
-                    
-                    if user_name:
-                        print(f"👤 Usuario identificado: {user_name} ({confidence:.1f}%)")
-                    else:
-                        print(f"👤 Usuario no identificado")
-                
-                # Clasificar intención
-                intent_type, response = self.classify_intent(query)
-                
-                print(f"🧠 [DEBUG] Intención detectada: {intent_type}")
-                
-                # Manejar registro de usuario (el archivo AÚN EXISTE)
-                if intent_type == 'register_user':
-                    name = response
-                    
-                    try:
-                        if self.user_manager.register_user(name, audio_file):
-                            greeting = self.smart_greeting()
-                            self.speak(f"Encantado de conocerle, {greeting}", interruptible=False)
-                        else:
-                            self.speak("Disculpe señor, hubo un error al registrarle", interruptible=False)
-                    
-                    except Exception as e:
-                        print(f"❌ Error registrando usuario: {e}")
-                        self.speak("Disculpe señor, hubo un error al registrarle", interruptible=False)
-                    
-                    finally:
-                        # Limpiar archivo
-                        try:
-                            os.remove(audio_file)
-                        except:
-                            pass
-                    
-                    continue
-                
-                # Para todos los demás casos, eliminar el archivo AHORA
-                try:
-                    os.remove(audio_file)
-                except:
-                    pass
-                
-                if intent_type == 'identity_query':
-                    prefix = self.smart_greeting()
-                    full_answer = f"{prefix}. {response}"
-                    
-                    try:
-                        os.remove(audio_file)
-                    except:
-                        pass
-                    
-                    self.speak(full_answer, interruptible=False)
-                    continue
-                # 4. Procesar según el tipo de intención
-                if intent_type == 'stop':
-                    self.speak(response, interruptible=False)
-                    continue
-                
-                elif intent_type == 'greeting':
-                    self.speak(response, interruptible=False)
-                    
-                    audio_file = self.capture_question()
-                    if audio_file:
-                        query = self.transcribe(audio_file)  # Aquí sí eliminar (default)
-                        if query:
-                            intent_type, response = self.classify_intent(query)
-                            
-                            if intent_type in ['stop', 'greeting']:
-                                self.speak(response, interruptible=False)
-                            elif intent_type == 'local':
-                                prefix = self.smart_greeting()
-                                full_answer = f"{prefix}, {response.lower()}"
-                                self.speak(full_answer, interruptible=False)
-                            else:  # question
-                                answer, citations = self.search_perplexity(query)
-                                if answer:
-                                    prefix = self.smart_greeting()
-                                    full_answer = f"{prefix}. {answer}"
-                                    self.speak(full_answer, interruptible=True)
-                                    
-                                    if self.should_stop_speaking:
-                                        self.handle_interruption()
-                    continue
-                
-                elif intent_type == 'local':
-                    prefix = self.smart_greeting()
-                    
-                    if any(word in query.lower() for word in ['hora', 'horas', 'qué hora']):
-                        full_answer = f"{prefix}, {response.lower()}"
-                    elif any(word in query.lower() for word in ['fecha', 'día', 'qué día']):
-                        full_answer = f"{prefix}, {response.lower()}"
-                    else:
-                        full_answer = f"{prefix}. {response}"
-                    
-                    self.speak(full_answer, interruptible=False)
-                
-                elif intent_type == 'question':
-                    answer, citations = self.search_perplexity(query)
-                    
-                    if answer:
-                        prefix = self.smart_greeting()
-                        full_answer = f"{prefix}. {answer}"
-                        
-                        self.speak(full_answer, interruptible=True)
-                        
-                        if self.should_stop_speaking:
-                            self.handle_interruption()
-                    else:
-                        self.speak("Lo siento señor, no he podido obtener una respuesta", interruptible=False)
-                
-                print("\n" + "-" * 60 + "\n")
-                
+            DialogStateMachine(self).run()
         except KeyboardInterrupt:
             print("\n\n👋 Apagando Jarvis...")
         finally:
@@ -1027,12 +1060,51 @@ class JarvisAssistant:
         """Libera recursos al cerrar"""
         print("\n🧹 Liberando recursos...")
         
+        if getattr(self, 'wake_gate', None):
+            self.wake_gate.report()
+        if getattr(self, 'frontend', None):
+            self.frontend.publish_metrics()
+        metrics.report()
+        
+        for name, state in resilience.snapshot().items():
+            print(f"🔌 {name}: {state['state']}")
+        
         if hasattr(self, 'porcupine'):
             self.porcupine.delete()
         
+        if getattr(self, 'frontend', None):
+            self.frontend.stop()
+        
         if hasattr(self, 'pa'):
             self.pa.terminate()
         
+        if hasattr(self, 'stt_policy'):
+            self.stt_policy.shutdown()
+        
+        if hasattr(self, 'answer_engine'):
+            self.answer_engine.shutdown()
+        
+        for engine in (getattr(self, 'tts', None), getattr(self, 'stream_tts', None)):
+            if engine:
+                engine.shutdown()
+        
+        if hasattr(self, 'scheduler'):
+            self.scheduler.shutdown()
+        
+        if getattr(self, 'prefetcher', None):
+            self.prefetcher.shutdown()
+        
+        if getattr(self, 'knowledge', None):
+            self.knowledge.close()
+        
+        if getattr(self, 'turn_log', None):
+            self.turn_log.close()
+        
+        profiler.stop()
+        if getattr(self, 'control', None):
+            self.control.shutdown()
+        recorder.close()
+        
         pygame.mixer.quit()
         
         print("✅ Recursos liberados")
@@ -1042,12 +1114,15 @@ class JarvisAssistant:
 
 def main():
     """Punto de entrada principal"""
+    listener = setup_console_logging()
     try:
         jarvis = JarvisAssistant()
         jarvis.run()
     except Exception as e:
         print(f"\n❌ Error fatal: {e}")
         sys.exit(1)
+    finally:
+        listener.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,223 @@
+"""
+Base de conocimiento local con las respuestas ya obtenidas
+
+Guarda en SQLite las respuestas de Perplexity (con sus fuentes) indexadas
+con FTS5. Antes de ir a la web se busca una pregunta equivalente: FTS5
+propone candidatas y solo vale una cuyas palabras con contenido sean las
+mismas, salvo palabras de relleno (PARAPHRASE_WORDS). Un nombre, un lugar,
+un año o un "no" que esté en una y no en la otra es otra pregunta, por
+mucho que se parezcan; por eso no hay umbral de similitud ni embeddings,
+que daban por buena la de Madrid a "cuántos habitantes tiene Barcelona".
+Así "quién ganó el mundial 2022" y "qué país ganó el mundial de 2022"
+comparten respuesta al instante.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from config import Config
+from metrics import metrics
+
+
+STOPWORDS = {
+    'el', 'la', 'los', 'las', 'un', 'una', 'unos', 'unas', 'de', 'del', 'al',
+    'a', 'en', 'y', 'o', 'que', 'qué', 'quien', 'quién', 'cual', 'cuál',
+    'como', 'cómo', 'es', 'son', 'fue', 'por', 'para', 'con', 'se', 'me',
+    'mi', 'su', 'sus', 'lo', 'le', 'les', 'dime', 'sabes', 'jarvis', 'oye',
+    'puedes', 'decirme', 'favor', 'senor'
+}
+
+# Preguntas cuya respuesta cambia continuamente: no se guardan ni se sirven
+VOLATILE_WORDS = {
+    'hoy', 'ahora', 'actual', 'actualmente', 'ultimo', 'ultima', 'ultimas',
+    'ultimos', 'noticias', 'tiempo', 'clima', 'temperatura', 'manana', 'ayer',
+    'precio', 'cotizacion', 'resultado', 'partido'
+}
+
+# Palabras que cambian entre dos formas de hacer la misma pregunta sin
+# cambiar de qué se pregunta. Cualquier otra palabra (nombres, lugares,
+# números, "no", "nunca"...) tiene que estar en las dos.
+PARAPHRASE_WORDS = {
+    'pais', 'persona', 'nombre', 'exactamente', 'realmente', 'quiero',
+    'saber', 'podrias', 'decir', 'sabrias'
+}
+
+
+def normalize_tokens(text):
+    """
+    Palabras con contenido de una pregunta, sin tildes ni signos
+
+    Returns:
+        list: Tokens en minúsculas
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [t for t in re.findall(r'[a-z0-9]+', text) if t not in STOPWORDS]
+
+
+def lexical_similarity(a, b):
+    """
+    Coeficiente de Dice entre dos conjuntos de tokens
+
+    Returns:
+        float: 0 (nada en común) a 1 (mismas palabras)
+    """
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def same_subject(a, b):
+    """
+    Las dos preguntas tratan de lo mismo: solo difieren en palabras de relleno
+
+    Args:
+        a, b: Conjuntos de tokens normalizados
+
+    Returns:
+        bool: False si alguna palabra con contenido está en una sola de ellas
+    """
+    return (a ^ b) <= PARAPHRASE_WORDS
+
+
+class KnowledgeBase:
+    """Respuestas previas indexadas para preguntas repetidas"""
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: Archivo SQLite (por defecto Config.KNOWLEDGE_DB_FILE)
+        """
+        self.path = path or Config.KNOWLEDGE_DB_FILE
+        self._lock = threading.Lock()
+        self.enabled = True
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    normalized TEXT NOT NULL UNIQUE,
+                    answer TEXT NOT NULL,
+                    citations TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS answers_fts USING fts5(normalized);
+            """)
+        except sqlite3.OperationalError as e:
+            # SQLite compilado sin FTS5
+            print(f"⚠️ Base de conocimiento desactivada: {e}")
+            self.enabled = False
+
+    @staticmethod
+    def is_volatile(tokens):
+        return any(t in VOLATILE_WORDS for t in tokens)
+
+    def lookup(self, question):
+        """
+        Busca una respuesta guardada para una pregunta equivalente
+
+        Args:
+            question: Pregunta del usuario
+
+        Returns:
+            tuple or None: (respuesta, citations, similitud léxica) si hay coincidencia fresca
+        """
+        if not self.enabled:
+            return None
+
+        tokens = normalize_tokens(question)
+        if not tokens or self.is_volatile(tokens):
+            return None
+
+        query = ' OR '.join(f'"{t}"' for t in set(tokens))
+        min_created = time.time() - Config.KNOWLEDGE_MAX_AGE
+
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT a.id, a.normalized, a.answer, a.citations
+                FROM answers_fts f JOIN answers a ON a.id = f.rowid
+                WHERE answers_fts MATCH ? AND a.created >= ?
+                ORDER BY bm25(answers_fts)
+                LIMIT ?
+            """, (query, min_created, Config.KNOWLEDGE_CANDIDATES)).fetchall()
+
+        token_set = set(tokens)
+
+        best = None
+        for row_id, normalized, answer, citations in rows:
+            candidate = set(normalized.split())
+            # "mundial 2018" no responde a "mundial 2022", ni Madrid a Barcelona,
+            # ni "quién ganó" a "quién no ganó"
+            if not same_subject(token_set, candidate):
+                continue
+            similarity = lexical_similarity(token_set, candidate)
+            if best is None or similarity > best[0]:
+                best = (similarity, row_id, answer, citations)
+
+        if best is None:
+            metrics.inc('knowledge.misses')
+            return None
+
+        similarity, row_id, answer, citations = best
+
+        with self._lock:
+            self.conn.execute("UPDATE answers SET hits = hits + 1 WHERE id = ?", (row_id,))
+            self.conn.commit()
+
+        metrics.inc('knowledge.hits')
+        return answer, json.loads(citations), similarity
+
+    def store(self, question, answer, citations):
+        """Guarda una respuesta (sustituye la de la misma pregunta normalizada)"""
+        if not self.enabled or not answer:
+            return
+
+        tokens = normalize_tokens(question)
+        if not tokens or self.is_volatile(tokens):
+            return
+
+        normalized = ' '.join(tokens)
+
+        with self._lock:
+            with self.conn:
+                old = self.conn.execute(
+                    "SELECT id FROM answers WHERE normalized = ?", (normalized,)
+                ).fetchone()
+                if old:
+                    self.conn.execute("DELETE FROM answers WHERE id = ?", old)
+                    self.conn.execute("DELETE FROM answers_fts WHERE rowid = ?", old)
+
+                cursor = self.conn.execute(
+                    "INSERT INTO answers (question, normalized, answer, citations, created) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (question, normalized, answer, json.dumps(citations or []), time.time())
+                )
+                self.conn.execute(
+                    "INSERT INTO answers_fts (rowid, normalized) VALUES (?, ?)",
+                    (cursor.lastrowid, normalized)
+                )
+                self._prune()
+
+        metrics.inc('knowledge.stored')
+
+    def _prune(self):
+        """Elimina las entradas más antiguas si se supera el máximo"""
+        excess = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - Config.KNOWLEDGE_MAX_ENTRIES
+        if excess <= 0:
+            return
+        old_ids = self.conn.execute(
+            "SELECT id FROM answers ORDER BY created LIMIT ?", (excess,)
+        ).fetchall()
+        self.conn.executemany("DELETE FROM answers WHERE id = ?", old_ids)
+        self.conn.executemany("DELETE FROM answers_fts WHERE rowid = ?", old_ids)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,271 @@
+"""
+Modo de bajo consumo: pre-detector de energía delante de Porcupine
+
+Porcupine solo procesa los frames cercanos a actividad de voz. Un detector
+de energía (muy barato) decide qué frames pasan, y un pequeño buffer de
+lookback evita cortar el principio del wake word cuando la puerta se abre.
+"""
+
+import struct
+import sys
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+from config import Config
+from metrics import metrics
+
+
+class EnergyGate:
+    """Puerta de energía con suelo de ruido adaptativo y buffer de lookback"""
+
+    def __init__(self, frame_length, sample_rate=16000,
+                 lookback=None, hangover=None, margin_db=None, floor_window=None):
+        self.frame_length = frame_length
+        self.sample_rate = sample_rate
+
+        lookback = Config.LOW_POWER_LOOKBACK if lookback is None else lookback
+        hangover = Config.LOW_POWER_HANGOVER if hangover is None else hangover
+        self.margin_db = Config.LOW_POWER_MARGIN_DB if margin_db is None else margin_db
+        floor_window = Config.LOW_POWER_FLOOR_WINDOW if floor_window is None else floor_window
+
+        frame_seconds = frame_length / sample_rate
+        self.lookback = deque(maxlen=max(1, int(lookback / frame_seconds)))
+        self.hangover_frames = max(1, int(hangover / frame_seconds))
+
+        # Suelo de ruido en dBFS (sube despacio, baja rápido)
+        self.noise_floor_db = None
+        self.open_frames_left = 0
+        # Energías recientes: si la actividad no cesa, el suelo sigue a su mínimo
+        self.recent_db = deque(maxlen=max(1, int(floor_window / frame_seconds)))
+        self.active_run = 0
+
+        # Estadísticas
+        self.frames_total = 0
+        self.frames_processed = 0
+        self.process_cpu_time = 0.0
+
+    def _energy_db(self, pcm):
+        """Energía RMS del frame en dBFS"""
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        rms = np.sqrt(np.mean(samples * samples)) + 1e-9
+        return 20.0 * np.log10(rms / 32768.0)
+
+    def _update_floor(self, energy_db):
+        """Actualiza el suelo de ruido con los frames sin actividad"""
+        if self.noise_floor_db is None or energy_db < self.noise_floor_db:
+            self.noise_floor_db = energy_db
+        else:
+            self.noise_floor_db += 0.01 * (energy_db - self.noise_floor_db)
+
+    def _follow_rise(self):
+        """
+        Sube el suelo tras una racha de actividad tan larga como la ventana
+
+        Un ruido de fondo que aumenta (ventilador, lluvia) deja todos los
+        frames por encima del margen y el suelo no se actualizaría nunca:
+        la puerta quedaría abierta. El mínimo de la ventana es el ruido real
+        (en una conversación, las pausas), así que sirve de nuevo suelo.
+        """
+        if self.active_run >= self.recent_db.maxlen:
+            floor = min(self.recent_db)
+            if floor > self.noise_floor_db:
+                self.noise_floor_db = floor
+                metrics.inc('low_power.floor_rises')
+            self.active_run = 0
+
+    def push(self, pcm):
+        """
+        Pasa un frame por la puerta
+
+        Args:
+            pcm: Frame de audio (bytes int16, frame_length muestras)
+
+        Returns:
+            list: Frames que deben procesarse con Porcupine (vacía si la puerta está cerrada)
+        """
+        self.frames_total += 1
+        energy_db = self._energy_db(pcm)
+        self.recent_db.append(energy_db)
+
+        is_active = (
+            self.noise_floor_db is not None and
+            energy_db > self.noise_floor_db + self.margin_db
+        )
+
+        if is_active:
+            self.active_run += 1
+            self._follow_rise()
+        else:
+            self.active_run = 0
+            self._update_floor(energy_db)
+
+        if is_active:
+            was_closed = self.open_frames_left == 0
+            self.open_frames_left = self.hangover_frames
+
+            if was_closed:
+                # Abrir puerta: procesar también el audio previo
+                frames = list(self.lookback) + [pcm]
+                self.lookback.clear()
+                return frames
+            return [pcm]
+
+        if self.open_frames_left > 0:
+            self.open_frames_left -= 1
+            return [pcm]
+
+        self.lookback.append(pcm)
+        return []
+
+    def detect(self, pcm, process_fn):
+        """
+        Ejecuta el detector sobre los frames que superan la puerta
+
+        Args:
+            pcm: Frame de audio (bytes)
+            process_fn: Función que recibe los bytes del frame y retorna el índice de keyword
+
+        Returns:
+            int: Índice de keyword detectada, o -1
+        """
+        for frame in self.push(pcm):
+            start = time.thread_time()
+            keyword_index = process_fn(frame)
+            self.process_cpu_time += time.thread_time() - start
+            self.frames_processed += 1
+
+            if keyword_index >= 0:
+                # El wake word ya se ha consumido; descartar lookback restante
+                self.lookback.clear()
+                self._publish()
+                return keyword_index
+
+        if self.frames_total % 500 == 0:
+            self._publish()
+        return -1
+
+    def estimated_cpu_saved(self):
+        """Tiempo de CPU estimado que se ha ahorrado al saltar frames"""
+        if self.frames_processed == 0:
+            return 0.0
+        per_frame = self.process_cpu_time / self.frames_processed
+        return per_frame * (self.frames_total - self.frames_processed)
+
+    def skip_ratio(self):
+        """Fracción de frames que no llegaron a Porcupine"""
+        if self.frames_total == 0:
+            return 0.0
+        return 1 - self.frames_processed / self.frames_total
+
+    def _publish(self):
+        """Vuelca las estadísticas en las métricas globales"""
+        metrics.set_gauge('low_power.frames_total', self.frames_total)
+        metrics.set_gauge('low_power.frames_processed', self.frames_processed)
+        metrics.set_gauge('low_power.skip_ratio', self.skip_ratio())
+        metrics.set_gauge('low_power.cpu_saved_s', self.estimated_cpu_saved())
+
+    def report(self):
+        """Muestra el ahorro de CPU por consola"""
+        self._publish()
+        print(
+            f"🔋 Bajo consumo: {self.skip_ratio() * 100:.1f}% frames saltados, "
+            f"~{self.estimated_cpu_saved():.1f}s de CPU ahorrados"
+        )
+
+
+def _read_fixture_frames(path, frame_length):
+    """Lee un WAV de 16 kHz mono y lo divide en frames de Porcupine"""
+    with wave.open(path, 'rb') as wf:
+        if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: se requiere WAV mono de 16 bits")
+        data = wf.readframes(wf.getnframes())
+
+    frame_bytes = frame_length * 2
+    return [data[i:i + frame_bytes] for i in range(0, len(data) - frame_bytes + 1, frame_bytes)]
+
+
+def _run_detector(porcupine, frames, gate=None):
+    """Ejecuta Porcupine sobre los frames y retorna (detecciones, segundos de CPU)"""
+    fmt = "h" * porcupine.frame_length
+
+    def process_fn(pcm):
+        return porcupine.process(struct.unpack_from(fmt, pcm))
+
+    detections = []
+    start = time.process_time()
+    for index, pcm in enumerate(frames):
+        if gate is None:
+            keyword_index = process_fn(pcm)
+        else:
+            keyword_index = gate.detect(pcm, process_fn)
+        if keyword_index >= 0:
+            detections.append(index)
+    return detections, time.process_time() - start
+
+
+def evaluate_fixtures(paths, tolerance=1.0):
+    """
+    Compara el modo normal con el de bajo consumo sobre grabaciones
+
+    Args:
+        paths: Lista de archivos WAV (16 kHz, mono, 16 bits)
+        tolerance: Segundos de margen para emparejar detecciones
+
+    Returns:
+        dict: Tiempos de CPU, ahorro y tasa de fallos del wake word
+    """
+    import pvporcupine
+
+    porcupine = pvporcupine.create(
+        access_key=Config.PICOVOICE_KEY,
+        keywords=[Config.WAKE_WORD],
+        sensitivities=[0.7]
+    )
+
+    frame_seconds = porcupine.frame_length / porcupine.sample_rate
+    max_offset = int(tolerance / frame_seconds)
+
+    full_cpu = gated_cpu = 0.0
+    reference = missed = 0
+
+    try:
+        for path in paths:
+            frames = _read_fixture_frames(path, porcupine.frame_length)
+
+            full, cpu = _run_detector(porcupine, frames)
+            full_cpu += cpu
+
+            gate = EnergyGate(porcupine.frame_length, porcupine.sample_rate)
+            gated, cpu = _run_detector(porcupine, frames, gate)
+            gated_cpu += cpu
+
+            reference += len(full)
+            missed += sum(
+                1 for index in full
+                if not any(abs(index - other) <= max_offset for other in gated)
+            )
+            print(f"  {path}: {len(full)} detecciones normales, {len(gated)} en bajo consumo")
+    finally:
+        porcupine.delete()
+
+    return {
+        'full_cpu_s': full_cpu,
+        'gated_cpu_s': gated_cpu,
+        'cpu_saving': 1 - gated_cpu / full_cpu if full_cpu else 0.0,
+        'wake_words': reference,
+        'miss_rate': missed / reference if reference else 0.0
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python low_power.py grabacion1.wav [grabacion2.wav ...]")
+        sys.exit(1)
+
+    result = evaluate_fixtures(sys.argv[1:])
+    print(f"⏱️ CPU modo normal: {result['full_cpu_s']:.2f}s")
+    print(f"🔋 CPU bajo consumo: {result['gated_cpu_s']:.2f}s ({result['cpu_saving'] * 100:.1f}% ahorro)")
+    print(f"🎯 Tasa de fallos: {result['miss_rate'] * 100:.1f}% de {result['wake_words']} wake words")
@@ -0,0 +1,63 @@
+"""
+Métricas internas de Jarvis (contadores y medidores en memoria)
+"""
+
+import threading
+
+
+class Metrics:
+    """Registro thread-safe de contadores y medidores del asistente"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+
+    def inc(self, name, value=1):
+        """Incrementa un contador"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Fija el valor actual de un medidor"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def get(self, name, default=0):
+        """Retorna el valor de un contador o medidor"""
+        with self._lock:
+            if name in self.counters:
+                return self.counters[name]
+            return self.gauges.get(name, default)
+
+    def snapshot(self):
+        """
+        Copia consistente de todas las métricas
+
+        Returns:
+            dict: {'counters': {...}, 'gauges': {...}}
+        """
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges)
+            }
+
+    def report(self):
+        """Muestra las métricas por consola"""
+        snap = self.snapshot()
+        if not snap['counters'] and not snap['gauges']:
+            return
+
+        print("📊 Métricas:")
+        for name, value in sorted(snap['counters'].items()):
+            print(f"  {name}: {value}")
+        for name, value in sorted(snap['gauges'].items()):
+            if isinstance(value, float):
+                print(f"  {name}: {value:.3f}")
+            else:
+                print(f"  {name}: {value}")
+
+
+# Instancia global compartida por todos los módulos
+metrics = Metrics()
@@ -0,0 +1,232 @@
+"""
+Precarga en segundo plano de las respuestas previsibles
+
+Cada pregunta que llega a la búsqueda se anota (normalizada) con su hora en
+un registro local. Un hilo revisa periódicamente qué preguntas se repiten a
+esta hora del día (el tiempo y las noticias por la mañana, por ejemplo),
+refresca sus respuestas antes de que se pidan y sintetiza ya su audio, todo
+dentro de un presupuesto diario de llamadas a las APIs.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from config import Config
+from knowledge_base import normalize_tokens, same_subject
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+
+class PrefetchedAnswer:
+    """Respuesta precargada para una pregunta frecuente"""
+
+    def __init__(self, question, answer, citations):
+        self.question = question
+        self.answer = answer
+        self.citations = citations
+        self.fetched = time.time()
+
+    def age(self):
+        return time.time() - self.fetched
+
+
+class Prefetcher:
+    """Aprende las preguntas frecuentes por hora y las responde por adelantado"""
+
+    def __init__(self, answer_engine, tts=None, render=None, path=None, split=None):
+        """
+        Args:
+            answer_engine: AnswerEngine con el que refrescar las respuestas
+            tts: TTSEngine con el que se hablará la respuesta, para presintetizarla (opcional)
+            render: Función respuesta -> texto exacto que se hablará (opcional)
+            path: Archivo SQLite del registro (por defecto Config.PREFETCH_LOG_FILE)
+            split: Función texto -> trozos que se sintetizan por separado (opcional)
+        """
+        self.answer_engine = answer_engine
+        self.tts = tts
+        self.render = render
+        self.split = split
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.budget_day = date.today()
+        self.budget_used = 0
+
+        self.conn = sqlite3.connect(path or Config.PREFETCH_LOG_FILE, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS queries (
+                ts REAL NOT NULL,
+                hour INTEGER NOT NULL,
+                normalized TEXT NOT NULL,
+                question TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS queries_hour ON queries (hour, ts);
+        """)
+
+    # ==================== Registro ====================
+
+    def record(self, question):
+        """Anota una pregunta del usuario en el registro"""
+        tokens = normalize_tokens(question)
+        if not tokens:
+            return
+
+        now = datetime.now()
+        cutoff = time.time() - Config.PREFETCH_HISTORY_DAYS * 86400
+        with self._lock:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO queries (ts, hour, normalized, question) VALUES (?, ?, ?, ?)",
+                    (now.timestamp(), now.hour, ' '.join(tokens), question)
+                )
+                self.conn.execute("DELETE FROM queries WHERE ts < ?", (cutoff,))
+
+    def predicted(self, now=None):
+        """
+        Preguntas frecuentes a esta hora y en los próximos minutos
+
+        Returns:
+            list: [(normalizada, última forma de preguntarla, veces), ...]
+        """
+        now = now or datetime.now()
+        hours = {now.hour, (now + timedelta(seconds=Config.PREFETCH_LOOKAHEAD)).hour}
+        cutoff = time.time() - Config.PREFETCH_HISTORY_DAYS * 86400
+
+        placeholders = ','.join('?' * len(hours))
+        with self._lock:
+            # Con MAX(ts), SQLite toma 'question' de la fila más reciente del grupo
+            rows = self.conn.execute(f"""
+                SELECT normalized, question, COUNT(*) AS n, MAX(ts)
+                FROM queries
+                WHERE hour IN ({placeholders}) AND ts >= ?
+                GROUP BY normalized
+                HAVING n >= ?
+                ORDER BY n DESC
+                LIMIT ?
+            """, (*hours, cutoff, Config.PREFETCH_MIN_COUNT, Config.PREFETCH_MAX_QUERIES)).fetchall()
+
+        return [(normalized, question, count) for normalized, question, count, _ in rows]
+
+    # ==================== Respuestas precargadas ====================
+
+    def lookup(self, question):
+        """
+        Respuesta precargada y aún fresca para una pregunta equivalente
+
+        Returns:
+            tuple or None: (respuesta, citations)
+        """
+        tokens = set(normalize_tokens(question))
+        if not tokens:
+            return None
+
+        with self._lock:
+            entries = list(self.entries.items())
+
+        for normalized, entry in entries:
+            if entry.age() > Config.PREFETCH_TTL:
+                continue
+            # Misma pregunta salvo palabras de relleno: otra ciudad u otro año no valen
+            if same_subject(tokens, set(normalized.split())):
+                metrics.inc('prefetch.hits')
+                return entry.answer, entry.citations
+
+        return None
+
+    def _spend(self):
+        """Consume una llamada del presupuesto diario; False si está agotado"""
+        today = date.today()
+        if today != self.budget_day:
+            self.budget_day = today
+            self.budget_used = 0
+
+        if self.budget_used >= Config.PREFETCH_DAILY_BUDGET:
+            metrics.inc('prefetch.budget_exhausted')
+            return False
+
+        self.budget_used += 1
+        metrics.set_gauge('prefetch.budget_left', Config.PREFETCH_DAILY_BUDGET - self.budget_used)
+        return True
+
+    def _prepare(self, text):
+        """Presintetiza el texto trozo a trozo mientras quede presupuesto"""
+        for chunk in self.split(text) if self.split else [text]:
+            if not self._spend():
+                return
+            try:
+                self.tts.prepare(chunk)
+            except Exception as e:
+                log.warning(f"⚠️ Presíntesis fallida: {e}")
+                return
+            metrics.inc('prefetch.prepared_chunks')
+
+    def refresh_once(self):
+        """
+        Refresca las respuestas previstas que estén caducando
+
+        Returns:
+            int: Respuestas refrescadas
+        """
+        refreshed = 0
+        for normalized, question, _ in self.predicted():
+            entry = self.entries.get(normalized)
+            # Se refresca al pasar la mitad de su vida para llegar siempre fresca
+            if entry and entry.age() < Config.PREFETCH_TTL / 2:
+                continue
+
+            if not self._spend():
+                break
+
+            try:
+                answer, citations, _ = self.answer_engine.ask(question)
+            except Exception as e:
+                log.warning(f"⚠️ Precarga fallida para '{question}': {e}")
+                continue
+
+            with self._lock:
+                self.entries[normalized] = PrefetchedAnswer(question, answer, citations)
+            refreshed += 1
+            metrics.inc('prefetch.refreshed')
+
+            # Audio listo para reproducir sin esperar a la síntesis: los mismos
+            # trozos que se pedirán al hablar, o no se usaría nunca
+            if self.tts and self.render:
+                self._prepare(self.render(answer))
+
+        # Olvidar lo que ya no es previsible ni fresco
+        with self._lock:
+            for normalized in [n for n, e in self.entries.items() if e.age() > Config.PREFETCH_TTL]:
+                del self.entries[normalized]
+
+        return refreshed
+
+    # ==================== Hilo ====================
+
+    def start(self):
+        """Lanza el hilo de precarga"""
+        def run():
+            # Primera pasada con retraso para no competir con el arranque
+            delay = Config.PREFETCH_START_DELAY
+            while not self._stop.wait(delay):
+                try:
+                    count = self.refresh_once()
+                    if count:
+                        log.info(f"🔮 {count} respuestas precargadas")
+                except Exception as e:
+                    log.warning(f"⚠️ Error en precarga: {e}")
+                delay = Config.PREFETCH_INTERVAL
+
+        self._thread = threading.Thread(target=run, name='prefetch', daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,231 @@
+"""
+Perfilador por muestreo que se activa sin parar el asistente
+
+Cuando una unidad empieza a ir lenta no basta con las métricas: hay que
+saber si el tiempo se va en el bucle del wake word, en classify_intent, en
+conversiones de NumPy o esperando a la red. Este perfilador toma cada
+PROFILE_INTERVAL segundos la pila de todos los hilos (sys._current_frames)
+desde un hilo propio, sin instrumentar cada llamada, y al terminar escribe
+las pilas en formato "collapsed" (una línea por pila con su número de
+muestras), que leen directamente flamegraph.pl, speedscope o inferno.
+
+Es un perfil de tiempo real: un hilo esperando a un socket o a un lock
+también aparece, que es justo lo que hace falta para ver esperas de red.
+
+Los bucles principales se marcan con profiler.marker() o @profiler.marked();
+los marcadores activos de cada hilo encabezan sus pilas ("[wake_loop]"),
+así que en el flamegraph el tiempo queda agrupado por bucle.
+
+Se activa con SIGUSR1 (alterna inicio/fin) o con el socket de control:
+    python control_socket.py profile 20
+"""
+
+import contextlib
+import functools
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import Config
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+
+class SamplingProfiler:
+    """Muestreo periódico de las pilas de todos los hilos, con marcadores por hilo"""
+
+    def __init__(self, interval=None):
+        self.interval = interval or Config.PROFILE_INTERVAL
+        self._markers = {}          # ident del hilo -> lista de marcadores activos
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stacks = Counter()
+        self.samples = 0
+        self.output = None
+
+    # ==================== Marcadores ====================
+
+    @contextlib.contextmanager
+    def marker(self, name):
+        """Marca el bloque: las muestras de este hilo llevan [name] delante"""
+        ident = threading.get_ident()
+        stack = self._markers.setdefault(ident, [])
+        stack.append(name)
+        try:
+            yield
+        finally:
+            stack.pop()
+            if not stack:
+                # Los hilos de vida corta (interrupción, avisos) no dejan entradas
+                self._markers.pop(ident, None)
+
+    def marked(self, name):
+        """Decorador equivalente a envolver la función en marker(name)"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.marker(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ==================== Sesiones ====================
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds=None):
+        """
+        Empieza una sesión de perfilado en segundo plano
+
+        Args:
+            seconds: Duración (por defecto Config.PROFILE_SECONDS)
+
+        Returns:
+            str: Archivo donde se escribirá el resultado
+        """
+        seconds = min(seconds or Config.PROFILE_SECONDS, Config.PROFILE_MAX_SECONDS)
+        with self._lock:
+            if self.running:
+                return self.output
+
+            os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            self.output = os.path.join(Config.PROFILE_DIR, f"profile-{stamp}.folded")
+            self.stacks = Counter()
+            self.samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds, self.output), name='profiler', daemon=True
+            )
+            self._thread.start()
+
+        log.info(f"🔬 Perfilando {seconds:.0f}s (cada {self.interval * 1000:.0f} ms) -> {self.output}")
+        metrics.inc('profiler.sessions')
+        return self.output
+
+    def stop(self, wait=True):
+        """
+        Termina la sesión en curso antes de tiempo (escribe el resultado)
+
+        Returns:
+            str: Archivo del resultado, o None si no había sesión
+        """
+        thread = self._thread
+        if thread is None:
+            return None
+        self._stop.set()
+        if wait and thread is not threading.current_thread():
+            thread.join()
+        return self.output
+
+    def toggle(self):
+        """Inicia una sesión o, si hay una en curso, la termina"""
+        if self.running:
+            return self.stop(wait=False)
+        return self.start()
+
+    def _run(self, seconds, output):
+        own = threading.get_ident()
+        names = {}
+        cost = 0.0
+        deadline = time.monotonic() + seconds
+
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            start = time.perf_counter()
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+
+            for ident, frame in frames.items():
+                if ident != own:
+                    self.stacks[self._collapse(names.get(ident, str(ident)), ident, frame)] += 1
+            del frames
+            self.samples += 1
+            cost += time.perf_counter() - start
+
+            self._stop.wait(self.interval)
+
+        self._write(output)
+        # Fracción del tiempo de CPU que se ha llevado el propio muestreo
+        overhead = cost / max(1e-9, self.samples * self.interval) * 100
+        metrics.set_gauge('profiler.overhead_pct', overhead)
+        log.info(f"🔬 Perfil guardado: {output} ({self.samples} muestras, coste {overhead:.1f}%)")
+        self._summary()
+
+    def _collapse(self, thread_name, ident, frame):
+        """Pila en formato collapsed: hilo;[marcadores];raíz;...;hoja"""
+        calls = []
+        while frame is not None:
+            code = frame.f_code
+            calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        calls.reverse()
+        markers = [f"[{name}]" for name in self._markers.get(ident, ())]
+        return ';'.join([thread_name.replace(';', ':'), *markers, *calls])
+
+    def _write(self, output):
+        tmp = output + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp, output)
+
+    def _summary(self, top=8):
+        """Reparto por marcador y funciones hoja más frecuentes"""
+        total = sum(self.stacks.values())
+        if not total:
+            return
+
+        by_marker = Counter()
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            parts = stack.split(';')
+            marks = [p for p in parts[1:] if p.startswith('[')]
+            by_marker[marks[-1] if marks else '(sin marcador)'] += count
+            leaves[parts[-1]] += count
+
+        log.info("🔬 Tiempo por marcador: " + ", ".join(
+            f"{name} {count * 100 / total:.0f}%" for name, count in by_marker.most_common(top)
+        ))
+        log.info("🔬 Funciones más vistas: " + ", ".join(
+            f"{name} {count * 100 / total:.0f}%" for name, count in leaves.most_common(top)
+        ))
+
+    # ==================== Activación ====================
+
+    def install_signal(self):
+        """SIGUSR1 alterna el perfilado (solo Unix y desde el hilo principal)"""
+        if not hasattr(signal, 'SIGUSR1') or threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle())
+        return True
+
+    def control_command(self, args):
+        """Comando 'profile' del socket de control: profile [segundos|stop|status]"""
+        if args and args[0] == 'stop':
+            output = self.stop()
+            return f"Perfil guardado en {output}" if output else "No había ningún perfil en curso"
+        if args and args[0] == 'status':
+            if self.running:
+                return f"Perfilando ({self.samples} muestras) -> {self.output}"
+            return "Perfilador parado"
+        try:
+            seconds = float(args[0]) if args else None
+        except ValueError:
+            return "Uso: profile [segundos|stop|status]"
+        if self.running:
+            return f"Ya hay un perfil en curso -> {self.output}"
+        return f"Perfilando -> {self.start(seconds)}"
+
+
+# Instancia global (los marcadores se usan desde cualquier módulo)
+profiler = SamplingProfiler()
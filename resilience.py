@@ -0,0 +1,215 @@
+"""
+Capa de resiliencia para APIs externas
+
+Por cada endpoint (Perplexity, Gemini, Google STT, Google TTS) se guarda la
+latencia reciente (EWMA + ventana para percentiles), de la que se deriva
+un plazo adaptativo, y un circuit breaker que falla rápido mientras el
+proveedor está caído para pasar directamente a las alternativas locales.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from cancellation import Cancelled
+from config import Config
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+
+class CircuitOpenError(Exception):
+    """El proveedor está marcado como caído; no se intenta la llamada"""
+
+
+class LatencyWindow:
+    """Latencias recientes de un endpoint para calcular percentiles"""
+
+    def __init__(self, size=50):
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p):
+        """Percentil p (0-100), o None si hay pocas muestras"""
+        with self._lock:
+            if len(self.samples) < 5:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clásico
+
+    - 'closed': las llamadas pasan
+    - 'open': se rechazan hasta que pasa el tiempo de enfriamiento
+    - 'half_open': se deja pasar una llamada de prueba
+    """
+
+    STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+    def __init__(self, name, failure_threshold=None, cooldown=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or Config.BREAKER_FAILURE_THRESHOLD
+        self.cooldown = cooldown or Config.BREAKER_COOLDOWN
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._publish()
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if state == 'open':
+                metrics.inc(f'breaker.{self.name}.opened')
+                log.warning(f"🔌 {self.name} marcado como caído durante {self.cooldown:.0f}s")
+            elif state == 'closed':
+                log.info(f"🔌 {self.name} recuperado")
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge(f'breaker.{self.name}.state', self.STATES[self.state])
+
+    def allow(self):
+        """
+        Indica si se puede intentar una llamada
+
+        Returns:
+            bool: False si el circuito está abierto
+        """
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    metrics.inc(f'breaker.{self.name}.rejected')
+                    return False
+                self._set_state('half_open')
+
+            if self.state == 'half_open':
+                if self._probe_in_flight:
+                    metrics.inc(f'breaker.{self.name}.rejected')
+                    return False
+                self._probe_in_flight = True
+
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._set_state('closed')
+
+    def release(self):
+        """Libera la llamada de prueba sin contar éxito ni fallo (p. ej. cancelada)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state('open')
+
+
+class Endpoint:
+    """Salud de un endpoint: latencia, plazo adaptativo y circuit breaker"""
+
+    def __init__(self, name, min_deadline, max_deadline, alpha=0.2):
+        self.name = name
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.alpha = alpha
+        self.ewma = None
+        self.window = LatencyWindow()
+        self.breaker = CircuitBreaker(name)
+
+    def record_latency(self, seconds):
+        """Registra la latencia de una llamada correcta"""
+        self.ewma = seconds if self.ewma is None else self.ewma + self.alpha * (seconds - self.ewma)
+        self.window.add(seconds)
+        metrics.set_gauge(f'latency.{self.name}.ewma_ms', self.ewma * 1000)
+        p95 = self.window.percentile(95)
+        if p95 is not None:
+            metrics.set_gauge(f'latency.{self.name}.p95_ms', p95 * 1000)
+
+    def percentile(self, p):
+        return self.window.percentile(p)
+
+    def deadline(self):
+        """
+        Plazo para una llamada a partir de las latencias observadas
+
+        Returns:
+            float: Segundos (máximo permitido si aún no hay historial)
+        """
+        p99 = self.window.percentile(99)
+        if p99 is None:
+            return self.max_deadline
+        return min(self.max_deadline, max(self.min_deadline, p99 * Config.DEADLINE_FACTOR))
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Ejecuta fn(*args, timeout=plazo, **kwargs) bajo el circuit breaker
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} no disponible")
+
+        start = time.perf_counter()
+        try:
+            result = fn(*args, timeout=self.deadline(), **kwargs)
+        except Cancelled:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        self.record_latency(time.perf_counter() - start)
+        return result
+
+
+class Resilience:
+    """Registro de endpoints compartido por todo el asistente"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def endpoint(self, name):
+        """Retorna (creándolo si hace falta) el endpoint con ese nombre"""
+        with self._lock:
+            if name not in self.endpoints:
+                min_deadline, max_deadline = Config.ENDPOINT_DEADLINES.get(name, (2.0, 15.0))
+                self.endpoints[name] = Endpoint(name, min_deadline, max_deadline)
+            return self.endpoints[name]
+
+    def snapshot(self):
+        """Estado de todos los endpoints"""
+        with self._lock:
+            endpoints = list(self.endpoints.values())
+        return {
+            e.name: {
+                'state': e.breaker.state,
+                'ewma_ms': e.ewma * 1000 if e.ewma is not None else None,
+                'deadline_s': e.deadline()
+            }
+            for e in endpoints
+        }
+
+
+# Instancia global compartida por todos los módulos
+resilience = Resilience()
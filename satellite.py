@@ -0,0 +1,167 @@
+"""
+Satélite de sala para el modo servidor
+
+Solo escucha el wake word (Porcupine, en local) y, tras detectarlo, envía
+el audio del micrófono al servidor hasta que este indica el fin de la
+frase. Después reproduce la respuesta que llega. Si se vuelve a decir el
+wake word mientras habla, corta la reproducción, cancela el turno en el
+servidor y empieza una pregunta nueva.
+
+Uso:
+    python satellite.py --room cocina --server 192.168.1.10:8765
+"""
+
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+
+import pvporcupine
+import pyaudio
+import pygame
+
+from config import Config
+from server import HELLO, WAKE, AUDIO, CANCEL, ENDPOINT, RESULT, SPEECH, ProtocolError, send_frame, recv_frame
+
+
+class Satellite:
+    """Micrófono y altavoz de una sala conectados al servidor Jarvis"""
+
+    def __init__(self, server, room):
+        host, _, port = server.rpartition(':')
+        self.room = room
+        self.capturing = False
+        self.playing = False
+        self._stop_playback = threading.Event()
+        self._send_lock = threading.Lock()
+
+        self.porcupine = pvporcupine.create(
+            access_key=Config.PICOVOICE_KEY,
+            keywords=[Config.WAKE_WORD],
+            sensitivities=[0.7]
+        )
+        self.pa = pyaudio.PyAudio()
+        pygame.mixer.init()
+
+        self.sock = socket.create_connection((host, int(port)))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        hello = {'room': room, 'sample_rate': self.porcupine.sample_rate, 'token': Config.SERVER_TOKEN}
+        self.send(HELLO, json.dumps(hello).encode('utf-8'))
+        print(f"✅ Satélite '{room}' conectado a {server}")
+
+    def send(self, kind, payload=b''):
+        with self._send_lock:
+            send_frame(self.sock, kind, payload)
+
+    def _receive(self):
+        """Hilo que atiende las tramas del servidor"""
+        while True:
+            try:
+                kind, payload = recv_frame(self.sock)
+            except ProtocolError as e:
+                print(f"❌ Trama no válida del servidor: {e}")
+                kind = None
+            if kind is None:
+                print("🔌 Conexión con el servidor cerrada")
+                os._exit(1)
+            if kind == ENDPOINT:
+                self.capturing = False
+            elif kind == RESULT:
+                result = json.loads(payload.decode('utf-8'))
+                if result.get('text'):
+                    print(f"\n🗣️  Jarvis: {result['text']}\n")
+            elif kind == SPEECH:
+                self._play(payload)
+
+    def _play(self, audio):
+        """Reproduce el MP3 recibido; se puede cortar con un nuevo wake word"""
+        fd, path = tempfile.mkstemp(suffix='.mp3')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(audio)
+
+        self._stop_playback.clear()
+        self.playing = True
+        try:
+            pygame.mixer.music.load(path)
+            pygame.mixer.music.play()
+            while pygame.mixer.music.get_busy():
+                if self._stop_playback.is_set():
+                    pygame.mixer.music.stop()
+                    print("⏹️ Reproducción detenida")
+                    break
+                pygame.time.Clock().tick(10)
+            pygame.mixer.music.unload()
+        except Exception as e:
+            print(f"❌ Error reproduciendo respuesta: {e}")
+        finally:
+            self.playing = False
+            os.remove(path)
+
+    def run(self):
+        threading.Thread(target=self._receive, name='satellite-recv', daemon=True).start()
+
+        frame_length = self.porcupine.frame_length
+        stream = self.pa.open(
+            rate=self.porcupine.sample_rate,
+            channels=1,
+            format=pyaudio.paInt16,
+            input=True,
+            frames_per_buffer=frame_length
+        )
+        print(f"🎤 Escuchando '{Config.WAKE_WORD}' en {self.room}...")
+
+        try:
+            while True:
+                pcm = stream.read(frame_length, exception_on_overflow=False)
+
+                if self.capturing:
+                    self.send(AUDIO, pcm)
+                    continue
+
+                if self.porcupine.process(struct.unpack_from("h" * frame_length, pcm)) < 0:
+                    continue
+
+                # Interrupción: cortar la respuesta y cancelar el turno en curso
+                if self.playing:
+                    self._stop_playback.set()
+                    self.send(CANCEL)
+
+                print(f"✅ '{Config.WAKE_WORD.upper()}' detectado!")
+                self.capturing = True
+                self.send(WAKE)
+        finally:
+            stream.close()
+
+    def cleanup(self):
+        self.sock.close()
+        self.porcupine.delete()
+        self.pa.terminate()
+        pygame.mixer.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Satélite de sala de Jarvis")
+    parser.add_argument('--server', default=Config.SATELLITE_SERVER)
+    parser.add_argument('--room', default=Config.SATELLITE_ROOM)
+    args = parser.parse_args()
+
+    try:
+        satellite = Satellite(args.server, args.room)
+    except Exception as e:
+        print(f"❌ No se pudo iniciar el satélite: {e}")
+        sys.exit(1)
+
+    try:
+        satellite.run()
+    except KeyboardInterrupt:
+        print("\n👋 Hasta luego")
+    finally:
+        satellite.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,761 @@
+"""
+Modo servidor multi-sala
+
+Un único proceso "cerebro" atiende a varios satélites (uno por sala). Cada
+satélite solo detecta el wake word y envía el audio PCM por TCP; el servidor
+hace la detección de fin de frase, la transcripción, la intención, la
+respuesta y la síntesis con servicios compartidos: un solo cliente de TTS,
+una sola caché de respuestas y transcripciones, una sola base de
+conocimiento y un solo UserManager. El trabajo de cada frase va a un pool
+de hilos; como casi todo el tiempo es espera de red, el pool se dimensiona
+por encima del número de núcleos.
+
+Protocolo (tramas con cabecera de 1 byte de tipo + 4 bytes de longitud):
+
+    satélite -> servidor: HELLO (JSON), WAKE, AUDIO (PCM int16 mono), CANCEL
+    servidor -> satélite: ENDPOINT (dejar de enviar), RESULT (JSON), SPEECH (MP3)
+
+Por defecto solo escucha en 127.0.0.1. Si se abre a la red, SERVER_TOKEN
+debe coincidir con el 'token' del HELLO o la conexión se cierra; las tramas
+de más de SERVER_MAX_FRAME_BYTES también cierran la conexión.
+
+Uso:
+    python server.py                         # servidor real
+    python server.py --load-test             # prueba de carga con backends simulados
+"""
+
+import argparse
+import hmac
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+import wave
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cancellation import TurnContext, Cancelled
+from config import Config
+from conversation import ConversationHistory
+from intents import classify_intent
+from metrics import metrics
+from skills import Scheduler, build_registry
+from turn_log import TurnRecord
+from upload_payload import trim_frames
+from utils import clean_text_for_speech
+from vad_stage import VadStage
+
+
+log = logging.getLogger('jarvis')
+
+# ==================== Protocolo ====================
+
+HELLO = b'H'
+WAKE = b'W'
+AUDIO = b'A'
+CANCEL = b'C'
+ENDPOINT = b'P'
+RESULT = b'R'
+SPEECH = b'S'
+
+_HEADER = struct.Struct('!cI')
+
+# Frecuencias que admite webrtcvad
+SAMPLE_RATES = (8000, 16000, 32000, 48000)
+
+
+class ProtocolError(Exception):
+    """Trama mal formada o demasiado grande"""
+
+
+def send_frame(sock, kind, payload=b''):
+    """Envía una trama (tipo + longitud + datos)"""
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock, max_size=None):
+    """
+    Recibe una trama
+
+    Args:
+        sock: Socket conectado
+        max_size: Longitud máxima aceptada (por defecto Config.SERVER_MAX_FRAME_BYTES)
+
+    Returns:
+        tuple: (tipo, datos), o (None, None) si se cerró la conexión
+
+    Raises:
+        ProtocolError: Si la longitud anunciada supera el máximo
+    """
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None, None
+    kind, size = _HEADER.unpack(header)
+    # Sin límite, una cabecera basura haría reservar hasta 4 GiB
+    if size > (max_size or Config.SERVER_MAX_FRAME_BYTES):
+        metrics.inc('server.oversized_frames')
+        raise ProtocolError(f"Trama de {size} bytes")
+    payload = _recv_exact(sock, size) if size else b''
+    if payload is None:
+        return None, None
+    return kind, payload
+
+
+# ==================== Fin de frase ====================
+
+class Endpointer:
+    """
+    Detecta el final de la pregunta en el audio que llega de un satélite
+
+    Cada bloque recibido se analiza de una vez con VadStage, que conserva el
+    suelo de ruido de la sala entre turnos. Los tiempos se cuentan en
+    muestras recibidas, no en tiempo de reloj.
+    """
+
+    FRAME_MS = 30
+
+    def __init__(self, sample_rate=None, use_vad=True):
+        self.sample_rate = sample_rate or Config.SAMPLE_RATE
+        self.frame_bytes = int(self.sample_rate * self.FRAME_MS / 1000) * 2
+        self.vad = VadStage(self.sample_rate, self.frame_bytes // 2, use_webrtc=use_vad)
+        self.reset()
+
+    def reset(self):
+        self.buffer = b''
+        self.frames = []
+        self.flags = []
+        self.pre_roll = deque(maxlen=max(1, Config.UPLOAD_PAD_MS // self.FRAME_MS))
+        self.started = False
+        self.speech_frames = 0
+        self.silence_frames = 0
+        self.total_frames = 0
+
+    def push(self, data):
+        """
+        Añade audio
+
+        Returns:
+            bool: True cuando la frase ha terminado (o se agotó el tiempo)
+        """
+        self.buffer += data
+        complete = len(self.buffer) // self.frame_bytes
+        if not complete:
+            return False
+
+        block = [self.buffer[i * self.frame_bytes:(i + 1) * self.frame_bytes] for i in range(complete)]
+        self.buffer = self.buffer[complete * self.frame_bytes:]
+        block, decisions = self.vad.process(block)
+        frames_per_second = 1000 / self.FRAME_MS
+
+        for frame, speech in zip(block, decisions.tolist()):
+            self.total_frames += 1
+
+            if speech:
+                if not self.started:
+                    self.started = True
+                    self.frames.extend(self.pre_roll)
+                    self.flags.extend([False] * len(self.pre_roll))
+                self.speech_frames += 1
+                self.silence_frames = 0
+            elif self.started:
+                self.silence_frames += 1
+            else:
+                self.pre_roll.append(frame)
+                if self.total_frames >= Config.SERVER_NO_SPEECH_TIMEOUT * frames_per_second:
+                    return True
+                continue
+
+            self.frames.append(frame)
+            self.flags.append(speech)
+
+            if self.silence_frames >= Config.SILENCE_DURATION * frames_per_second:
+                return True
+            if self.total_frames >= Config.MAX_RECORDING_TIME * frames_per_second:
+                return True
+
+        return False
+
+    def take(self):
+        """
+        Retorna el audio de la frase recortado al habla y reinicia
+
+        Returns:
+            bytes or None: PCM, o None si no hubo voz suficiente
+        """
+        enough = self.speech_frames * self.FRAME_MS >= 300
+        frames = trim_frames(self.frames, self.flags, Config.UPLOAD_PAD_MS // self.FRAME_MS) if enough else []
+        self.reset()
+        return b''.join(frames) if frames else None
+
+
+# ==================== Cerebro compartido ====================
+
+class JarvisBrain:
+    """Servicios compartidos por todas las salas y pool de trabajo"""
+
+    def __init__(self, transcriber, answer_engine, tts, knowledge=None, user_manager=None,
+                 turn_log=None, workers=None):
+        """
+        Args:
+            transcriber: Con transcribe(archivo, token) -> (texto, backend)
+            answer_engine: Con ask(pregunta, token, historial) -> (respuesta, citations, backend)
+            tts: Con synthesize(texto, token) -> bytes
+            knowledge: KnowledgeBase compartida (opcional)
+            user_manager: UserManager compartido (opcional)
+            turn_log: TurnLogWriter (opcional)
+            workers: Frases procesadas a la vez (por defecto Config.SERVER_WORKERS)
+        """
+        self.transcriber = transcriber
+        self.answer_engine = answer_engine
+        self.tts = tts
+        self.knowledge = knowledge
+        self.user_manager = user_manager
+        self.turn_log = turn_log
+        self.scheduler = Scheduler()
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or Config.SERVER_WORKERS, thread_name_prefix='brain'
+        )
+        # register_user reescribe users_data.json
+        self._users_lock = threading.Lock()
+        self.sessions = set()
+        self._sessions_lock = threading.Lock()
+
+    def add_session(self, session):
+        with self._sessions_lock:
+            self.sessions.add(session)
+            metrics.set_gauge('server.sessions', len(self.sessions))
+
+    def remove_session(self, session):
+        with self._sessions_lock:
+            self.sessions.discard(session)
+            metrics.set_gauge('server.sessions', len(self.sessions))
+        # Sus avisos ya no tendrían a quién llegar
+        self.scheduler.cancel(owner=session)
+
+    def submit(self, session, pcm):
+        """Encola el procesamiento de una frase completa"""
+        return self.executor.submit(self.process, session, pcm, session.turn)
+
+    def _answer(self, session, query, token, record):
+        """Respuesta a una pregunta: base de conocimiento o motor de respuestas"""
+        # Con conversación en curso la pregunta puede depender de lo anterior
+        history = session.history.messages()
+        known = self.knowledge.lookup(query) if self.knowledge and not history else None
+        if known:
+            record.set(source='knowledge', cache_hit=True)
+            return known[0]
+
+        answer, citations, backend = self.answer_engine.ask(query, token, history)
+        record.set(source=backend, cache_hit=backend == 'cache')
+        if self.knowledge and not history and backend != 'cache':
+            self.knowledge.store(query, answer, citations)
+        return answer
+
+    def process(self, session, pcm, turn):
+        """
+        Transcribe, clasifica, responde y sintetiza una frase
+
+        Returns:
+            tuple or None: (resultado JSON, audio MP3 o None); None si se canceló
+        """
+        token = turn.token
+        record = TurnRecord(turn.id)
+        record.set(room=session.room, trigger='satellite')
+        audio_file = None
+
+        try:
+            fd, audio_file = tempfile.mkstemp(suffix='.wav')
+            with os.fdopen(fd, 'wb') as f, wave.open(f, 'wb') as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(session.sample_rate)
+                wf.writeframes(pcm)
+
+            start = time.perf_counter()
+            text, backend = self.transcriber.transcribe(audio_file, token)
+            record.add_stage('transcribe', (time.perf_counter() - start) * 1000)
+            record.set(query=text, stt_backend=backend)
+
+            user = None
+            if text and self.user_manager:
+                user, _ = self.user_manager.identify_user(audio_file, threshold=50)
+                record.set(user=user)
+
+            start = time.perf_counter()
+            if not text:
+                intent, spoken = 'not_understood', "Disculpe, no le he entendido"
+            else:
+                intent, response = classify_intent(
+                    text, skills=session.skills, current_user=user, greet=lambda: "Señor"
+                )
+                if intent == 'register_user' and self.user_manager:
+                    with self._users_lock:
+                        ok = self.user_manager.register_user(response, audio_file)
+                    spoken = "Encantado de conocerle, señor" if ok else "Disculpe señor, hubo un error al registrarle"
+                elif intent == 'question':
+                    answer = self._answer(session, text, token, record)
+                    session.history.add(text, answer)
+                    spoken = f"Señor. {answer}"
+                else:
+                    spoken = response
+            record.add_stage('answer', (time.perf_counter() - start) * 1000)
+            record.set(intent=intent)
+
+            spoken = clean_text_for_speech(spoken)
+            start = time.perf_counter()
+            try:
+                audio = self.tts.synthesize(spoken, token)
+            except Cancelled:
+                raise
+            except Exception as e:
+                log.warning(f"🔇 Voz no disponible: {e}")
+                audio = None
+            record.add_stage('tts', (time.perf_counter() - start) * 1000)
+
+            metrics.inc('server.utterances')
+            record.set(outcome='answered')
+            return {'query': text, 'intent': intent, 'text': spoken}, audio
+
+        except Cancelled:
+            record.set(outcome='cancelled')
+            return None
+        except Exception as e:
+            log.error(f"❌ Error procesando frase de {session.room}: {e}")
+            metrics.inc('server.errors')
+            record.set(outcome='error', error=str(e))
+            return {'query': None, 'intent': 'error', 'text': "Disculpe señor, hubo un error"}, None
+        finally:
+            if audio_file and os.path.exists(audio_file):
+                os.remove(audio_file)
+            if self.turn_log:
+                self.turn_log.write(record.to_dict())
+
+    def shutdown(self):
+        self.scheduler.shutdown()
+        self.executor.shutdown(wait=False)
+
+
+# ==================== Sesiones ====================
+
+class SatelliteSession:
+    """Estado de un satélite conectado (una sala)"""
+
+    def __init__(self, brain, sock, room, sample_rate, use_vad=True):
+        self.brain = brain
+        self.sock = sock
+        self.room = room
+        self.sample_rate = sample_rate
+        self.history = ConversationHistory()
+        self.endpointer = Endpointer(sample_rate, use_vad=use_vad)
+        self.turn = TurnContext()
+        self.capturing = False
+        self._send_lock = threading.Lock()
+        # Habilidades propias (los avisos vuelven a esta sala) con planificador común;
+        # cancelar o consultar un temporizador solo afecta a los de esta sala
+        self.skills, _ = build_registry(self.announce, scheduler=brain.scheduler, owner=self)
+
+    def send(self, kind, payload=b''):
+        with self._send_lock:
+            try:
+                send_frame(self.sock, kind, payload)
+            except OSError:
+                pass
+
+    def send_result(self, result, audio):
+        self.send(RESULT, json.dumps(result, ensure_ascii=False).encode('utf-8'))
+        if audio:
+            self.send(SPEECH, audio)
+
+    def announce(self, text):
+        """Aviso de temporizador o alarma para esta sala"""
+        try:
+            audio = self.brain.tts.synthesize(clean_text_for_speech(text))
+        except Exception:
+            audio = None
+        self.send_result({'query': None, 'intent': 'announce', 'text': text}, audio)
+
+    def wake(self):
+        """Empieza un turno nuevo cancelando lo que quedara del anterior"""
+        self.turn.cancel('wake')
+        self.turn = TurnContext()
+        self.endpointer.reset()
+        self.capturing = True
+
+    def cancel(self):
+        self.turn.cancel('barge_in')
+        self.capturing = False
+
+    def audio(self, data):
+        if not self.capturing or not self.endpointer.push(data):
+            return
+
+        self.capturing = False
+        self.send(ENDPOINT)
+        pcm = self.endpointer.take()
+        if pcm is None:
+            self.send_result({'query': None, 'intent': 'no_input', 'text': None}, None)
+            return
+
+        future = self.brain.submit(self, pcm)
+
+        def done(f):
+            result = f.result()
+            if result is not None:
+                self.send_result(*result)
+
+        future.add_done_callback(done)
+
+
+class SatelliteHandler(socketserver.BaseRequestHandler):
+    """Conexión de un satélite: lee tramas y las pasa a su sesión"""
+
+    def _hello(self, sock):
+        """
+        Lee y valida el HELLO del satélite
+
+        Returns:
+            dict or None: Datos del HELLO, o None si la conexión debe cerrarse
+        """
+        address = f"{self.client_address[0]}:{self.client_address[1]}"
+        try:
+            kind, payload = recv_frame(sock)
+            if kind != HELLO:
+                return None
+            hello = json.loads(payload.decode('utf-8'))
+        except (OSError, ProtocolError, UnicodeDecodeError, ValueError) as e:
+            log.warning(f"⚠️ HELLO no válido de {address}: {e}")
+            metrics.inc('server.rejected')
+            return None
+
+        if not isinstance(hello, dict):
+            log.warning(f"⚠️ HELLO no válido de {address}")
+            metrics.inc('server.rejected')
+            return None
+
+        token = self.server.token
+        if token and not hmac.compare_digest(str(hello.get('token', '')).encode('utf-8'), token.encode('utf-8')):
+            log.warning(f"🔒 Satélite rechazado (token incorrecto): {address}")
+            metrics.inc('server.rejected')
+            return None
+
+        sample_rate = hello.setdefault('sample_rate', Config.SAMPLE_RATE)
+        if type(sample_rate) is not int or sample_rate not in SAMPLE_RATES:
+            # Un 0 o un 1 rompería el WAV y el Endpointer más adelante
+            log.warning(f"⚠️ Satélite {address} con frecuencia no admitida: {sample_rate!r}")
+            metrics.inc('server.rejected')
+            error = {'query': None, 'intent': 'error',
+                     'text': f"Frecuencia de muestreo no admitida: {sample_rate}"}
+            try:
+                send_frame(sock, RESULT, json.dumps(error, ensure_ascii=False).encode('utf-8'))
+            except OSError:
+                pass
+            return None
+
+        hello.setdefault('room', address)
+        return hello
+
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        hello = self._hello(sock)
+        if hello is None:
+            return
+        session = SatelliteSession(
+            self.server.brain, sock,
+            room=str(hello['room']),
+            sample_rate=hello['sample_rate'],
+            use_vad=self.server.use_vad
+        )
+        self.server.brain.add_session(session)
+        log.info(f"🔗 Satélite conectado: {session.room}")
+
+        try:
+            while True:
+                kind, payload = recv_frame(sock)
+                if kind is None:
+                    break
+                if kind == AUDIO:
+                    session.audio(payload)
+                elif kind == WAKE:
+                    session.wake()
+                elif kind == CANCEL:
+                    session.cancel()
+        except ProtocolError as e:
+            log.warning(f"⚠️ Satélite {session.room}: {e}")
+        except OSError:
+            pass
+        finally:
+            session.turn.cancel('disconnect')
+            self.server.brain.remove_session(session)
+            log.info(f"🔌 Satélite desconectado: {session.room}")
+
+
+class JarvisServer(socketserver.ThreadingTCPServer):
+    """Servidor TCP: un hilo ligero de lectura por satélite, trabajo en el pool del cerebro"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    # Varias salas pueden conectarse a la vez al arrancar
+    request_queue_size = 64
+
+    def __init__(self, address, brain, use_vad=True, token=None):
+        """
+        Args:
+            address: (host, puerto) en el que escuchar
+            brain: JarvisBrain compartido
+            use_vad: Usar WebRTC VAD en el fin de frase
+            token: Secreto que deben enviar los satélites (por defecto Config.SERVER_TOKEN)
+        """
+        self.brain = brain
+        self.use_vad = use_vad
+        self.token = Config.SERVER_TOKEN if token is None else token
+        super().__init__(address, SatelliteHandler)
+
+
+def build_brain(workers=None):
+    """
+    Cerebro con los servicios reales (Google STT/TTS, Perplexity, Gemini)
+
+    Las dependencias de la nube se importan aquí para que el protocolo y la
+    prueba de carga funcionen sin ellas.
+    """
+    import google.generativeai as genai
+    import speech_recognition as sr
+    from google.cloud import texttospeech
+
+    from answer_engine import AnswerEngine, GeminiBackend, PerplexityBackend
+    from knowledge_base import KnowledgeBase
+    from transcribers import GoogleTranscriber, TranscriptionPolicy
+    from tts import TTSEngine
+    from tts_cache import TTSDiskCache
+    from turn_log import TurnLogWriter
+    from user_manager import UserManager
+
+    workers = workers or Config.SERVER_WORKERS
+
+    if Config.GOOGLE_CREDENTIALS:
+        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = Config.GOOGLE_CREDENTIALS
+
+    recognizer = sr.Recognizer()
+    transcriber = TranscriptionPolicy([GoogleTranscriber(recognizer)], sessions=workers)
+
+    hedges = []
+    if Config.HEDGE_ENABLED and Config.GOOGLE_API_KEY:
+        genai.configure(api_key=Config.GOOGLE_API_KEY)
+        model = genai.GenerativeModel('gemini-2.5-flash', system_instruction=Config.SYSTEM_PROMPT)
+        hedges.append(GeminiBackend(model))
+    answer_engine = AnswerEngine(PerplexityBackend(), hedges, sessions=workers)
+
+    tts = TTSEngine(
+        texttospeech.TextToSpeechClient(),
+        texttospeech.VoiceSelectionParams(
+            language_code=Config.LANGUAGE,
+            name=Config.VOICE_NAME,
+            ssml_gender=texttospeech.SsmlVoiceGender.MALE
+        ),
+        texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.MP3,
+            speaking_rate=Config.TTS_SPEAKING_RATE,
+            pitch=Config.TTS_PITCH
+        ),
+        TTSDiskCache() if Config.TTS_DISK_CACHE_ENABLED else None
+    )
+    tts.warm_up(Config.TTS_WARM_PHRASES)
+
+    return JarvisBrain(
+        transcriber,
+        answer_engine,
+        tts,
+        knowledge=KnowledgeBase() if Config.KNOWLEDGE_ENABLED else None,
+        user_manager=UserManager(),
+        turn_log=TurnLogWriter() if Config.TURN_LOG_ENABLED else None,
+        workers=workers
+    )
+
+
+# ==================== Prueba de carga ====================
+
+class _FakeTranscriber:
+    """Transcriptor simulado con latencia de red"""
+
+    QUERIES = ['qué es la fotosíntesis', 'cuánto es 15 por 23', 'quién escribió el quijote', 'hola']
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.count = 0
+
+    def transcribe(self, audio_file, token=None):
+        time.sleep(self.latency)
+        self.count += 1
+        return self.QUERIES[self.count % len(self.QUERIES)], 'fake'
+
+
+class _FakeAnswerEngine:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def ask(self, query, token=None, history=None):
+        time.sleep(self.latency)
+        return f"Respuesta simulada a {query}", [], 'fake'
+
+
+class _FakeTTS:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def synthesize(self, text, token=None):
+        time.sleep(self.latency)
+        return b'\xff\xfb' + text.encode('utf-8')
+
+
+def _utterance_pcm(sample_rate):
+    """0,3 s de silencio, 1 s de "voz" (tono fuerte) y 1,2 s de silencio"""
+    t = np.arange(sample_rate) / sample_rate
+    voice = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+    silence = np.zeros(int(sample_rate * 0.3), dtype=np.int16)
+    tail = np.zeros(int(sample_rate * (Config.SILENCE_DURATION + 0.2)), dtype=np.int16)
+    return np.concatenate([silence, voice, tail]).tobytes()
+
+
+def _simulated_satellite(address, room, turns, pcm, latencies, errors):
+    """Satélite simulado: wake, envía la frase en bloques de 30 ms y espera la voz"""
+    try:
+        sock = socket.create_connection(address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        hello = {'room': room, 'sample_rate': Config.SAMPLE_RATE, 'token': Config.SERVER_TOKEN}
+        send_frame(sock, HELLO, json.dumps(hello).encode())
+        chunk = int(Config.SAMPLE_RATE * 0.03) * 2
+
+        for _ in range(turns):
+            send_frame(sock, WAKE)
+            for i in range(0, len(pcm), chunk):
+                send_frame(sock, AUDIO, pcm[i:i + chunk])
+
+            kind, _ = recv_frame(sock)
+            if kind != ENDPOINT:
+                errors.append(f"{room}: se esperaba ENDPOINT")
+                return
+            start = time.perf_counter()
+
+            # Resultado y, si hay, audio
+            kind, payload = recv_frame(sock)
+            result = json.loads(payload)
+            if result.get('intent') != 'announce':
+                kind, _ = recv_frame(sock)
+            latencies.append(time.perf_counter() - start)
+
+        sock.close()
+    except Exception as e:
+        errors.append(f"{room}: {e}")
+
+
+def load_test(satellites, turns, worker_counts, stt_latency=0.3, answer_latency=0.5, tts_latency=0.15):
+    """
+    Lanza satélites simulados contra un servidor con backends simulados
+
+    Returns:
+        list: [(workers, frases/s, p50 ms, p95 ms), ...]
+    """
+    pcm = _utterance_pcm(Config.SAMPLE_RATE)
+    results = []
+
+    for workers in worker_counts:
+        brain = JarvisBrain(
+            _FakeTranscriber(stt_latency),
+            _FakeAnswerEngine(answer_latency),
+            _FakeTTS(tts_latency),
+            workers=workers
+        )
+        server = JarvisServer(('127.0.0.1', 0), brain, use_vad=False)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        latencies, errors = [], []
+        threads = [
+            threading.Thread(
+                target=_simulated_satellite,
+                args=(server.server_address, f"sala-{i}", turns, pcm, latencies, errors)
+            )
+            for i in range(satellites)
+        ]
+
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        server.shutdown()
+        server.server_close()
+        brain.shutdown()
+
+        if errors:
+            print(f"❌ {len(errors)} errores (p. ej. {errors[0]})")
+
+        ordered = sorted(latencies) or [0.0]
+        p50 = ordered[len(ordered) // 2] * 1000
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+        throughput = len(latencies) / elapsed
+        results.append((workers, throughput, p50, p95))
+        print(f"  workers={workers:3d}  {throughput:6.1f} frases/s  p50={p50:6.0f} ms  p95={p95:6.0f} ms")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor multi-sala de Jarvis")
+    parser.add_argument('--host', default=Config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--load-test', action='store_true', help="Prueba de carga con satélites simulados")
+    parser.add_argument('--satellites', type=int, default=16)
+    parser.add_argument('--turns', type=int, default=2)
+    args = parser.parse_args()
+
+    if args.load_test:
+        worker_counts = [args.workers] if args.workers else [1, 4, 16]
+        print(f"🏋️ Prueba de carga: {args.satellites} satélites x {args.turns} frases")
+        load_test(args.satellites, args.turns, worker_counts)
+        return
+
+    from turn_log import setup_console_logging
+    listener = setup_console_logging()
+
+    if args.host not in ('127.0.0.1', 'localhost', '::1') and not Config.SERVER_TOKEN:
+        print(f"⚠️ Escuchando en {args.host} sin SERVER_TOKEN: cualquiera en la red puede conectarse")
+
+    brain = build_brain(args.workers)
+    server = JarvisServer((args.host, args.port), brain)
+    print(f"🏠 Servidor Jarvis escuchando en {args.host}:{args.port} ({brain.executor._max_workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Apagando servidor...")
+    finally:
+        server.server_close()
+        brain.shutdown()
+        metrics.report()
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,528 @@
+"""
+Habilidades locales: temporizadores, alarmas, conversiones y cálculos
+
+Complementa a utils.is_local_command: cada habilidad declara sus patrones
+y el registro los compila en una única expresión regular, de modo que una
+sola búsqueda decide si la frase se resuelve en el dispositivo (respuesta
+inmediata y determinista) o hay que ir a la búsqueda web.
+
+Los temporizadores y alarmas comparten un único planificador: un heap
+ordenado por hora de disparo y un solo hilo que duerme hasta el siguiente.
+"""
+
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+
+# ==================== Números ====================
+
+NUMBER_WORDS = {
+    'cero': 0, 'un': 1, 'uno': 1, 'una': 1, 'dos': 2, 'tres': 3, 'cuatro': 4,
+    'cinco': 5, 'seis': 6, 'siete': 7, 'ocho': 8, 'nueve': 9, 'diez': 10,
+    'once': 11, 'doce': 12, 'trece': 13, 'catorce': 14, 'quince': 15,
+    'dieciséis': 16, 'diecisiete': 17, 'dieciocho': 18, 'diecinueve': 19,
+    'veinte': 20, 'veinticinco': 25, 'treinta': 30, 'cuarenta': 40,
+    'cincuenta': 50, 'sesenta': 60, 'noventa': 90, 'cien': 100, 'mil': 1000,
+    'medio': 0.5, 'media': 0.5
+}
+
+# Número completo: sin los límites, "cien" casaría con el principio de "ciento"
+# y "veinte" con el de "veintidós"
+NUM = r'(?<!\w)(?:-?\d+(?:[.,]\d+)?|' + '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r')(?!\w)'
+
+
+def parse_number(token):
+    """
+    Convierte un número en cifras ("2,5") o en palabras ("cinco")
+
+    Returns:
+        float: Valor numérico
+    """
+    token = token.strip().lower()
+    if token in NUMBER_WORDS:
+        return float(NUMBER_WORDS[token])
+    return float(token.replace(',', '.'))
+
+
+def format_number(value):
+    """Número listo para hablar: sin decimales si es entero, coma decimal si no"""
+    if abs(value - round(value)) < 1e-9:
+        return str(int(round(value)))
+    return f"{value:.2f}".rstrip('0').rstrip('.').replace('.', ',')
+
+
+def describe_duration(seconds):
+    """Duración en palabras ("1 hora y 5 minutos")"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+
+    parts = []
+    for amount, singular, plural in ((hours, 'hora', 'horas'),
+                                     (minutes, 'minuto', 'minutos'),
+                                     (secs, 'segundo', 'segundos')):
+        if amount:
+            parts.append(f"{amount} {singular if amount == 1 else plural}")
+
+    if not parts:
+        return "0 segundos"
+    if len(parts) == 1:
+        return parts[0]
+    return ', '.join(parts[:-1]) + ' y ' + parts[-1]
+
+
+# ==================== Planificador ====================
+
+class ScheduledJob:
+    """Trabajo pendiente del planificador"""
+
+    def __init__(self, job_id, kind, label, when, callback, owner=None):
+        self.id = job_id
+        self.kind = kind
+        self.label = label
+        self.owner = owner
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+
+class Scheduler:
+    """Planificador con heap y un único hilo para todos los temporizadores"""
+
+    def __init__(self):
+        self._heap = []
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = True
+
+    def schedule(self, delay, callback, kind='timer', label='', owner=None):
+        """
+        Programa callback() dentro de delay segundos
+
+        Args:
+            delay: Segundos hasta el disparo
+            callback: Función sin argumentos
+            kind: Tipo ('timer', 'alarm')
+            label: Descripción para el usuario
+            owner: Dueño del trabajo (la sala en el servidor), para cancelarlo o consultarlo aparte
+
+        Returns:
+            ScheduledJob: Trabajo programado (sirve para cancelarlo)
+        """
+        with self._cond:
+            job = ScheduledJob(next(self._ids), kind, label, time.monotonic() + delay, callback, owner)
+            heapq.heappush(self._heap, (job.when, job.id, job))
+            self._jobs[job.id] = job
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+                self._thread.start()
+
+            # Despertar al hilo por si este trabajo es el más próximo
+            self._cond.notify()
+        metrics.set_gauge('skills.scheduled', len(self._jobs))
+        return job
+
+    def _matching(self, kind, owner):
+        return [j for j in self._jobs.values()
+                if (kind is None or j.kind == kind) and (owner is None or j.owner is owner)]
+
+    def cancel(self, kind=None, owner=None):
+        """
+        Cancela los trabajos pendientes (de un tipo o todos, de un dueño o de todos)
+
+        Returns:
+            int: Trabajos cancelados
+        """
+        with self._cond:
+            jobs = self._matching(kind, owner)
+            for job in jobs:
+                # Borrado perezoso: el heap lo descarta al llegar su turno
+                job.cancelled = True
+                del self._jobs[job.id]
+            self._cond.notify()
+        metrics.set_gauge('skills.scheduled', len(self._jobs))
+        return len(jobs)
+
+    def pending(self, kind=None, owner=None):
+        """
+        Trabajos pendientes ordenados por hora de disparo
+
+        Returns:
+            list: [(segundos restantes, ScheduledJob), ...]
+        """
+        now = time.monotonic()
+        with self._cond:
+            jobs = sorted(self._matching(kind, owner), key=lambda j: j.when)
+        return [(max(0.0, j.when - now), j) for j in jobs]
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+
+                if not self._running:
+                    return
+
+                _, _, job = heapq.heappop(self._heap)
+                if job.cancelled:
+                    continue
+                self._jobs.pop(job.id, None)
+
+            metrics.set_gauge('skills.scheduled', len(self._jobs))
+            try:
+                job.callback()
+            except Exception as e:
+                log.warning(f"⚠️ Error en {job.kind} '{job.label}': {e}")
+
+    def shutdown(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+
+# ==================== Habilidades ====================
+
+class Skill:
+    """
+    Habilidad local
+
+    Las subclases definen name, patterns (expresiones regulares sobre el
+    texto en minúsculas, con grupos con nombre) y handle(match).
+    """
+
+    name = 'skill'
+    patterns = ()
+
+    def handle(self, match):
+        """
+        Returns:
+            str or None: Respuesta hablada (None = no aplica, seguir buscando)
+        """
+        raise NotImplementedError
+
+
+class ArithmeticSkill(Skill):
+    """Operaciones básicas: "cuánto es 15 por 23", "el 20 por ciento de 80" """
+
+    name = 'arithmetic'
+
+    OPERATORS = {
+        'más': lambda a, b: a + b, 'mas': lambda a, b: a + b, '+': lambda a, b: a + b,
+        'menos': lambda a, b: a - b, '-': lambda a, b: a - b,
+        'por': lambda a, b: a * b, 'x': lambda a, b: a * b, '*': lambda a, b: a * b,
+        'multiplicado por': lambda a, b: a * b,
+        'entre': lambda a, b: a / b, 'dividido entre': lambda a, b: a / b,
+        'dividido por': lambda a, b: a / b, '/': lambda a, b: a / b
+    }
+
+    _ops = '|'.join(re.escape(op) for op in sorted(OPERATORS, key=len, reverse=True))
+
+    patterns = (
+        rf'(?P<pct>{NUM}) por ciento de (?P<base>{NUM})',
+        rf'(?:cuánto|cuanto) (?:es|son|da) (?P<a>{NUM}) (?P<op>{_ops}) (?P<b>{NUM})',
+        rf'(?:calcula|suma|multiplica) (?P<a2>{NUM}) (?P<op2>{_ops}|y) (?P<b2>{NUM})',
+        rf'raíz cuadrada de (?P<root>{NUM})'
+    )
+
+    def handle(self, match):
+        groups = match.groupdict()
+
+        if groups.get('pct'):
+            pct, base = parse_number(groups['pct']), parse_number(groups['base'])
+            return f"El {format_number(pct)} por ciento de {format_number(base)} es {format_number(base * pct / 100)}"
+
+        if groups.get('root'):
+            value = parse_number(groups['root'])
+            if value < 0:
+                return "No existe la raíz cuadrada real de un número negativo, señor"
+            return f"La raíz cuadrada de {format_number(value)} es {format_number(value ** 0.5)}"
+
+        if groups.get('a'):
+            a, op, b = groups['a'], groups['op'], groups['b']
+        else:
+            a, op, b = groups['a2'], groups['op2'], groups['b2']
+            if op == 'y':
+                # "suma 3 y 4" / "multiplica 3 y 4"
+                op = 'por' if match.group(0).startswith('multiplica') else 'más'
+
+        a, b = parse_number(a), parse_number(b)
+        try:
+            result = self.OPERATORS[op](a, b)
+        except ZeroDivisionError:
+            return "No se puede dividir entre cero, señor"
+        return f"{format_number(a)} {op} {format_number(b)} son {format_number(result)}"
+
+
+class ConversionSkill(Skill):
+    """Conversión de unidades: "convierte 10 millas a kilómetros" """
+
+    name = 'conversion'
+
+    # alias -> (magnitud, factor a la unidad base); la temperatura es afín
+    UNITS = {
+        'milímetros': ('length', 0.001), 'milimetros': ('length', 0.001),
+        'centímetros': ('length', 0.01), 'centimetros': ('length', 0.01),
+        'metros': ('length', 1.0), 'metro': ('length', 1.0),
+        'kilómetros': ('length', 1000.0), 'kilometros': ('length', 1000.0), 'kilómetro': ('length', 1000.0),
+        'pulgadas': ('length', 0.0254), 'pulgada': ('length', 0.0254),
+        'pies': ('length', 0.3048), 'pie': ('length', 0.3048),
+        'yardas': ('length', 0.9144),
+        'millas': ('length', 1609.344), 'milla': ('length', 1609.344),
+        'gramos': ('mass', 0.001), 'gramo': ('mass', 0.001),
+        'kilos': ('mass', 1.0), 'kilo': ('mass', 1.0), 'kilogramos': ('mass', 1.0), 'kilogramo': ('mass', 1.0),
+        'libras': ('mass', 0.45359237), 'libra': ('mass', 0.45359237),
+        'onzas': ('mass', 0.028349523125), 'onza': ('mass', 0.028349523125),
+        'mililitros': ('volume', 0.001), 'litros': ('volume', 1.0), 'litro': ('volume', 1.0),
+        'galones': ('volume', 3.785411784), 'galón': ('volume', 3.785411784),
+        'grados celsius': ('temperature', 'c'), 'grados centígrados': ('temperature', 'c'),
+        'celsius': ('temperature', 'c'), 'centígrados': ('temperature', 'c'),
+        'grados fahrenheit': ('temperature', 'f'), 'fahrenheit': ('temperature', 'f'),
+        'kelvin': ('temperature', 'k')
+    }
+
+    _units = '|'.join(re.escape(u) for u in sorted(UNITS, key=len, reverse=True))
+
+    patterns = (
+        rf'(?P<value>{NUM}) (?P<src>{_units}) (?:a|en) (?P<dst>{_units})\b',
+        rf'(?:cuántos|cuantos|cuántas|cuantas) (?P<dst2>{_units}) (?:son|hay en|tiene|equivalen a) (?P<value2>{NUM}) (?P<src2>{_units})\b'
+    )
+
+    @staticmethod
+    def _to_celsius(value, unit):
+        if unit == 'c':
+            return value
+        if unit == 'f':
+            return (value - 32) * 5 / 9
+        return value - 273.15
+
+    @staticmethod
+    def _from_celsius(value, unit):
+        if unit == 'c':
+            return value
+        if unit == 'f':
+            return value * 9 / 5 + 32
+        return value + 273.15
+
+    def handle(self, match):
+        groups = match.groupdict()
+        if groups.get('value'):
+            value, src, dst = groups['value'], groups['src'], groups['dst']
+        else:
+            value, src, dst = groups['value2'], groups['src2'], groups['dst2']
+
+        value = parse_number(value)
+        src_kind, src_factor = self.UNITS[src]
+        dst_kind, dst_factor = self.UNITS[dst]
+
+        if src_kind != dst_kind:
+            return f"No puedo convertir {src} a {dst}, señor"
+
+        if src_kind == 'temperature':
+            result = self._from_celsius(self._to_celsius(value, src_factor), dst_factor)
+        else:
+            result = value * src_factor / dst_factor
+
+        return f"{format_number(value)} {src} son {format_number(result)} {dst}"
+
+
+class TimerSkill(Skill):
+    """Temporizadores: "pon un temporizador de 5 minutos" """
+
+    name = 'timer'
+
+    UNIT_SECONDS = {'segundo': 1, 'segundos': 1, 'minuto': 60, 'minutos': 60, 'hora': 3600, 'horas': 3600}
+
+    patterns = (
+        r'(?:cancela|quita|borra|para|detén|elimina)(?: el| los| todos los)? (?P<cancel>temporizador(?:es)?)',
+        r'(?P<remaining>(?:cuánto|cuanto) (?:tiempo )?(?:le )?(?:queda|falta)).*temporizador',
+        rf'(?:pon|ponme|crea|programa|activa|inicia)(?: un)? (?:temporizador|cuenta atrás)(?: de| para)? '
+        rf'(?P<amount>{NUM}) (?P<unit>segundos?|minutos?|horas?)(?: y (?P<half>media|medio))?',
+        rf'avísame (?:en|dentro de) (?P<amount2>{NUM}) (?P<unit2>segundos?|minutos?|horas?)'
+    )
+
+    def __init__(self, scheduler, notify, owner=None):
+        self.scheduler = scheduler
+        self.notify = notify
+        # Con un planificador compartido entre salas, cada una ve solo lo suyo
+        self.owner = owner
+
+    def handle(self, match):
+        groups = match.groupdict()
+
+        if groups.get('cancel'):
+            count = self.scheduler.cancel('timer', owner=self.owner)
+            if not count:
+                return "No hay ningún temporizador activo, señor"
+            return "Temporizador cancelado" if count == 1 else f"{count} temporizadores cancelados"
+
+        if groups.get('remaining'):
+            pending = self.scheduler.pending('timer', owner=self.owner)
+            if not pending:
+                return "No hay ningún temporizador activo, señor"
+            remaining, job = pending[0]
+            left = describe_duration(remaining)
+            verb = 'Queda' if left.startswith('1 ') and ' y ' not in left else 'Quedan'
+            return f"{verb} {left} del temporizador de {job.label}"
+
+        amount = groups.get('amount') or groups.get('amount2')
+        unit = groups.get('unit') or groups.get('unit2')
+        seconds = parse_number(amount) * self.UNIT_SECONDS[unit]
+        if groups.get('half'):
+            seconds += self.UNIT_SECONDS[unit] / 2
+        if seconds <= 0:
+            return None
+        seconds = max(1.0, seconds)
+
+        label = describe_duration(seconds)
+        self.scheduler.schedule(
+            seconds,
+            lambda: self.notify(f"Señor, el temporizador de {label} ha terminado"),
+            kind='timer',
+            label=label,
+            owner=self.owner
+        )
+        return f"Temporizador de {label} en marcha"
+
+
+class AlarmSkill(Skill):
+    """Alarmas a una hora: "pon una alarma a las 7 y media" """
+
+    name = 'alarm'
+
+    patterns = (
+        r'(?:cancela|quita|borra|elimina)(?: la| las| todas las)? (?P<cancel>alarmas?)',
+        rf'(?:(?:pon|ponme|programa|activa|crea)(?: una)? alarma|despiértame) (?:a|para) las? '
+        rf'(?P<hour>{NUM})(?:(?::| y )(?P<minute>\d{{1,2}}|media|cuarto))?'
+        rf'(?: de la (?P<period>mañana|tarde|noche))?'
+    )
+
+    def __init__(self, scheduler, notify, owner=None):
+        self.scheduler = scheduler
+        self.notify = notify
+        # Con un planificador compartido entre salas, cada una ve solo lo suyo
+        self.owner = owner
+
+    def handle(self, match):
+        groups = match.groupdict()
+
+        if groups.get('cancel'):
+            count = self.scheduler.cancel('alarm', owner=self.owner)
+            if not count:
+                return "No hay ninguna alarma programada, señor"
+            return "Alarma cancelada" if count == 1 else f"{count} alarmas canceladas"
+
+        hour = int(parse_number(groups['hour']))
+        minute = groups.get('minute') or '0'
+        minute = {'media': 30, 'cuarto': 15}.get(minute) or int(minute)
+        if groups.get('period') in ('tarde', 'noche') and hour < 12:
+            hour += 12
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            return None
+
+        now = datetime.now()
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+
+        label = f"{hour}:{minute:02d}"
+        self.scheduler.schedule(
+            (target - now).total_seconds(),
+            lambda: self.notify(f"Señor, son las {label}. Su alarma"),
+            kind='alarm',
+            label=label,
+            owner=self.owner
+        )
+        day = "mañana" if target.date() != now.date() else "hoy"
+        return f"Alarma programada para {day} a las {label}"
+
+
+# ==================== Registro ====================
+
+_NAMED_GROUP = re.compile(r'\(\?P<\w+>')
+
+
+class SkillRegistry:
+    """Registro de habilidades compilado en un único despachador"""
+
+    def __init__(self):
+        self.skills = []
+        self._patterns = []
+        self._dispatcher = None
+
+    def register(self, skill):
+        self.skills.append(skill)
+        for pattern in skill.patterns:
+            self._patterns.append((skill, re.compile(pattern)))
+        self._dispatcher = None
+        return skill
+
+    def _compile(self):
+        """Une todos los patrones en una alternancia con un grupo por patrón"""
+        alternatives = [
+            f'(?P<_{i}>{_NAMED_GROUP.sub("(?:", compiled.pattern)})'
+            for i, (_, compiled) in enumerate(self._patterns)
+        ]
+        self._dispatcher = re.compile('|'.join(alternatives))
+
+    def dispatch(self, text):
+        """
+        Resuelve la frase con una habilidad local si alguna la reconoce
+
+        Args:
+            text: Texto transcrito del usuario
+
+        Returns:
+            str or None: Respuesta, o None si hay que buscar fuera
+        """
+        if not self._patterns:
+            return None
+        if self._dispatcher is None:
+            self._compile()
+
+        normalized = re.sub(r'[¿?¡!]', '', text.lower()).strip().rstrip('.')
+        match = self._dispatcher.search(normalized)
+        if not match:
+            return None
+
+        # Volver a aplicar el patrón ganador para recuperar sus grupos con nombre
+        skill, compiled = self._patterns[int(match.lastgroup[1:])]
+        response = skill.handle(compiled.search(normalized, match.start()))
+        if response:
+            metrics.inc(f'skills.{skill.name}')
+        return response
+
+
+def build_registry(notify, scheduler=None, owner=None):
+    """
+    Registro con las habilidades incluidas
+
+    Args:
+        notify: Función que recibe el texto a anunciar al vencer un temporizador
+        scheduler: Planificador a usar (por defecto uno nuevo)
+        owner: Dueño de los temporizadores y alarmas si el planificador se comparte
+
+    Returns:
+        tuple: (SkillRegistry, Scheduler)
+    """
+    scheduler = scheduler or Scheduler()
+    registry = SkillRegistry()
+    registry.register(TimerSkill(scheduler, notify, owner))
+    registry.register(AlarmSkill(scheduler, notify, owner))
+    registry.register(ConversionSkill())
+    registry.register(ArithmeticSkill())
+    return registry, scheduler
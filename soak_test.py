@@ -0,0 +1,832 @@
+"""
+Prueba de resistencia (soak test) con miles de turnos simulados
+
+Jarvis tiene que aguantar semanas encendido, pero cada turno abre y cierra
+streams de PyAudio, lanza hilos (interrupción, avisos, llamadas a la nube),
+escribe archivos temporales y llena cachés. Este script ejecuta el
+asistente real (máquina de estados, captura con VAD, transcripción,
+intenciones, motor de respuestas, TTS, habilidades, registro de turnos)
+sustituyendo solo el micrófono, Porcupine, el altavoz y los servicios en la
+nube por simulaciones, y cada cierto número de turnos mide:
+
+- memoria residente (RSS)
+- descriptores de archivo abiertos
+- hilos vivos
+- streams de micrófono abiertos
+- archivos en el directorio temporal y audios sueltos en el de trabajo
+- latencia por turno
+
+Los turnos mezclan preguntas, seguimientos, interrupciones, comandos
+locales, temporizadores, saludos, silencios, audio ininteligible y fallos
+simulados de los servicios, para pasar también por los caminos de error.
+Tras un calentamiento (cachés y pools llenándose), la prueba falla si
+alguna medida crece más de lo permitido entre el principio y el final.
+
+El audio simulado avanza más rápido que el tiempo real (--speed); los
+tiempos de captura cuentan audio leído, así que el diálogo es el mismo.
+
+Uso:
+    python soak_test.py                          # 2000 turnos
+    python soak_test.py --turns 500 --speed 0    # sin esperas entre frames
+    python soak_test.py --device-rate 48000 --device-channels 2 --tracemalloc
+"""
+
+import argparse
+import contextlib
+import gc
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from config import Config
+
+
+log = logging.getLogger('jarvis')
+
+# Crecimiento permitido tras el calentamiento (último tramo - primer tramo)
+LIMITS = {
+    'rss_mb': 16.0,
+    'fds': 4,
+    'threads': 4,
+    'streams': 0,
+    'temp_files': 2
+}
+LATENCY_MAX_RATIO = 1.5     # Mediana del último tramo / mediana del primero
+LATENCY_SLACK_MS = 25.0     # Margen absoluto para turnos muy rápidos
+EDGE_SAMPLES = 3            # Muestras que se promedian en cada extremo
+
+QUESTIONS = [
+    'qué es la fotosíntesis', 'quién escribió el quijote', 'cuál es la capital de australia',
+    'cómo funciona un motor eléctrico', 'qué tiempo hace en madrid', 'quién ganó el mundial de 2010',
+    'cuándo se construyó la alhambra', 'qué distancia hay a la luna', 'cómo se hace una tortilla',
+    'qué es un agujero negro', 'dime algo sobre los pingüinos', 'cuántos habitantes tiene japón',
+    'por qué el cielo es azul', 'quién pintó las meninas', 'qué significa la palabra soslayo',
+    'cuéntame un dato curioso', 'qué es la inflación', 'dónde nació picasso',
+    'cómo se dice gracias en japonés', 'qué es un número primo'
+]
+LOCAL = ['qué hora es', 'qué día es hoy', 'cuánto es 15 por 23', 'cuánto son 7 más 8']
+TIMERS = ['pon un temporizador de 1 segundo', 'pon un temporizador de 2 segundos']
+NAMES = ['ana', 'luis', 'marta']
+
+# (tipo, peso)
+TURN_MIX = [
+    ('question', 30), ('follow_up', 12), ('barge_in', 10), ('local', 8), ('timer', 4),
+    ('greeting', 6), ('unintelligible', 6), ('silence', 5), ('stop', 4),
+    ('register', 3), ('identity', 3)
+]
+
+MP3_FRAME = b'\xff\xfb\x90\xc0' + bytes(413)  # MPEG-1 capa III 128 kbps 44,1 kHz, silencio
+MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def _pace(seconds, speed):
+    """Espera el equivalente en tiempo simulado (speed 0 = sin esperas)"""
+    if speed and seconds > 0:
+        time.sleep(seconds / speed)
+
+
+def _silent_wav(seconds, sample_rate):
+    """WAV de silencio como el que devuelve Google TTS en LINEAR16"""
+    import io
+    import wave
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(bytes(2 * int(seconds * sample_rate)))
+    return buffer.getvalue()
+
+
+# ==================== Sala simulada ====================
+
+class TurnPlan:
+    """Lo que dirá el usuario en un turno"""
+
+    def __init__(self, kind, utterances, barge_in=False):
+        self.kind = kind
+        self.utterances = deque(utterances)  # Texto, '' (ininteligible) o None (silencio)
+        self.barge_in = barge_in
+        self.barge_frames = 0
+
+
+class SimulatedRoom:
+    """
+    Audio de la sala como función del tiempo: ruido de fondo y, cuando el
+    usuario habla, una voz sintética (armónicos con modulación silábica).
+    Decide también cuándo se dice el wake word.
+    """
+
+    def __init__(self, seed=0, speaking=None):
+        """
+        Args:
+            seed: Semilla del guion y del ruido
+            speaking: Función que indica si el asistente está hablando
+        """
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+        self.speaking = speaking or (lambda: False)
+        self.clock = 0.0
+        self.voice_until = 0.0
+        self.voice_from = 0.0
+        self.last_text = None
+        self.plan = None
+        self.turns = 0
+        self.idle_frames = 0
+        self._lock = threading.Lock()
+
+    def _next_plan(self):
+        kinds, weights = zip(*TURN_MIX)
+        kind = self.random.choices(kinds, weights)[0]
+        question = lambda: self.random.choice(QUESTIONS)
+
+        if kind == 'question':
+            return TurnPlan(kind, [question()])
+        if kind == 'follow_up':
+            return TurnPlan(kind, [question(), question()])
+        if kind == 'barge_in':
+            return TurnPlan(kind, [question(), question()], barge_in=True)
+        if kind == 'local':
+            return TurnPlan(kind, [self.random.choice(LOCAL)])
+        if kind == 'timer':
+            return TurnPlan(kind, [self.random.choice(TIMERS)])
+        if kind == 'greeting':
+            return TurnPlan(kind, ['hola', question()])
+        if kind == 'unintelligible':
+            return TurnPlan(kind, ['', question()])
+        if kind == 'silence':
+            return TurnPlan(kind, [None])
+        if kind == 'stop':
+            return TurnPlan(kind, ['para'])
+        if kind == 'register':
+            return TurnPlan(kind, [f"me llamo {self.random.choice(NAMES)}"])
+        return TurnPlan(kind, ['cómo me llamo'])
+
+    def _say(self, text):
+        """Programa la siguiente frase del usuario a partir del instante actual"""
+        self.last_text = text
+        if text is None:
+            return
+        duration = min(3.0, 0.6 + 0.04 * len(text or 'mmm mmm mmm'))
+        self.voice_from = self.clock + 0.2
+        self.voice_until = self.voice_from + duration
+
+    def next_utterance(self):
+        """El asistente empieza a escuchar una pregunta: el usuario habla si le queda algo"""
+        with self._lock:
+            if self.plan and self.plan.utterances:
+                self._say(self.plan.utterances.popleft())
+
+    def wake_due(self):
+        """Porcupine procesa un frame: ¿se dice ahora el wake word?"""
+        with self._lock:
+            if self.speaking():
+                plan = self.plan
+                if plan and plan.barge_in:
+                    plan.barge_frames += 1
+                    if plan.barge_frames == 8:
+                        return True
+                return False
+
+            if self.idle_frames > 0:
+                self.idle_frames -= 1
+                return False
+
+            # Turno nuevo: lo que sobre del anterior ya no se dice
+            self.turns += 1
+            self.plan = self._next_plan()
+            self.idle_frames = self.random.randint(5, 40)
+            self._say(self.plan.utterances.popleft())
+            return True
+
+    def render(self, frames, rate, channels=1):
+        """
+        Siguientes frames de audio de la sala
+
+        Returns:
+            bytes: PCM int16 intercalado
+        """
+        with self._lock:
+            t = self.clock + np.arange(frames) / rate
+            self.clock += frames / rate
+
+        audio = self.rng.normal(0, 60, frames)
+        voiced = (t >= self.voice_from) & (t < self.voice_until)
+        if voiced.any():
+            tv = t[voiced]
+            f0 = 140.0
+            voice = sum(np.sin(2 * np.pi * k * f0 * tv) / k for k in range(1, 7))
+            envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * tv)
+            audio[voiced] += 5000 * voice * envelope
+
+        pcm = np.clip(audio, -32768, 32767).astype(np.int16)
+        if channels > 1:
+            pcm = np.repeat(pcm, channels)
+        return pcm.tobytes()
+
+
+# ==================== Dispositivos simulados ====================
+
+class SimulatedPorcupine:
+    sample_rate = 16000
+    frame_length = 512
+
+    def __init__(self, room):
+        self.room = room
+
+    def process(self, pcm):
+        return 0 if self.room.wake_due() else -1
+
+    def delete(self):
+        pass
+
+
+class SimulatedStream:
+    """Stream de entrada que lee de la sala al ritmo simulado"""
+
+    def __init__(self, pa, rate, channels):
+        self.pa = pa
+        self.rate = rate
+        self.channels = channels
+        self.closed = False
+
+    def read(self, frames, exception_on_overflow=True):
+        _pace(frames / self.rate, self.pa.speed)
+        return self.pa.room.render(frames, self.rate, self.channels)
+
+    def get_read_available(self):
+        return 0
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.pa.open_streams -= 1
+
+
+class SimulatedPyAudio:
+    """PyAudio con un único micrófono en el formato indicado"""
+
+    def __init__(self, room, speed, rate=16000, channels=1):
+        self.room = room
+        self.speed = speed
+        self.rate = rate
+        self.channels = channels
+        self.open_streams = 0
+
+    def get_default_input_device_info(self):
+        return {'index': 0, 'defaultSampleRate': float(self.rate), 'maxInputChannels': self.channels}
+
+    def is_format_supported(self, rate, input_device=None, input_channels=1, input_format=None):
+        if (rate, input_channels) != (self.rate, self.channels):
+            raise ValueError("Formato no soportado")
+        return True
+
+    def open(self, rate, channels, format, input=True, frames_per_buffer=None):
+        self.open_streams += 1
+        return SimulatedStream(self, rate, channels)
+
+    def terminate(self):
+        pass
+
+
+class SimulatedMusic:
+    """pygame.mixer.music: 'reproduce' el archivo durante lo que dura su audio"""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.duration = 0.0
+        self.end = None
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] == b'RIFF':
+            self.duration = (len(data) - 44) / (2 * 22050)
+        else:
+            self.duration = len(data) / len(MP3_FRAME) * MP3_FRAME_SECONDS
+
+    def play(self):
+        self.end = time.perf_counter() + (self.duration / self.speed if self.speed else 0.0)
+
+    def get_busy(self):
+        return self.end is not None and time.perf_counter() < self.end
+
+    def stop(self):
+        self.end = None
+
+    def unload(self):
+        self.end = None
+
+
+class SimulatedSound:
+    """pygame.mixer.Sound de un WAV: solo importa su duración"""
+
+    def __init__(self, file, speed):
+        import wave
+
+        with wave.open(file, 'rb') as wf:
+            self.duration = wf.getnframes() / wf.getframerate()
+        self.speed = speed
+
+    def get_length(self):
+        return self.duration / self.speed if self.speed else 0.0
+
+
+class SimulatedChannel:
+    """pygame.mixer.Channel: un sonido sonando y otro en cola"""
+
+    def __init__(self):
+        self.end = None
+        self.queued = None
+
+    def _advance(self):
+        now = time.perf_counter()
+        if self.end is not None and now >= self.end and self.queued is not None:
+            self.end += self.queued.get_length()
+            self.queued = None
+
+    def play(self, sound):
+        self.end = time.perf_counter() + sound.get_length()
+        self.queued = None
+
+    def queue(self, sound):
+        if self.get_busy():
+            self.queued = sound
+        else:
+            self.play(sound)
+
+    def get_queue(self):
+        self._advance()
+        return self.queued
+
+    def get_busy(self):
+        self._advance()
+        return self.end is not None and time.perf_counter() < self.end
+
+    def stop(self):
+        self.end = None
+        self.queued = None
+
+
+class SimulatedPygame:
+    """Lo que usa jarvis.py de pygame, sin tarjeta de sonido"""
+
+    def __init__(self, speed):
+        speaker = SimulatedMusic(speed)
+        channel = SimulatedChannel()
+
+        class Clock:
+            def tick(self, fps):
+                _pace(1 / fps, speed)
+
+        class Mixer:
+            music = speaker
+
+            def init(self):
+                pass
+
+            def Sound(self, file):
+                return SimulatedSound(file, speed)
+
+            def find_channel(self, force=False):
+                return channel
+
+            def quit(self):
+                pass
+
+        class Time:
+            pass
+
+        self.mixer = Mixer()
+        self.time = Time()
+        self.time.Clock = Clock
+
+
+# ==================== Servicios simulados ====================
+
+class SimulatedTranscriber:
+    """Backend de transcripción: devuelve lo que dijo la sala"""
+
+    name = 'google'
+
+    def __init__(self, room, latency, fault_rate, seed):
+        self.room = room
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+
+    def is_ready(self):
+        return True
+
+    def transcribe(self, audio_file):
+        from transcribers import TranscriptionResult
+
+        with open(audio_file, 'rb') as f:
+            f.read()
+        time.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        if self.random.random() < self.fault_rate:
+            raise IOError("fallo simulado de la red")
+
+        text = self.room.last_text
+        return TranscriptionResult([(text, 0.9)] if text else [], self.name)
+
+
+class SimulatedAnswerBackend:
+    """Backend de respuestas con latencia, cancelación y fallos"""
+
+    name = 'perplexity'
+
+    def __init__(self, latency, fault_rate, seed):
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+        self.count = 0
+
+    def ask(self, query, call, timeout=None, history=None):
+        from answer_engine import AnswerError
+
+        deadline = time.perf_counter() + self.latency * self.random.uniform(0.5, 2.0)
+        while time.perf_counter() < deadline:
+            if call.cancelled:
+                raise AnswerError("cancelada")
+            time.sleep(0.005)
+        if self.random.random() < self.fault_rate:
+            raise AnswerError("fallo simulado del proveedor")
+
+        self.count += 1
+        sentences = [f"Esta es la frase {i + 1} de la respuesta sobre {query}." for i in range(self.random.randint(1, 4))]
+        return ' '.join(sentences), [f"https://example.org/{self.count}"]
+
+
+class SimulatedTTSClient:
+    """Cliente de Google TTS que devuelve MP3 (o WAV) de silencio de la duración del texto"""
+
+    def __init__(self, latency, fault_rate, seed):
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+
+    def synthesize_speech(self, request=None, timeout=None):
+        time.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        if self.random.random() < self.fault_rate:
+            raise IOError("fallo simulado de TTS")
+
+        from google.cloud import texttospeech
+
+        seconds = 0.06 * len(request.input.text)
+        response = type('SynthesizeSpeechResponse', (), {})()
+        if request.audio_config.audio_encoding == texttospeech.AudioEncoding.LINEAR16:
+            response.audio_content = _silent_wav(seconds, request.audio_config.sample_rate_hertz)
+        else:
+            response.audio_content = MP3_FRAME * max(1, int(seconds / MP3_FRAME_SECONDS))
+        return response
+
+
+# ==================== Asistente con dispositivos simulados ====================
+
+def _soak_assistant_class():
+    """JarvisAssistant con micrófono, altavoz y nube simulados (import diferido)"""
+    from google.cloud import texttospeech
+
+    import jarvis
+    from answer_engine import AnswerEngine
+    from conversation import ConversationHistory
+    from knowledge_base import KnowledgeBase
+    from transcribers import TranscriptionPolicy
+    from tts import TTSEngine
+    from tts_cache import TTSDiskCache
+    from upload_payload import PayloadTracker
+    from vad_stage import VadStage
+
+    class SoakAssistant(jarvis.JarvisAssistant):
+
+        def __init__(self, room, options):
+            self.room = room
+            self.options = options
+            self.latencies = []
+            super().__init__()
+
+        def _init_wake_word(self):
+            self.frontend = None
+            self.wake_gate = None
+            self.porcupine = SimulatedPorcupine(self.room)
+            self.wake_sample_rate = self.porcupine.sample_rate
+            self.wake_verifier = None
+            self.last_wake_audio = None
+
+        def _init_stt(self):
+            self.payload_tracker = PayloadTracker()
+            self.stt_policy = TranscriptionPolicy([
+                SimulatedTranscriber(self.room, 0.04, self.options.fault_rate, self.options.seed)
+            ])
+            self.command_spotter = None
+
+        def _init_llm(self):
+            self.model = None
+
+        def _init_answer_engine(self):
+            self.answer_engine = AnswerEngine(
+                SimulatedAnswerBackend(0.06, self.options.fault_rate, self.options.seed)
+            )
+            self.conversation = ConversationHistory()
+            self.knowledge = KnowledgeBase() if Config.KNOWLEDGE_ENABLED else None
+
+        def _init_tts(self):
+            voice = texttospeech.VoiceSelectionParams(language_code=Config.LANGUAGE, name=Config.VOICE_NAME)
+            audio_config = texttospeech.AudioConfig(
+                audio_encoding=texttospeech.AudioEncoding.MP3,
+                speaking_rate=Config.TTS_SPEAKING_RATE,
+                pitch=Config.TTS_PITCH
+            )
+            disk_cache = TTSDiskCache() if Config.TTS_DISK_CACHE_ENABLED else None
+            self.tts = TTSEngine(
+                SimulatedTTSClient(0.02, self.options.fault_rate, self.options.seed),
+                voice,
+                audio_config,
+                disk_cache
+            )
+            self.tts.warm_up(Config.TTS_WARM_PHRASES)
+            self.stream_tts = TTSEngine(
+                self.tts.client,
+                voice,
+                texttospeech.AudioConfig(
+                    audio_encoding=texttospeech.AudioEncoding.LINEAR16,
+                    sample_rate_hertz=Config.TTS_STREAM_SAMPLE_RATE,
+                    speaking_rate=Config.TTS_SPEAKING_RATE,
+                    pitch=Config.TTS_PITCH
+                ),
+                disk_cache,
+                phrase_cache_size=0
+            )
+
+        def _init_audio(self):
+            self.pa = SimulatedPyAudio(
+                self.room, self.options.speed, self.options.device_rate, self.options.device_channels
+            )
+            self.vad = VadStage()
+
+        def capture_question(self, start_timeout=None):
+            self.room.next_utterance()
+            return super().capture_question(start_timeout)
+
+        def log_turn(self, record):
+            self.latencies.append(record['total_ms'])
+            super().log_turn(record)
+
+    return SoakAssistant
+
+
+def _configure(workdir):
+    """Credenciales ficticias y todos los archivos persistentes dentro de workdir"""
+    credentials = os.path.join(workdir, 'credentials.json')
+    with open(credentials, 'w') as f:
+        f.write('{}')
+
+    Config.PICOVOICE_KEY = Config.PICOVOICE_KEY or 'soak'
+    Config.GOOGLE_API_KEY = Config.GOOGLE_API_KEY or 'soak'
+    Config.PERPLEXITY_KEY = Config.PERPLEXITY_KEY or 'soak'
+    Config.GOOGLE_CREDENTIALS = credentials
+
+    Config.AUDIO_FRONTEND_ENABLED = False
+    Config.WAKE_VERIFY_ENABLED = False
+    Config.LOCAL_COMMANDS_ENABLED = False
+    Config.LOCAL_ASR_ENABLED = False
+    Config.HEDGE_ENABLED = False
+    Config.AUDIO_DEVICE_RATE = 0
+    Config.AUDIO_DEVICE_CHANNELS = 0
+
+    Config.KNOWLEDGE_DB_FILE = os.path.join(workdir, 'knowledge.db')
+    Config.PREFETCH_LOG_FILE = os.path.join(workdir, 'query_log.db')
+    Config.TURN_LOG_FILE = os.path.join(workdir, 'logs', 'turns.jsonl')
+    Config.WAKE_VERIFY_FILE = os.path.join(workdir, 'wake_templates.json')
+    Config.LOCAL_COMMANDS_FILE = os.path.join(workdir, 'command_templates.json')
+    Config.CONTROL_SOCKET = os.path.join(workdir, 'jarvis.sock')
+    Config.PROFILE_DIR = os.path.join(workdir, 'profiles')
+    Config.FLIGHT_RECORDER_FILE = os.path.join(workdir, 'flight_recorder.bin')
+    Config.FLIGHT_RECORDER_DUMP_DIR = os.path.join(workdir, 'flight')
+    Config.TTS_DISK_CACHE_DIR = os.path.join(workdir, 'tts_cache')
+
+    # NamedTemporaryFile y compañía escriben aquí: así se pueden contar
+    temp_dir = os.path.join(workdir, 'tmp')
+    os.makedirs(temp_dir, exist_ok=True)
+    tempfile.tempdir = temp_dir
+    return temp_dir
+
+
+# ==================== Medidas ====================
+
+def _rss_mb():
+    """Memoria residente actual (pico si no hay /proc)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _open_fds():
+    for path in ('/proc/self/fd', '/dev/fd'):
+        if os.path.isdir(path):
+            return len(os.listdir(path))
+    return 0
+
+
+def _temp_files(temp_dir, workdir):
+    """Archivos en el directorio temporal más audios sueltos en el de trabajo"""
+    count = sum(len(files) for _, _, files in os.walk(temp_dir))
+    count += sum(1 for name in os.listdir(workdir) if name.endswith(('.mp3', '.wav')))
+    return count
+
+
+def sample(turn, assistant, temp_dir, workdir):
+    gc.collect()
+    window = assistant.latencies[-50:] or [0.0]
+    return {
+        'turn': turn,
+        'rss_mb': _rss_mb(),
+        'fds': _open_fds(),
+        'threads': threading.active_count(),
+        'streams': assistant.pa.open_streams,
+        'temp_files': _temp_files(temp_dir, workdir),
+        'latency_ms': float(np.median(window))
+    }
+
+
+def evaluate(samples, latencies, warmup_turns):
+    """
+    Compara el principio y el final de la prueba tras el calentamiento
+
+    Returns:
+        list: [(métrica, inicio, final, crecimiento, pendiente por 1000 turnos, ok, límite)]
+    """
+    steady = [s for s in samples if s['turn'] > warmup_turns]
+    if len(steady) < 2 * EDGE_SAMPLES:
+        steady = samples
+    turns = np.array([s['turn'] for s in steady], dtype=float)
+
+    results = []
+    for name, limit in LIMITS.items():
+        values = np.array([s[name] for s in steady], dtype=float)
+        start = values[:EDGE_SAMPLES].mean()
+        end = values[-EDGE_SAMPLES:].mean()
+        slope = np.polyfit(turns, values, 1)[0] * 1000 if len(set(turns)) > 1 else 0.0
+        results.append((name, start, end, end - start, slope, end - start <= limit, f"+{limit:g}"))
+
+    # Latencia: medianas del primer y último cuarto de los turnos tras el calentamiento
+    skip = min(len(latencies) // 2, int(len(latencies) * warmup_turns / max(1, samples[-1]['turn'])))
+    steady_latencies = latencies[skip:]
+    quarter = max(1, len(steady_latencies) // 4)
+    start = float(np.median(steady_latencies[:quarter]))
+    end = float(np.median(steady_latencies[-quarter:]))
+    ok = end <= start * LATENCY_MAX_RATIO + LATENCY_SLACK_MS
+    results.append(('latency_ms', start, end, end - start, 0.0, ok, f"x{LATENCY_MAX_RATIO:g}"))
+    return results
+
+
+def _tracemalloc_report(before, after, out):
+    print("🔎 Mayores crecimientos de memoria (tracemalloc):", file=out)
+    for stat in after.compare_to(before, 'lineno')[:10]:
+        print(f"  {stat}", file=out)
+
+
+# ==================== Bucle principal ====================
+
+def soak(options):
+    """
+    Ejecuta la prueba
+
+    Returns:
+        bool: True si ninguna medida crece sin límite
+    """
+    out = sys.__stdout__
+    workdir = options.workdir or tempfile.mkdtemp(prefix='jarvis-soak-')
+    os.makedirs(workdir, exist_ok=True)
+    previous_cwd = os.getcwd()
+    temp_dir = _configure(workdir)
+    # speak() y la confirmación escriben sus MP3 en el directorio actual
+    os.chdir(workdir)
+
+    import jarvis
+    from dialog import DialogStateMachine
+
+    jarvis.pygame = SimulatedPygame(options.speed)
+    if options.tracemalloc:
+        import tracemalloc
+        tracemalloc.start(10)
+
+    print(f"🧪 Soak test: {options.turns} turnos, velocidad x{options.speed or '∞'}, "
+          f"micrófono {options.device_rate} Hz x{options.device_channels}, fallos {options.fault_rate:.0%}", file=out)
+    print(f"📁 Directorio de trabajo: {workdir}", file=out)
+
+    console = open(os.path.join(workdir, 'console.log'), 'w', encoding='utf-8')
+    handler = logging.StreamHandler(console)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+    warmup_turns = int(options.turns * options.warmup)
+    samples = []
+    snapshot = None
+    start = time.perf_counter()
+
+    redirect = contextlib.nullcontext() if options.verbose else contextlib.redirect_stdout(console)
+    with redirect:
+        room = SimulatedRoom(options.seed)
+        assistant = _soak_assistant_class()(room, options)
+        room.speaking = lambda: assistant.is_speaking
+        machine = DialogStateMachine(assistant)
+
+        try:
+            while not (machine.state == 'wait_wake' and room.turns >= options.turns):
+                state = machine.step()
+                if state == 'shutdown':
+                    print("❌ El diálogo se detuvo antes de terminar", file=out)
+                    break
+                if state != 'wait_wake' or room.turns % options.sample_every:
+                    continue
+                if samples and samples[-1]['turn'] == room.turns:
+                    continue
+
+                samples.append(sample(room.turns, assistant, temp_dir, workdir))
+                if options.tracemalloc and snapshot is None and room.turns >= warmup_turns:
+                    snapshot = tracemalloc.take_snapshot()
+
+                s = samples[-1]
+                rate = room.turns / (time.perf_counter() - start)
+                print(f"📈 Turno {s['turn']}/{options.turns}: RSS {s['rss_mb']:.1f} MB, {s['fds']} fds, "
+                      f"{s['threads']} hilos, {s['streams']} streams, {s['temp_files']} temporales, "
+                      f"p50 {s['latency_ms']:.0f} ms ({rate:.1f} turnos/s)", file=out)
+        finally:
+            assistant.cleanup()
+
+    log.removeHandler(handler)
+    console.close()
+    os.chdir(previous_cwd)
+
+    if len(samples) < 2:
+        print("❌ Muy pocas muestras: aumenta --turns o reduce --sample-every", file=out)
+        return False
+
+    results = evaluate(samples, assistant.latencies, warmup_turns)
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 Resultado tras {room.turns} turnos en {elapsed:.0f} s (calentamiento: {warmup_turns} turnos)", file=out)
+    for name, first, last, growth, slope, ok, limit in results:
+        trend = f", {slope:+.2f}/1000 turnos" if abs(slope) >= 0.005 else ""
+        print(f"  {'✅' if ok else '❌'} {name:11s} {first:9.1f} -> {last:9.1f} "
+              f"({growth:+.1f}, límite {limit}{trend})", file=out)
+
+    if options.csv:
+        with open(options.csv, 'w', encoding='utf-8') as f:
+            f.write(','.join(samples[0]) + '\n')
+            for s in samples:
+                f.write(','.join(f"{v:.3f}" if isinstance(v, float) else str(v) for v in s.values()) + '\n')
+        print(f"💾 Muestras guardadas en {options.csv}", file=out)
+
+    passed = all(result[5] for result in results)
+    if options.tracemalloc and snapshot is not None and not passed:
+        _tracemalloc_report(snapshot, tracemalloc.take_snapshot(), out)
+
+    if passed and not options.workdir and not options.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    else:
+        print(f"📁 Archivos de la prueba en {workdir}", file=out)
+
+    print("✅ Sin crecimientos sostenidos" if passed else "❌ Hay recursos que crecen sin límite", file=out)
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test de Jarvis con audio y servicios simulados")
+    parser.add_argument('--turns', type=int, default=2000)
+    parser.add_argument('--speed', type=float, default=50.0, help="Audio simulado por segundo real (0 = sin esperas)")
+    parser.add_argument('--sample-every', type=int, default=50, help="Turnos entre medidas")
+    parser.add_argument('--warmup', type=float, default=0.2, help="Fracción inicial que no se evalúa")
+    parser.add_argument('--fault-rate', type=float, default=0.02, help="Probabilidad de fallo de cada llamada simulada")
+    parser.add_argument('--device-rate', type=int, default=16000)
+    parser.add_argument('--device-channels', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default=None, help="Directorio de trabajo (por defecto uno temporal)")
+    parser.add_argument('--keep', action='store_true', help="Conservar el directorio de trabajo")
+    parser.add_argument('--csv', default=None, help="Guardar las muestras en CSV")
+    parser.add_argument('--tracemalloc', action='store_true', help="Mostrar dónde crece la memoria si falla")
+    parser.add_argument('--verbose', action='store_true', help="Mostrar la salida del asistente")
+    options = parser.parse_args()
+
+    sys.exit(0 if soak(options) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Los módulos de Jarvis están en la raíz del repositorio"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,124 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from answer_engine import AnswerEngine, AnswerError, PerplexityBackend, _stub_server
+from cancellation import CancelToken, Cancelled
+from config import Config
+from metrics import metrics
+
+
+# Los endpoints de resiliencia son globales: cada prueba usa nombres propios
+_ids = itertools.count()
+
+
+class FakeBackend:
+    def __init__(self, answer='respuesta', delay=0.0, error=None):
+        self.name = f"fake{next(_ids)}"
+        self.answer = answer
+        self.delay = delay
+        self.error = error
+        self.cancelled = threading.Event()
+        self.calls = 0
+
+    def ask(self, query, call, timeout=None, history=None):
+        self.calls += 1
+        deadline = time.perf_counter() + self.delay
+        while time.perf_counter() < deadline:
+            if call.cancelled:
+                self.cancelled.set()
+                raise AnswerError("cancelada")
+            time.sleep(0.005)
+        if self.error:
+            raise AnswerError(self.error)
+        return f"{self.answer}: {query}", ['https://example.org']
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_deadline(monkeypatch):
+    monkeypatch.setattr(Config, 'HEDGE_INITIAL_DEADLINE', 0.05)
+    monkeypatch.setattr(Config, 'HEDGE_MIN_DEADLINE', 0.05)
+
+
+def test_primary_answers_without_hedge():
+    primary, hedge = FakeBackend('principal'), FakeBackend('cobertura')
+    engine = AnswerEngine(primary, [hedge])
+
+    answer, citations, winner = engine.ask('hola')
+
+    assert (answer, winner) == ('principal: hola', primary.name)
+    assert hedge.calls == 0
+    engine.shutdown()
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    primary, hedge = FakeBackend('principal', delay=5.0), FakeBackend('cobertura')
+    engine = AnswerEngine(primary, [hedge])
+    cancelled = metrics.get('answer.cancelled', 0)
+
+    start = time.perf_counter()
+    answer, _, winner = engine.ask('hola')
+
+    assert winner == hedge.name
+    assert time.perf_counter() - start < 1.0
+    assert primary.cancelled.wait(1.0)
+    assert metrics.get('answer.cancelled', 0) - cancelled == 1
+    engine.shutdown()
+
+
+def test_failure_falls_back_to_stored_answer():
+    primary = FakeBackend('principal')
+    engine = AnswerEngine(primary)
+    engine.ask('capital de francia')
+
+    primary.error = 'caído'
+    answer, _, winner = engine.ask('Capital de Francia')
+
+    assert (answer, winner) == ('principal: capital de francia', 'cache')
+    engine.shutdown()
+
+
+def test_no_stored_answer_with_history():
+    primary = FakeBackend('principal')
+    engine = AnswerEngine(primary)
+    engine.ask('y mañana')
+
+    primary.error = 'caído'
+    with pytest.raises(AnswerError):
+        engine.ask('y mañana', history=[{'role': 'user', 'content': 'tiempo en Madrid'}])
+    engine.shutdown()
+
+
+def test_cancelled_turn_aborts_request():
+    primary = FakeBackend('principal', delay=5.0)
+    engine = AnswerEngine(primary)
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel, args=('barge_in',)).start()
+
+    with pytest.raises(Cancelled):
+        engine.ask('hola', token)
+    assert primary.cancelled.wait(1.0)
+    engine.shutdown()
+
+
+def test_perplexity_backend_against_stub_server():
+    delay = [5.0]
+    slow = _stub_server(delay, 'lenta')
+    fast = _stub_server([0.0], 'rápida')
+
+    def backend(server):
+        b = PerplexityBackend(url=f"http://127.0.0.1:{server.server_address[1]}/", api_key='stub', timeout=10)
+        b.name = f"stub{next(_ids)}"
+        return b
+
+    engine = AnswerEngine(backend(slow), [backend(fast)])
+    start = time.perf_counter()
+    answer, _, _ = engine.ask('pregunta')
+
+    assert answer == 'rápida'
+    assert time.perf_counter() - start < 2.0
+    engine.shutdown()
+    slow.shutdown()
+    fast.shutdown()
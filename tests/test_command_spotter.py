@@ -0,0 +1,52 @@
+import wave
+
+import numpy as np
+import pytest
+
+from command_spotter import CommandSpotter, FILLER
+
+
+RATE = 16000
+
+
+def write_tone(path, frequencies, seconds=0.6):
+    t = np.arange(int(seconds * RATE)) / RATE
+    signal = sum(np.sin(2 * np.pi * f * t) for f in frequencies) / len(frequencies)
+    with wave.open(str(path), 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(RATE)
+        wf.writeframes((signal * 12000).astype(np.int16).tobytes())
+    return str(path)
+
+
+@pytest.fixture
+def spotter(tmp_path):
+    return CommandSpotter(data_file=str(tmp_path / 'commands.json'), vocabulary=['para', 'gracias'])
+
+
+def test_single_phrase_never_bypasses_cloud(spotter, tmp_path):
+    audio = write_tone(tmp_path / 'para.wav', [300, 900])
+    spotter.learn(audio, 'Para')
+
+    # Incluso el mismo audio: sin competidores no hay margen que comprobar
+    assert spotter.spot(audio) is None
+
+
+def test_recognizes_with_competing_phrases(spotter, tmp_path):
+    para = write_tone(tmp_path / 'para.wav', [300, 900])
+    gracias = write_tone(tmp_path / 'gracias.wav', [1800, 2600])
+    spotter.learn(para, 'para')
+    spotter.learn(gracias, 'gracias')
+
+    assert spotter.spot(para) == 'para'
+
+
+def test_filler_class_rejects_other_short_phrases(spotter, tmp_path):
+    para = write_tone(tmp_path / 'para.wav', [300, 900])
+    other = write_tone(tmp_path / 'other.wav', [1800, 2600])
+    spotter.learn(para, 'para')
+    spotter.learn(other, 'pasa')
+
+    assert set(spotter.templates) == {'para', FILLER}
+    assert spotter.spot(other) is None
@@ -0,0 +1,54 @@
+import time
+
+from conversation import ConversationHistory, estimate_tokens
+
+
+def test_messages_alternate_oldest_first():
+    history = ConversationHistory(max_turns=6, token_budget=600, ttl=60)
+    history.add('tiempo en Madrid', 'Soleado')
+    history.add('y mañana', 'Nublado')
+
+    assert history.messages() == [
+        {'role': 'user', 'content': 'tiempo en Madrid'},
+        {'role': 'assistant', 'content': 'Soleado'},
+        {'role': 'user', 'content': 'y mañana'},
+        {'role': 'assistant', 'content': 'Nublado'},
+    ]
+
+
+def test_budget_drops_oldest_turns_first():
+    history = ConversationHistory(max_turns=6, token_budget=60, ttl=60)
+    for i in range(4):
+        history.add(f"pregunta {i}", 'x' * 80)
+
+    messages = history.messages()
+
+    assert [m['content'] for m in messages if m['role'] == 'user'] == ['pregunta 2', 'pregunta 3']
+    assert sum(estimate_tokens(m['content']) for m in messages) <= 60
+
+
+def test_turn_larger_than_budget_sends_no_history():
+    history = ConversationHistory(max_turns=6, token_budget=10, ttl=60)
+    history.add('pregunta', 'x' * 400)
+
+    assert history.messages() == []
+
+
+def test_max_turns_bounds_memory():
+    history = ConversationHistory(max_turns=2, token_budget=600, ttl=60)
+    for i in range(5):
+        history.add(f"p{i}", f"r{i}")
+
+    assert [m['content'] for m in history.messages()] == ['p3', 'r3', 'p4', 'r4']
+
+
+def test_conversation_expires_after_silence(monkeypatch):
+    history = ConversationHistory(max_turns=6, token_budget=600, ttl=120)
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    history.add('tiempo en Madrid', 'Soleado')
+
+    now[0] += 119
+    assert history.messages()
+    now[0] += 2
+    assert history.messages() == []
@@ -0,0 +1,183 @@
+from collections import deque
+
+import pytest
+
+from config import Config
+from dialog import DialogStateMachine
+
+
+class FakeAssistant:
+    """Asistente sin audio: cada método consume su guion"""
+
+    def __init__(self, wakes=(), captures=(), transcripts=(), intents=None, answers=None, barge_in=()):
+        self.wakes = deque(wakes)               # (detectado, archivo) de cada wake word
+        self.captures = deque(captures)         # archivo o None por cada capture_question
+        self.transcripts = deque(transcripts)   # texto o None por cada transcribe
+        self.intents = intents or {}
+        self.answers = answers or {}
+        self.barge_in = deque(barge_in)         # interrumpir las respuestas en este orden
+        self.spoken = []
+        self.turns = []
+        self.begun = []
+        self.should_stop_speaking = False
+        self.turn_record = None
+
+    def listen_for_wake_word_and_capture(self):
+        return self.wakes.popleft() if self.wakes else (False, None)
+
+    def capture_question(self, start_timeout=None):
+        return self.captures.popleft() if self.captures else None
+
+    def transcribe(self, audio_file, delete_after=True):
+        return self.transcripts.popleft() if self.transcripts else None
+
+    def after_transcription(self, audio_file):
+        pass
+
+    def classify_intent(self, text):
+        return self.intents.get(text, ('question', None))
+
+    def register_user(self, name, audio_file):
+        return True
+
+    def search_perplexity(self, query):
+        answer = self.answers.get(query, f"respuesta a {query}")
+        if isinstance(answer, Exception):
+            raise answer
+        return answer, []
+
+    def speak(self, text, interruptible=True):
+        self.spoken.append(text)
+        if interruptible and self.barge_in:
+            self.should_stop_speaking = self.barge_in.popleft()
+
+    def smart_greeting(self):
+        return "Señor"
+
+    def begin_turn(self, reason):
+        self.begun.append(reason)
+
+    def log_turn(self, record):
+        self.turns.append(record)
+
+
+@pytest.fixture(autouse=True)
+def follow_up_enabled(monkeypatch):
+    monkeypatch.setattr(Config, 'FOLLOW_UP_ENABLED', True)
+
+
+def run(assistant, max_steps=200):
+    machine = DialogStateMachine(assistant)
+    machine.run(max_steps=max_steps)
+    assert machine.state == 'shutdown'
+    return machine
+
+
+def test_question_is_answered_and_logged():
+    assistant = FakeAssistant(wakes=[(True, 'q.wav')], transcripts=['qué es un quásar'])
+
+    run(assistant)
+
+    assert assistant.spoken == ["Señor. respuesta a qué es un quásar"]
+    [record] = assistant.turns
+    assert record['outcome'] == 'answered'
+    assert record['query'] == 'qué es un quásar'
+    assert {'transcribe', 'classify', 'answer', 'follow_up', 'end_turn'} <= set(record['stages_ms'])
+
+
+def test_wake_without_question_prompts_then_gives_up():
+    assistant = FakeAssistant(wakes=[(True, None)])
+
+    run(assistant)
+
+    assert assistant.spoken == ["Señor. Dígame", "No he recibido ninguna pregunta, señor"]
+    assert assistant.turns[0]['outcome'] == 'no_input'
+
+
+def test_retry_uses_same_audio_before_asking_to_repeat():
+    # Primer audio: dos intentos sin texto; se pide repetir y el segundo audio se entiende
+    assistant = FakeAssistant(
+        wakes=[(True, 'a.wav')], captures=['b.wav'], transcripts=[None, None, 'hola mundo']
+    )
+
+    run(assistant)
+
+    assert assistant.spoken[0] == "Disculpe, no le he entendido bien. Por favor, repita"
+    assert assistant.turns[0]['retries'] == 1
+    assert assistant.turns[0]['outcome'] == 'answered'
+
+
+def test_gives_up_after_max_retries():
+    assistant = FakeAssistant(wakes=[(True, 'a.wav')], captures=['b.wav'])
+
+    run(assistant)
+
+    assert assistant.spoken[-1] == "Lo siento señor, sigo sin entenderle"
+    assert assistant.turns[0]['outcome'] == 'not_understood'
+
+
+def test_interruption_chain_stays_iterative():
+    chain = 300
+    assistant = FakeAssistant(
+        wakes=[(True, 'q.wav')],
+        captures=['q.wav'] * chain,
+        transcripts=['pregunta'] * (chain + 1),
+        barge_in=[True] * chain + [False]
+    )
+
+    run(assistant, max_steps=20 * chain)
+
+    outcomes = [record['outcome'] for record in assistant.turns]
+    assert outcomes == ['interrupted'] * chain + ['answered']
+    assert assistant.begun.count('interruption') == chain
+    assert [r['trigger'] for r in assistant.turns[1:]] == ['interruption'] * chain
+
+
+def test_follow_up_question_starts_new_turn_without_wake_word():
+    assistant = FakeAssistant(
+        wakes=[(True, 'q1.wav')], captures=['q2.wav'], transcripts=['tiempo en Madrid', 'y mañana']
+    )
+
+    run(assistant)
+
+    assert [r['trigger'] for r in assistant.turns] == ['wake', 'follow_up']
+    assert assistant.begun == ['follow_up']
+    assert assistant.spoken[-1] == "Señor. respuesta a y mañana"
+
+
+def test_noise_in_follow_up_window_ends_turn_quietly():
+    assistant = FakeAssistant(wakes=[(True, 'q1.wav')], captures=['ruido.wav'], transcripts=['hola'])
+
+    run(assistant)
+
+    assert len(assistant.spoken) == 1
+    assert [r['trigger'] for r in assistant.turns] == ['wake', 'follow_up']
+
+
+def test_state_error_ends_turn_and_keeps_running():
+    assistant = FakeAssistant(
+        wakes=[(True, 'a.wav'), (True, 'b.wav')],
+        transcripts=['falla', 'funciona'],
+        answers={'falla': RuntimeError("sin red")}
+    )
+
+    run(assistant)
+
+    assert "Disculpe señor, hubo un error" in assistant.spoken
+    assert assistant.turns[0]['error'] == "answer: sin red"
+    assert assistant.turns[1]['outcome'] == 'answered'
+    assert len(assistant.turns) == 2
+
+
+def test_intents_route_to_their_states():
+    assistant = FakeAssistant(
+        wakes=[(True, 'a.wav'), (True, 'b.wav')],
+        transcripts=['para', 'hola'],
+        intents={'para': ('stop', 'Entendido, señor'), 'hola': ('greeting', 'Hola, señor')}
+    )
+
+    run(assistant)
+
+    assert assistant.begun == ['stop']
+    assert assistant.spoken[:2] == ['Entendido, señor', 'Hola, señor']
+    assert [r['intent'] for r in assistant.turns] == ['stop', 'greeting']
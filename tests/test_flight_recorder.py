@@ -0,0 +1,39 @@
+import os
+import stat
+
+from flight_recorder import FlightRecorder, load_bundle
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_recorder_files_are_private(tmp_path):
+    path = tmp_path / 'flight.bin'
+    path.write_bytes(b'grabacion anterior')
+    os.chmod(path, 0o644)
+
+    recorder = FlightRecorder()
+    recorder.open(str(path), seconds=1, sample_rate=16000, events=8)
+    recorder.close()
+
+    assert _mode(path) == 0o600
+    assert _mode(tmp_path / 'flight.prev.bin') == 0o600
+
+
+def test_dump_bundle_is_private(tmp_path):
+    recorder = FlightRecorder()
+    recorder.open(str(tmp_path / 'flight.bin'), seconds=1, sample_rate=16000, events=8)
+    recorder.write_pcm(b'\x01\x00' * 1600)
+    recorder.event('wake', score=0.9)
+
+    bundle = recorder.dump(str(tmp_path / 'dumps'))
+    recorder.close()
+
+    assert _mode(bundle) == 0o700
+    for name in ('audio.wav', 'events.jsonl', 'meta.json'):
+        assert _mode(os.path.join(bundle, name)) == 0o600
+
+    audio, sample_rate, events, meta = load_bundle(bundle)
+    assert (len(audio), sample_rate, meta['samples']) == (1600, 16000, 1600)
+    assert [e['kind'] for e in events] == ['wake']
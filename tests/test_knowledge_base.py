@@ -0,0 +1,60 @@
+import pytest
+
+from knowledge_base import KnowledgeBase, normalize_tokens, same_subject
+
+
+@pytest.fixture
+def kb(tmp_path):
+    base = KnowledgeBase(path=str(tmp_path / 'knowledge.db'))
+    yield base
+    base.close()
+
+
+def test_paraphrase_shares_answer(kb):
+    kb.store('quién ganó el mundial 2022', 'Argentina', ['https://fifa.com'])
+
+    answer, citations, _ = kb.lookup('¿Qué país ganó el mundial de 2022?')
+
+    assert answer == 'Argentina'
+    assert citations == ['https://fifa.com']
+
+
+def test_different_place_is_another_question(kb):
+    kb.store('cuántos habitantes tiene Madrid', 'Unos 3,3 millones', [])
+
+    assert kb.lookup('cuántos habitantes tiene Barcelona') is None
+
+
+def test_negation_is_another_question(kb):
+    kb.store('quién ganó el mundial 2022', 'Argentina', [])
+
+    assert kb.lookup('quién no ganó el mundial 2022') is None
+    assert kb.lookup('quién nunca ganó el mundial') is None
+
+
+def test_different_year_is_another_question(kb):
+    kb.store('quién ganó el mundial 2022', 'Argentina', [])
+
+    assert kb.lookup('quién ganó el mundial 2018') is None
+
+
+def test_best_equivalent_question_wins(kb):
+    kb.store('qué país ganó el mundial 2022', 'Argentina, el país', [])
+    kb.store('quién ganó el mundial 2022', 'Argentina', [])
+
+    answer, _, similarity = kb.lookup('quién ganó el mundial de 2022')
+
+    assert (answer, similarity) == ('Argentina', 1.0)
+
+
+def test_volatile_questions_are_not_stored(kb):
+    kb.store('qué tiempo hace hoy', 'Soleado', [])
+
+    assert kb.lookup('qué tiempo hace hoy') is None
+
+
+def test_same_subject_allows_only_filler_words():
+    quien = set(normalize_tokens('quién ganó el mundial 2022'))
+
+    assert same_subject(quien, set(normalize_tokens('qué país ganó el mundial de 2022')))
+    assert not same_subject(quien, set(normalize_tokens('quién ganó el mundial 2022 en Qatar')))
@@ -0,0 +1,47 @@
+import numpy as np
+
+from low_power import EnergyGate
+
+
+FRAME = 512
+
+
+def noise(amplitude, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(FRAME) * amplitude).astype(np.int16).tobytes()
+
+
+def settle(gate, amplitude, frames):
+    return [gate.push(noise(amplitude, i)) for i in range(frames)]
+
+
+def test_speech_burst_opens_gate_with_lookback():
+    gate = EnergyGate(FRAME, lookback=0.1, hangover=0.1, floor_window=5.0)
+    settle(gate, 30, 50)
+
+    frames = gate.push(noise(3000))
+
+    assert len(frames) == gate.lookback.maxlen + 1
+
+
+def test_floor_follows_sustained_noise_rise():
+    gate = EnergyGate(FRAME, hangover=0.1, floor_window=2.0)
+    settle(gate, 30, 50)
+    quiet_floor = gate.noise_floor_db
+
+    # Ruido de fondo mucho más alto y continuo (ventilador encendido)
+    settle(gate, 600, 200)
+    opened = settle(gate, 600, 50)
+
+    assert gate.noise_floor_db > quiet_floor + 20
+    assert not any(opened)
+
+
+def test_short_activity_does_not_raise_floor():
+    gate = EnergyGate(FRAME, hangover=0.1, floor_window=2.0)
+    settle(gate, 30, 50)
+    quiet_floor = gate.noise_floor_db
+
+    settle(gate, 3000, 20)
+
+    assert gate.noise_floor_db < quiet_floor + 3
@@ -0,0 +1,70 @@
+import pytest
+
+from prefetch import PrefetchedAnswer, Prefetcher
+
+
+class FakeEngine:
+    def __init__(self, answers):
+        self.answers = answers
+        self.asked = []
+
+    def ask(self, question, token=None, history=None):
+        self.asked.append(question)
+        return self.answers[question], [], 'perplexity'
+
+
+class FakeTTS:
+    def __init__(self):
+        self.prepared = []
+
+    def prepare(self, text):
+        self.prepared.append(text)
+
+
+@pytest.fixture
+def prefetcher(tmp_path):
+    engine = FakeEngine({'cuántos habitantes tiene Madrid': 'Unos 3,3 millones'})
+    prefetcher = Prefetcher(engine, path=str(tmp_path / 'prefetch.db'))
+    prefetcher.entries['cuantos habitantes tiene madrid'] = PrefetchedAnswer(
+        'cuántos habitantes tiene Madrid', 'Unos 3,3 millones', [])
+    yield prefetcher
+    prefetcher.shutdown()
+
+
+def test_lookup_serves_same_question(prefetcher):
+    assert prefetcher.lookup('¿Cuántos habitantes tiene Madrid?') == ('Unos 3,3 millones', [])
+
+
+def test_lookup_rejects_other_entity(prefetcher):
+    assert prefetcher.lookup('cuántos habitantes tiene Barcelona') is None
+    assert prefetcher.lookup('cuántos habitantes no tiene Madrid') is None
+
+
+def test_refresh_fetches_frequent_questions(tmp_path, monkeypatch):
+    monkeypatch.setattr('config.Config.PREFETCH_MIN_COUNT', 2)
+    engine = FakeEngine({'qué hora abre el museo': 'A las diez'})
+    prefetcher = Prefetcher(engine, path=str(tmp_path / 'prefetch.db'))
+    for _ in range(2):
+        prefetcher.record('qué hora abre el museo')
+
+    assert prefetcher.refresh_once() == 1
+    assert prefetcher.lookup('qué hora abre el museo') == ('A las diez', [])
+    prefetcher.shutdown()
+
+
+def test_refresh_prepares_the_chunks_that_will_be_spoken(tmp_path, monkeypatch):
+    # tts_stream depende de google-cloud-texttospeech
+    split_sentences = pytest.importorskip('tts_stream').split_sentences
+    monkeypatch.setattr('config.Config.PREFETCH_MIN_COUNT', 1)
+    answer = 'El museo abre a las diez. Cierra a las ocho de la tarde.'
+    tts = FakeTTS()
+    prefetcher = Prefetcher(FakeEngine({'qué hora abre el museo': answer}), tts,
+                            render=lambda a: f"Señor. {a}", path=str(tmp_path / 'prefetch.db'),
+                            split=split_sentences)
+    prefetcher.record('qué hora abre el museo')
+
+    prefetcher.refresh_once()
+
+    assert tts.prepared == split_sentences(f"Señor. {answer}")
+    assert prefetcher.budget_used == 1 + len(tts.prepared)
+    prefetcher.shutdown()
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from resampler import CaptureConverter, PolyphaseResampler, downmix
+
+
+@pytest.mark.parametrize('in_rate', [48000, 44100, 32000])
+def test_block_by_block_matches_one_pass(in_rate):
+    samples = (np.random.default_rng(1).standard_normal(in_rate) * 3000).astype(np.float32)
+
+    whole = PolyphaseResampler(in_rate, 16000).process(samples)
+    blocked = PolyphaseResampler(in_rate, 16000)
+    block = int(in_rate * 0.03)
+    parts = [blocked.process(samples[i:i + block]) for i in range(0, len(samples), block)]
+
+    assert np.allclose(np.concatenate(parts), whole, atol=1e-2)
+    assert abs(len(whole) - 16000) <= 1
+
+
+def test_tone_above_output_nyquist_is_removed():
+    t = np.arange(48000) / 48000
+    tone = (np.sin(2 * np.pi * 10000 * t) * 16000).astype(np.int16)
+
+    out = CaptureConverter(48000, 1, 16000).process(tone.tobytes())[2000:].astype(np.float64)
+
+    assert np.sqrt(np.mean(out ** 2)) < 16000 * 0.01
+
+
+def test_downmix_averages_channels():
+    stereo = np.array([100, 300, -200, 0], dtype=np.int16).tobytes()
+
+    assert downmix(stereo, 2).tolist() == [200.0, -100.0]
+
+
+def test_passthrough_keeps_samples():
+    pcm = np.arange(10, dtype=np.int16).tobytes()
+
+    assert CaptureConverter(16000, 1, 16000).process(pcm).tolist() == list(range(10))
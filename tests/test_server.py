@@ -0,0 +1,133 @@
+import json
+import socket
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+from server import (HELLO, RESULT, WAKE, Endpointer, JarvisBrain, JarvisServer, ProtocolError,
+                    SatelliteSession, _FakeAnswerEngine, _FakeTranscriber, _FakeTTS, _utterance_pcm,
+                    recv_frame, send_frame)
+
+
+@pytest.fixture
+def server():
+    brain = JarvisBrain(_FakeTranscriber(0), _FakeAnswerEngine(0), _FakeTTS(0), workers=1)
+    server = JarvisServer(('127.0.0.1', 0), brain, use_vad=False, token='secreto')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    brain.shutdown()
+
+
+def _connect(server, hello):
+    sock = socket.create_connection(server.server_address, timeout=2)
+    send_frame(sock, HELLO, hello)
+    return sock
+
+
+def _closed(sock):
+    """El servidor cerró la conexión sin enviar nada"""
+    try:
+        return sock.recv(1) == b''
+    except ConnectionResetError:
+        return True
+
+
+def test_oversized_frame_is_rejected():
+    a, b = socket.socketpair()
+    a.sendall(struct.pack('!cI', WAKE, 1 << 31))
+
+    with pytest.raises(ProtocolError):
+        recv_frame(b, max_size=1024)
+    a.close()
+    b.close()
+
+
+def test_wrong_token_is_rejected(server):
+    sock = _connect(server, json.dumps({'room': 'intruso', 'token': 'otro'}).encode())
+
+    assert _closed(sock)
+    assert not server.brain.sessions
+    sock.close()
+
+
+def test_malformed_hello_is_rejected(server):
+    sock = _connect(server, b'\xff no es json')
+
+    assert _closed(sock)
+    sock.close()
+
+
+def test_valid_token_opens_session(server):
+    sock = _connect(server, json.dumps({'room': 'cocina', 'token': 'secreto'}).encode())
+    send_frame(sock, WAKE)
+
+    for _ in range(100):
+        if server.brain.sessions:
+            break
+        threading.Event().wait(0.01)
+
+    assert [s.room for s in server.brain.sessions] == ['cocina']
+    sock.close()
+
+
+def test_timers_are_per_room():
+    brain = JarvisBrain(_FakeTranscriber(0), _FakeAnswerEngine(0), _FakeTTS(0), workers=1)
+    kitchen = SatelliteSession(brain, None, 'cocina', 16000, use_vad=False)
+    living = SatelliteSession(brain, None, 'salon', 16000, use_vad=False)
+
+    kitchen.skills.dispatch('pon un temporizador de 5 minutos')
+    living.skills.dispatch('pon un temporizador de 10 minutos')
+
+    assert living.skills.dispatch('cuánto queda del temporizador').endswith('de 10 minutos')
+    assert kitchen.skills.dispatch('cancela el temporizador') == 'Temporizador cancelado'
+    assert kitchen.skills.dispatch('cancela el temporizador') == 'No hay ningún temporizador activo, señor'
+    assert [job.label for _, job in brain.scheduler.pending('timer')] == ['10 minutos']
+
+    brain.remove_session(living)
+    assert brain.scheduler.pending() == []
+    brain.shutdown()
+
+
+@pytest.mark.parametrize('sample_rate', [0, 1, -16000, 22050, '16000'])
+def test_unsupported_sample_rate_is_rejected(server, sample_rate):
+    sock = _connect(server, json.dumps({'room': 'sala', 'token': 'secreto', 'sample_rate': sample_rate}).encode())
+
+    kind, payload = recv_frame(sock)
+
+    assert kind == RESULT
+    assert json.loads(payload)['intent'] == 'error'
+    assert _closed(sock)
+    assert not server.brain.sessions
+    sock.close()
+
+
+def _push_in_blocks(endpointer, pcm, block=960):
+    for i in range(0, len(pcm), block):
+        if endpointer.push(pcm[i:i + block]):
+            return True
+    return False
+
+
+def test_endpointer_ends_after_trailing_silence():
+    endpointer = Endpointer(16000, use_vad=False)
+
+    assert _push_in_blocks(endpointer, _utterance_pcm(16000))
+    pcm = endpointer.take()
+
+    # Recortado a la voz con el margen de UPLOAD_PAD_MS por delante y por detrás
+    assert pcm is not None
+    assert 1.0 <= len(pcm) / 2 / 16000 < 1.8
+
+
+def test_endpointer_gives_up_on_steady_noise():
+    endpointer = Endpointer(16000, use_vad=False)
+    t = np.arange(16000 * 6) / 16000
+    hum = (np.sin(2 * np.pi * 150 * t) * 3000).astype(np.int16).tobytes()
+
+    assert _push_in_blocks(endpointer, hum)
+    assert endpointer.total_frames * Endpointer.FRAME_MS / 1000 == pytest.approx(5.0, abs=0.1)
+    assert endpointer.take() is None
@@ -0,0 +1,86 @@
+import pytest
+
+from skills import build_registry, describe_duration, format_number, parse_number
+
+
+class ManualScheduler:
+    """Planificador sin hilo: guarda los trabajos para inspeccionarlos"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def schedule(self, delay, callback, kind='timer', label='', owner=None):
+        self.jobs.append((delay, kind, label, callback))
+
+    def cancel(self, kind=None, owner=None):
+        before = len(self.jobs)
+        self.jobs = [j for j in self.jobs if kind is not None and j[1] != kind]
+        return before - len(self.jobs)
+
+    def pending(self, kind=None, owner=None):
+        return []
+
+
+@pytest.fixture
+def registry():
+    notified = []
+    registry, scheduler = build_registry(notified.append, ManualScheduler())
+    registry.scheduler = scheduler
+    registry.notified = notified
+    return registry
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("¿Cuánto es 15 por ciento de 80?", "El 15 por ciento de 80 es 12"),
+    ("cuánto es el 20 por ciento de 150", "El 20 por ciento de 150 es 30"),
+    ("cuánto es 15 por 23", "15 por 23 son 345"),
+    ("cuanto son dos más tres", "2 más 3 son 5"),
+    ("cuánto es 7 dividido entre 2", "7 dividido entre 2 son 3,5"),
+    ("cuánto es -5 más 2", "-5 más 2 son -3"),
+    ("multiplica 3 y 4", "3 por 4 son 12"),
+    ("raíz cuadrada de 81", "La raíz cuadrada de 81 es 9"),
+    ("cuánto es 1 entre 0", "No se puede dividir entre cero, señor"),
+])
+def test_arithmetic(registry, text, expected):
+    assert registry.dispatch(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    "cuánto es veintidós más uno",     # "veinte" no debe casar con el principio de "veintidós"
+    "quién ganó el mundial",
+    "cuánto es el segundo mejor",
+])
+def test_no_partial_number_matches(registry, text):
+    assert registry.dispatch(text) is None
+
+
+def test_conversion(registry):
+    assert registry.dispatch("convierte 10 millas a kilómetros") == "10 millas son 16,09 kilómetros"
+    assert registry.dispatch("100 grados celsius en fahrenheit") == "100 grados celsius son 212 fahrenheit"
+    assert registry.dispatch("5 kilos a litros") == "No puedo convertir kilos a litros, señor"
+
+
+def test_timer_schedules_and_notifies(registry):
+    assert registry.dispatch("pon un temporizador de 5 minutos y medio") == "Temporizador de 5 minutos y 30 segundos en marcha"
+
+    [(delay, kind, label, callback)] = registry.scheduler.jobs
+    assert (delay, kind) == (330, 'timer')
+    callback()
+    assert registry.notified == ["Señor, el temporizador de 5 minutos y 30 segundos ha terminado"]
+
+    assert registry.dispatch("cancela el temporizador") == "Temporizador cancelado"
+
+
+def test_alarm_afternoon(registry):
+    response = registry.dispatch("pon una alarma a las 7 y media de la tarde")
+
+    assert response.endswith("a las 19:30")
+    assert registry.scheduler.jobs[0][1] == 'alarm'
+
+
+def test_number_helpers():
+    assert parse_number("2,5") == 2.5
+    assert parse_number("cinco") == 5
+    assert format_number(3.0) == "3"
+    assert format_number(16.0934) == "16,09"
+    assert describe_duration(3725) == "1 hora, 2 minutos y 5 segundos"
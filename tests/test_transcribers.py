@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip('speech_recognition')
+
+from transcribers import TranscriptionPolicy, TranscriptionResult  # noqa: E402
+
+
+class FakeBackend:
+    def __init__(self, name, alternatives):
+        self.name = name
+        self.alternatives = alternatives
+        self.calls = 0
+
+    def is_ready(self):
+        return True
+
+    def transcribe(self, audio_file):
+        self.calls += 1
+        return TranscriptionResult(self.alternatives, self.name)
+
+
+@pytest.fixture
+def audio(tmp_path):
+    path = tmp_path / 'turn.wav'
+    path.write_bytes(b'RIFF' + bytes(100))
+    return str(path)
+
+
+def make_policy(*backends):
+    policy = TranscriptionPolicy(backends, mode='fallback')
+    policy.latency = {b.name: i for i, b in enumerate(backends)}
+    return policy
+
+
+def test_confident_result_is_served_once(audio):
+    google = FakeBackend('google', [('qué hora es', 0.9), ('que ahora es', None)])
+    policy = make_policy(google)
+
+    assert policy.transcribe(audio) == ('qué hora es', 'google')
+    assert google.calls == 1
+
+
+def test_low_confidence_retry_prefers_untried_backend(audio):
+    google = FakeBackend('google', [('pon música', 0.2), ('pon mucha', None)])
+    local = FakeBackend('local', [('pon música clásica', None)])
+    policy = make_policy(google, local)
+
+    assert policy.transcribe(audio) == (None, 'google')
+    assert local.calls == 0
+
+    assert policy.transcribe(audio) == ('pon música clásica', 'local')
+    assert (google.calls, local.calls) == (1, 1)
+
+
+def test_low_confidence_retry_serves_lower_ranked_alternative(audio):
+    google = FakeBackend('google', [('para el temporizador', 0.2), ('para el temporizador dos', None)])
+    policy = make_policy(google)
+
+    assert policy.transcribe(audio) == (None, 'google')
+    assert policy.transcribe(audio) == ('para el temporizador dos', 'google')
+    assert google.calls == 1
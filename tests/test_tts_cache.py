@@ -0,0 +1,46 @@
+import os
+
+from metrics import metrics
+from tts_cache import SUFFIX, TTSDiskCache
+
+
+def test_put_and_get_survive_restart(tmp_path):
+    cache = TTSDiskCache(str(tmp_path), max_bytes=10_000)
+    key = cache.key('Hola señor', 'es-ES', 1.0)
+    cache.put(key, b'audio')
+
+    assert TTSDiskCache(str(tmp_path), max_bytes=10_000).get(key) == b'audio'
+
+
+def test_corrupt_crc_is_a_miss_and_removed(tmp_path):
+    cache = TTSDiskCache(str(tmp_path), max_bytes=10_000)
+    key = cache.key('Hola señor')
+    cache.put(key, b'audio original')
+    path = os.path.join(str(tmp_path), key[:2], key + SUFFIX)
+    data = bytearray(open(path, 'rb').read())
+    data[-1] ^= 0xFF
+    open(path, 'wb').write(bytes(data))
+    corrupt = metrics.get('tts.disk_cache_corrupt', 0)
+
+    assert cache.get(key) is None
+    assert metrics.get('tts.disk_cache_corrupt', 0) - corrupt == 1
+    assert not os.path.exists(path)
+    assert cache.total_bytes == 0
+
+
+def test_least_recently_used_is_evicted(tmp_path):
+    cache = TTSDiskCache(str(tmp_path), max_bytes=100)
+    keys = [cache.key(f"frase {i}") for i in range(3)]
+    cache.put(keys[0], b'a' * 30)
+    cache.put(keys[1], b'b' * 30)
+    cache.get(keys[0])
+    cache.put(keys[2], b'c' * 30)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == b'a' * 30
+    assert cache.get(keys[2]) == b'c' * 30
+    assert cache.total_bytes <= 100
+
+
+def test_different_parameters_give_different_keys():
+    assert TTSDiskCache.key('Hola', 'voz-a', 1.0) != TTSDiskCache.key('Hola', 'voz-b', 1.0)
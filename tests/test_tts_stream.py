@@ -0,0 +1,125 @@
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip('google.cloud.texttospeech')
+
+from tts import TTSUnavailable  # noqa: E402
+from tts_stream import ChunkPlayer, split_sentences  # noqa: E402
+
+
+ANSWER = ("La Torre Eiffel mide 330 metros. Se construyó para la Exposición Universal de 1889. "
+          "Es el monumento de pago más visitado del mundo.")
+
+
+def test_first_sentence_goes_alone():
+    chunks = split_sentences(ANSWER, max_chars=250)
+
+    assert chunks == [
+        'La Torre Eiffel mide 330 metros.',
+        'Se construyó para la Exposición Universal de 1889. Es el monumento de pago más visitado del mundo.'
+    ]
+
+
+@pytest.mark.parametrize('greeting', ['Señor.', 'Señor Max.', 'Buenas noches, señor.'])
+def test_greeting_does_not_count_as_first_sentence(greeting):
+    chunks = split_sentences(f"{greeting} {ANSWER}", max_chars=250)
+
+    assert chunks[0] == greeting
+    assert chunks[1] == 'La Torre Eiffel mide 330 metros.'
+    assert len(chunks) == 3
+
+
+def test_greeting_alone_is_one_chunk():
+    assert split_sentences('Buenos días, señor.') == ['Buenos días, señor.']
+
+
+def test_long_sentence_is_cut_at_commas():
+    sentence = 'Primero, ' + 'a' * 40 + ', ' + 'b' * 40 + '.'
+
+    assert split_sentences(sentence, max_chars=50) == ['Primero,', 'a' * 40 + ',', 'b' * 40 + '.']
+
+
+class FakeSound:
+    def __init__(self, file):
+        self.data = file.read()
+
+    def get_length(self):
+        return 0.01
+
+
+class FakeChannel:
+    def __init__(self):
+        self.played = []
+
+    def get_busy(self):
+        return False
+
+    def get_queue(self):
+        return None
+
+    def play(self, sound):
+        self.played.append(sound.data)
+
+    def queue(self, sound):
+        self.played.append(sound.data)
+
+    def stop(self):
+        pass
+
+
+class FakeMixer:
+    Sound = FakeSound
+
+    def __init__(self):
+        self.channel = FakeChannel()
+
+    def find_channel(self, force=False):
+        return self.channel
+
+
+class FakeTTS:
+    """submit() con futuros ya resueltos; los textos de 'failing' fallan"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def submit(self, text, token=None):
+        future = Future()
+        if text in self.failing:
+            future.set_exception(TTSUnavailable(text))
+        else:
+            future.set_result(text.encode('utf-8'))
+        return future
+
+
+def play_all(player):
+    while player.pump():
+        pass
+
+
+def test_player_plays_chunks_in_order():
+    chunks = split_sentences(f"Señor. {ANSWER}", max_chars=250)
+    mixer = FakeMixer()
+    player = ChunkPlayer(FakeTTS(), mixer, chunks, lookahead=2)
+
+    play_all(player)
+
+    assert mixer.channel.played == [c.encode('utf-8') for c in chunks]
+    assert player.stats()['audio_chunks'] == 3
+
+
+def test_first_chunk_failure_raises():
+    player = ChunkPlayer(FakeTTS(failing={'Señor.'}), FakeMixer(), ['Señor.', 'Hola.'])
+
+    with pytest.raises(TTSUnavailable):
+        play_all(player)
+
+
+def test_later_failure_truncates_the_answer():
+    mixer = FakeMixer()
+    player = ChunkPlayer(FakeTTS(failing={'Dos.'}), mixer, ['Uno.', 'Dos.', 'Tres.'], lookahead=1)
+
+    play_all(player)
+
+    assert mixer.channel.played == [b'Uno.']
@@ -0,0 +1,56 @@
+import numpy as np
+
+from vad_stage import VadStage
+
+
+RATE = 16000
+FRAME = 480
+
+
+def frames_of(samples):
+    pcm = np.clip(samples, -32768, 32767).astype(np.int16)
+    usable = len(pcm) - len(pcm) % FRAME
+    return [pcm[i:i + FRAME].tobytes() for i in range(0, usable, FRAME)]
+
+
+def hum(seconds, amplitude):
+    """Zumbido constante (extractor, nevera): tonal pero estable"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    return amplitude * (np.sin(2 * np.pi * 150 * t) + 0.5 * np.sin(2 * np.pi * 450 * t))
+
+
+def voice(seconds, amplitude):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return amplitude * np.sin(2 * np.pi * 220 * t) * (1 + 0.5 * np.sin(2 * np.pi * 4 * t))
+
+
+def make_stage():
+    return VadStage(RATE, FRAME, use_webrtc=False, noise_suppression=False, agc=False)
+
+
+def test_steady_noise_becomes_floor_and_is_not_speech():
+    stage = make_stage()
+
+    _, decisions = stage.process(frames_of(hum(2.0, 3000)))
+
+    assert not decisions.any()
+    assert stage.noise_floor_db > -30
+
+
+def test_voice_over_noise_floor_is_speech():
+    stage = make_stage()
+    stage.process(frames_of(hum(2.0, 1000)))
+
+    _, decisions = stage.process(frames_of(hum(0.6, 1000) + voice(0.6, 12000)))
+
+    assert decisions.mean() > 0.8
+
+
+def test_white_noise_is_rejected_by_flatness():
+    stage = make_stage()
+    stage.process(frames_of(np.zeros(RATE)))
+    noise = np.random.default_rng(0).standard_normal(RATE) * 8000
+
+    _, decisions = stage.process(frames_of(noise))
+
+    assert not decisions.any()
@@ -0,0 +1,55 @@
+import logging
+
+import numpy as np
+
+from metrics import metrics
+from wake_verifier import WakeWordVerifier
+
+
+RATE = 16000
+
+
+def tone(frequency, seconds=1.2):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (np.sin(2 * np.pi * frequency * t) * 8000).astype(np.int16).tobytes()
+
+
+def make_verifier(tmp_path):
+    return WakeWordVerifier(data_file=str(tmp_path / 'templates.json'), threshold=0.45, enroll_threshold=0.75)
+
+
+def test_without_templates_accepts_but_never_enrolls(tmp_path):
+    verifier = make_verifier(tmp_path)
+
+    assert verifier.verify(tone(440))
+    assert verifier.last_score is None
+    assert not verifier.enroll_confirmed(tone(440), verifier.last_score)
+    assert verifier.templates == []
+
+
+def test_enrolls_only_high_confidence_activations(tmp_path):
+    verifier = make_verifier(tmp_path)
+    verifier.enroll(tone(440))
+
+    verifier.verify(tone(440))
+    assert verifier.enroll_confirmed(tone(440), verifier.last_score)
+    assert len(verifier.templates) == 2
+
+    assert not verifier.enroll_confirmed(tone(440), 0.5)
+    assert len(verifier.templates) == 2
+
+
+def test_warns_at_startup_when_inert(tmp_path, caplog):
+    with caplog.at_level(logging.WARNING, logger='jarvis'):
+        make_verifier(tmp_path)
+
+    assert 'inactiva' in caplog.text
+
+
+def test_rejection_counts_only_the_stt_call(tmp_path):
+    verifier = make_verifier(tmp_path)
+    verifier.enroll(tone(440))
+    before = metrics.get('wake.cloud_calls_saved', 0)
+
+    assert not verifier.verify(np.random.default_rng(0).integers(-8000, 8000, RATE, dtype=np.int16).tobytes())
+    assert metrics.get('wake.cloud_calls_saved', 0) - before == 1
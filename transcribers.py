@@ -0,0 +1,444 @@
+"""
+Backends de Speech-to-Text con interfaz común y política de selección
+
+- GoogleTranscriber: Google Speech Recognition (nube)
+- LocalTranscriber: ASR de SpeechBrain en CPU (sin red)
+- TranscriptionPolicy: elige, encadena o compite entre backends según la
+  latencia medida de cada uno
+- TranscriptionCache: memoriza las alternativas por hash del audio para que
+  los reintentos no vuelvan a subir los mismos bytes al mismo servicio
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import speech_recognition as sr
+
+from cancellation import Cancelled
+from config import Config
+from metrics import metrics
+from resilience import resilience
+
+
+log = logging.getLogger('jarvis')
+
+
+class TranscriptionError(Exception):
+    """Error del backend (red, modelo...), distinto de 'no se entendió'"""
+
+
+class TranscriptionResult:
+    """Alternativas de un backend, de la más a la menos probable"""
+
+    def __init__(self, alternatives, backend):
+        self.alternatives = alternatives  # Lista de (texto, confianza o None)
+        self.backend = backend
+
+    @property
+    def text(self):
+        return self.alternatives[0][0] if self.alternatives else None
+
+
+class _FlacAudioData(sr.AudioData):
+    """AudioData que codifica a FLAC una sola vez (para medir lo que se envía)"""
+
+    def __init__(self, frame_data, sample_rate, sample_width):
+        super().__init__(frame_data, sample_rate, sample_width)
+        self._flac = {}
+
+    def get_flac_data(self, convert_rate=None, convert_width=None):
+        key = (convert_rate, convert_width)
+        if key not in self._flac:
+            self._flac[key] = super().get_flac_data(convert_rate, convert_width)
+        return self._flac[key]
+
+
+class GoogleTranscriber:
+    """Transcripción con Google Speech Recognition (el audio se sube en FLAC)"""
+
+    name = 'google'
+
+    def __init__(self, recognizer, payload_tracker=None):
+        self.recognizer = recognizer
+        self.payload_tracker = payload_tracker
+
+    def is_ready(self):
+        return True
+
+    def transcribe(self, audio_file):
+        """
+        Transcribe un archivo WAV
+
+        Returns:
+            TranscriptionResult: Todas las alternativas devueltas por Google
+
+        Raises:
+            TranscriptionError: Si falla la petición
+        """
+        endpoint = resilience.endpoint('google_stt')
+        if not endpoint.breaker.allow():
+            raise TranscriptionError("Google STT no disponible (circuito abierto)")
+
+        # Plazo adaptativo según las latencias observadas
+        self.recognizer.operation_timeout = endpoint.deadline()
+
+        try:
+            with sr.AudioFile(audio_file) as source:
+                recorded = self.recognizer.record(source)
+            audio = _FlacAudioData(recorded.frame_data, recorded.sample_rate, recorded.sample_width)
+
+            # Misma codificación que usa recognize_google, calculada una vez
+            sent_bytes = len(audio.get_flac_data(
+                convert_rate=None if audio.sample_rate >= 8000 else 8000,
+                convert_width=2
+            ))
+
+            start = time.perf_counter()
+            response = self.recognizer.recognize_google(
+                audio,
+                language=Config.LANGUAGE,
+                show_all=True
+            )
+            elapsed = time.perf_counter() - start
+        except sr.UnknownValueError:
+            endpoint.breaker.record_success()
+            return TranscriptionResult([], self.name)
+        except Exception as e:
+            endpoint.breaker.record_failure()
+            raise TranscriptionError(f"Google STT: {e}")
+
+        endpoint.breaker.record_success()
+        endpoint.record_latency(elapsed)
+
+        if self.payload_tracker:
+            self.payload_tracker.record_upload(
+                audio_file, len(audio.frame_data), sent_bytes, elapsed
+            )
+
+        if not isinstance(response, dict):
+            return TranscriptionResult([], self.name)
+
+        alternatives = [
+            (alt['transcript'], alt.get('confidence'))
+            for alt in response.get('alternative', [])
+            if alt.get('transcript')
+        ]
+        return TranscriptionResult(alternatives, self.name)
+
+
+class LocalTranscriber:
+    """Transcripción local con SpeechBrain; el modelo se carga una vez y se mantiene caliente"""
+
+    name = 'local'
+
+    def __init__(self, source=None, savedir=None, background=True):
+        self.source = source or Config.LOCAL_ASR_MODEL
+        self.savedir = savedir or Config.LOCAL_ASR_DIR
+        self.model = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+        if background:
+            threading.Thread(target=self._load, daemon=True).start()
+        else:
+            self._load()
+
+    def _load(self):
+        """Carga el modelo y hace una inferencia de calentamiento"""
+        try:
+            import torch
+            try:
+                from speechbrain.inference.ASR import EncoderDecoderASR, EncoderASR
+            except ImportError:
+                from speechbrain.pretrained import EncoderDecoderASR, EncoderASR
+
+            start = time.perf_counter()
+            try:
+                model = EncoderDecoderASR.from_hparams(source=self.source, savedir=self.savedir)
+            except Exception:
+                model = EncoderASR.from_hparams(source=self.source, savedir=self.savedir)
+
+            # Calentamiento con medio segundo de silencio
+            with torch.no_grad():
+                model.transcribe_batch(torch.zeros(1, 8000), torch.tensor([1.0]))
+
+            self.model = model
+            self._ready.set()
+            print(f"✅ ASR local listo ({time.perf_counter() - start:.1f}s)")
+        except Exception as e:
+            print(f"⚠️ ASR local no disponible: {e}")
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def transcribe(self, audio_file):
+        """
+        Transcribe un archivo WAV en CPU
+
+        Returns:
+            TranscriptionResult: Una única alternativa (sin confianza)
+
+        Raises:
+            TranscriptionError: Si el modelo no está cargado o falla
+        """
+        if not self.is_ready():
+            raise TranscriptionError("ASR local no cargado")
+
+        try:
+            import torch
+            # El modelo no es thread-safe: una inferencia cada vez
+            with self._lock, torch.no_grad():
+                text = self.model.transcribe_file(audio_file)
+        except Exception as e:
+            raise TranscriptionError(f"ASR local: {e}")
+
+        if isinstance(text, (list, tuple)):
+            text = text[0] if text else ''
+        text = (text or '').strip().lower()
+        return TranscriptionResult([(text, None)] if text else [], self.name)
+
+
+def audio_hash(audio_file):
+    """Hash del contenido del archivo de audio"""
+    digest = hashlib.sha1()
+    with open(audio_file, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CachedTranscription:
+    """Alternativas acumuladas para un mismo audio y backends ya consultados"""
+
+    def __init__(self):
+        self.alternatives = []  # Lista de (texto, confianza, backend, puesto en su backend)
+        self.tried = set()
+        self.served = set()     # Índices de alternativas ya entregadas
+        self._lock = threading.Lock()
+
+    def mark_tried(self, backend):
+        """Registra que un backend ya ha recibido este audio"""
+        with self._lock:
+            self.tried.add(backend)
+
+    def add(self, result):
+        """Añade las alternativas de un backend (sin duplicados)"""
+        with self._lock:
+            self.tried.add(result.backend)
+            known = {text.lower() for text, _, _, _ in self.alternatives}
+            for rank, (text, confidence) in enumerate(result.alternatives):
+                if text.lower() not in known:
+                    known.add(text.lower())
+                    self.alternatives.append((text, confidence, result.backend, rank))
+
+    def has_top_alternative(self):
+        """Queda por entregar la primera alternativa de algún backend"""
+        with self._lock:
+            return any(
+                rank == 0 and index not in self.served
+                for index, (_, _, _, rank) in enumerate(self.alternatives)
+            )
+
+    def next_alternative(self):
+        """
+        Siguiente alternativa aún no entregada: las primeras de cada backend
+        antes que las de menor puesto
+
+        Returns:
+            tuple: (texto, confianza, backend) o None si no quedan
+        """
+        with self._lock:
+            pending = [
+                (rank, index) for index, (_, _, _, rank) in enumerate(self.alternatives)
+                if index not in self.served
+            ]
+            if not pending:
+                return None
+            _, index = min(pending)
+            self.served.add(index)
+            return self.alternatives[index][:3]
+
+
+class TranscriptionCache:
+    """Caché LRU de transcripciones indexada por hash del audio"""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key):
+        """
+        Retorna la entrada del audio, creándola si no existe
+
+        Returns:
+            tuple: (CachedTranscription, bool si ya existía)
+        """
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key], True
+
+            entry = CachedTranscription()
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return entry, False
+
+
+class TranscriptionPolicy:
+    """
+    Selecciona backend según latencia medida
+
+    Modos:
+        'fallback': prueba los backends del más rápido al más lento
+        'race': lanza todos a la vez y se queda con el primer resultado válido
+
+    Una transcripción con confianza menor que STT_MIN_CONFIDENCE se rechaza
+    (retorna None). Si se pide otra vez el mismo audio (reintento), se
+    consulta antes un backend que aún no haya procesado esos bytes y después
+    se entregan las alternativas memorizadas de menor puesto. Nunca se
+    repite la misma petición.
+    """
+
+    def __init__(self, backends, mode=None, alpha=0.3, sessions=1):
+        """
+        Args:
+            backends: Transcriptores disponibles
+            mode: 'fallback' o 'race' (por defecto Config.STT_POLICY)
+            alpha: Peso de la última medida en la EWMA de latencia
+            sessions: Transcripciones simultáneas previstas (modo servidor)
+        """
+        self.backends = list(backends)
+        self.mode = mode or Config.STT_POLICY
+        self.alpha = alpha
+        self.cache = TranscriptionCache()
+        # Latencia media estimada (EWMA) por backend, con valores iniciales
+        self.latency = {b.name: Config.STT_INITIAL_LATENCY.get(b.name, 2.0) for b in self.backends}
+        # Hueco extra por backend para llamadas abandonadas que aún no han terminado
+        self.executor = ThreadPoolExecutor(max_workers=2 * len(self.backends) * sessions, thread_name_prefix='stt')
+
+    def _record(self, name, elapsed, ok):
+        """Actualiza la EWMA de latencia (los fallos penalizan)"""
+        if not ok:
+            elapsed = max(elapsed, self.latency[name] * 2)
+        self.latency[name] += self.alpha * (elapsed - self.latency[name])
+
+        metrics.inc(f'stt.{name}.calls')
+        if not ok:
+            metrics.inc(f'stt.{name}.failures')
+        metrics.set_gauge(f'stt.{name}.latency_ms', self.latency[name] * 1000)
+
+    def _run(self, backend, audio_file, entry):
+        """Ejecuta un backend midiendo su latencia y memoriza sus alternativas"""
+        entry.mark_tried(backend.name)
+        start = time.perf_counter()
+        try:
+            result = backend.transcribe(audio_file)
+        except Exception as e:
+            self._record(backend.name, time.perf_counter() - start, False)
+            entry.add(TranscriptionResult([], backend.name))
+            log.warning(f"⚠️ {e}")
+            if isinstance(e, TranscriptionError):
+                raise
+            raise TranscriptionError(f"{backend.name}: {e}")
+        self._record(backend.name, time.perf_counter() - start, True)
+        entry.add(result)
+        return result
+
+    def ranked_backends(self):
+        """Backends disponibles ordenados por latencia estimada"""
+        ready = [b for b in self.backends if b.is_ready()]
+        return sorted(ready, key=lambda b: self.latency[b.name])
+
+    def transcribe(self, audio_file, token=None):
+        """
+        Transcribe con la política configurada
+
+        Args:
+            audio_file: Path del archivo WAV
+            token: CancelToken del turno (opcional)
+
+        Returns:
+            tuple: (texto o None, nombre del backend o None)
+
+        Raises:
+            Cancelled: Si el turno se cancela mientras se transcribe
+        """
+        entry, cached = self.cache.get_or_create(audio_hash(audio_file))
+        if cached:
+            metrics.inc('stt.cache_hits')
+
+        # Antes que una alternativa de menor puesto, un backend que no haya oído este audio
+        if not entry.has_top_alternative():
+            backends = [b for b in self.ranked_backends() if b.name not in entry.tried]
+            if backends:
+                self._execute(backends, audio_file, entry, token, race=self.mode == 'race')
+
+        alternative = entry.next_alternative()
+        if not alternative:
+            return None, None
+
+        text, confidence, backend = alternative
+        if cached:
+            log.info(f"♻️ Reintento con alternativa memorizada: '{text}' ({backend})")
+        else:
+            metrics.inc(f'stt.wins.{backend}')
+        if confidence is not None:
+            log.info(f"🎯 Confianza {backend}: {confidence:.2f}")
+            if confidence < Config.STT_MIN_CONFIDENCE:
+                # Rechazo real: el reintento tomará otra alternativa u otro backend
+                metrics.inc('stt.low_confidence')
+                log.info(f"🤔 Transcripción poco fiable descartada: '{text}'")
+                return None, backend
+        return text, backend
+
+    def _execute(self, backends, audio_file, entry, token, race):
+        """
+        Ejecuta los backends (en serie o en carrera) hasta obtener alguna alternativa
+
+        Raises:
+            Cancelled: Si el turno se cancela; las llamadas en curso se abandonan
+        """
+        waiter = Future()
+        if token is not None:
+            token.on_cancel(lambda: waiter.done() or waiter.set_result(None))
+
+        queue = list(backends)
+        pending = set()
+
+        def launch():
+            pending.add(self.executor.submit(self._run, queue.pop(0), audio_file, entry))
+
+        launch()
+        while race and queue:
+            launch()
+
+        while pending:
+            done, pending = wait(pending | {waiter}, return_when=FIRST_COMPLETED)
+            pending.discard(waiter)
+
+            if waiter in done:
+                metrics.inc('cancel.stt_abandoned', len(pending))
+                raise Cancelled(token.reason)
+
+            for future in done:
+                try:
+                    result = future.result()
+                except TranscriptionError:
+                    continue
+                if result.alternatives:
+                    # En carrera, los perdedores terminan en segundo plano y sus
+                    # alternativas quedan memorizadas para un reintento
+                    return
+
+            if not race and not pending and queue:
+                launch()
+
+    def shutdown(self):
+        """Libera el pool de hilos"""
+        self.executor.shutdown(wait=False)
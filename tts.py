@@ -0,0 +1,215 @@
+"""
+Síntesis de voz con Google TTS, protegida por la capa de resiliencia
+
+Las frases cortas (confirmaciones, avisos de error...) se guardan en
+memoria y se precalientan al arrancar, de modo que siguen sonando aunque
+Google TTS esté caído. Las respuestas precargadas se presintetizan aparte,
+sin límite de longitud, para reproducirse sin esperar a la síntesis.
+Con una caché en disco (tts_cache.py), cualquier texto ya sintetizado con
+la misma voz vuelve a sonar sin llamar a Google, también tras reiniciar.
+"""
+
+import io
+import threading
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from google.cloud import texttospeech
+
+from cancellation import Cancelled
+from config import Config
+from metrics import metrics
+from resilience import resilience, CircuitOpenError
+
+
+class TTSUnavailable(Exception):
+    """No se pudo sintetizar el texto y no hay audio guardado"""
+
+
+class TTSEngine:
+    """Síntesis con caché de frases cortas y fallo rápido si el proveedor cae"""
+
+    def __init__(self, client, voice, audio_config, disk_cache=None, phrase_cache_size=None):
+        """
+        Args:
+            client: TextToSpeechClient
+            voice: VoiceSelectionParams
+            audio_config: AudioConfig
+            disk_cache: TTSDiskCache (opcional)
+            phrase_cache_size: Frases en memoria (por defecto Config.TTS_PHRASE_CACHE_SIZE)
+        """
+        self.client = client
+        self.voice = voice
+        self.audio_config = audio_config
+        self.disk_cache = disk_cache
+        self.phrase_cache_size = Config.TTS_PHRASE_CACHE_SIZE if phrase_cache_size is None else phrase_cache_size
+        # Parámetros que cambian el audio: forman parte de la clave en disco
+        self.synthesis_params = (
+            voice.language_code, voice.name,
+            audio_config.speaking_rate, audio_config.pitch, int(audio_config.audio_encoding)
+        )
+        self.phrase_cache = OrderedDict()
+        self.prepared = OrderedDict()
+        self._lock = threading.Lock()
+        # Síntesis por trozos: varias peticiones en vuelo por delante de la reproducción
+        self.executor = ThreadPoolExecutor(max_workers=Config.TTS_STREAM_LOOKAHEAD, thread_name_prefix='tts')
+
+    def _cache_get(self, text):
+        with self._lock:
+            audio = self.phrase_cache.get(text)
+            if audio is not None:
+                self.phrase_cache.move_to_end(text)
+                return audio
+            return self.prepared.get(text)
+
+    def _cache_put(self, text, audio):
+        if not self.phrase_cache_size or len(text) > Config.TTS_PHRASE_CACHE_MAX_CHARS:
+            return
+        with self._lock:
+            self.phrase_cache[text] = audio
+            while len(self.phrase_cache) > self.phrase_cache_size:
+                self.phrase_cache.popitem(last=False)
+
+    def prepare(self, text):
+        """
+        Sintetiza por adelantado una respuesta larga y la guarda
+
+        Raises:
+            TTSUnavailable: Si el proveedor falla
+        """
+        if self._cache_get(text) is not None:
+            return
+        audio = self.synthesize(text)
+        with self._lock:
+            self.prepared[text] = audio
+            self.prepared.move_to_end(text)
+            while len(self.prepared) > Config.TTS_PREPARED_SIZE:
+                self.prepared.popitem(last=False)
+
+    def _request(self, text, timeout, token=None):
+        """
+        Llamada a Google TTS; con token se usa un futuro gRPC cancelable
+
+        Raises:
+            Cancelled: Si el token se cancela durante la llamada
+        """
+        request = texttospeech.SynthesizeSpeechRequest(
+            input=texttospeech.SynthesisInput(text=text),
+            voice=self.voice,
+            audio_config=self.audio_config
+        )
+
+        transport = getattr(self.client, 'transport', None)
+        stub = getattr(transport, 'synthesize_speech', None)
+        if token is None or not hasattr(stub, 'future'):
+            return self.client.synthesize_speech(request=request, timeout=timeout)
+
+        import grpc
+
+        future = stub.future(request, timeout=timeout)
+
+        def cancel_rpc():
+            if future.cancel():
+                metrics.inc('cancel.grpc_cancelled')
+
+        token.on_cancel(cancel_rpc)
+        try:
+            return future.result()
+        except grpc.FutureCancelledError:
+            raise Cancelled(token.reason)
+        except grpc.RpcError:
+            if token.cancelled:
+                raise Cancelled(token.reason)
+            raise
+
+    def synthesize(self, text, token=None):
+        """
+        Sintetiza texto a audio MP3
+
+        Args:
+            text: Texto ya limpio para hablar
+            token: CancelToken del turno (opcional)
+
+        Returns:
+            bytes: Audio MP3
+
+        Raises:
+            TTSUnavailable: Si el proveedor falla y la frase no está guardada
+            Cancelled: Si el turno se cancela durante la síntesis
+        """
+        cached = self._cache_get(text)
+        if cached is not None:
+            metrics.inc('tts.phrase_cache_hits')
+            return cached
+
+        disk_key = None
+        if self.disk_cache is not None:
+            disk_key = self.disk_cache.key(text, *self.synthesis_params)
+            stored = self.disk_cache.get(disk_key)
+            if stored is not None:
+                self._cache_put(text, stored)
+                return stored
+
+        if token is not None:
+            token.raise_if_cancelled()
+
+        try:
+            response = resilience.endpoint('google_tts').call(self._request, text, token=token)
+        except Cancelled:
+            raise
+        except CircuitOpenError as e:
+            metrics.inc('tts.unavailable')
+            raise TTSUnavailable(str(e))
+        except Exception as e:
+            metrics.inc('tts.unavailable')
+            raise TTSUnavailable(f"Google TTS: {e}")
+
+        self._cache_put(text, response.audio_content)
+        if disk_key is not None:
+            self.disk_cache.put(disk_key, response.audio_content)
+        return response.audio_content
+
+    def submit(self, text, token=None):
+        """
+        Sintetiza en segundo plano
+
+        Returns:
+            Future: Audio (o TTSUnavailable / Cancelled al pedir el resultado)
+        """
+        return self.executor.submit(self.synthesize, text, token)
+
+    def warm_up(self, phrases):
+        """Sintetiza en segundo plano las frases fijas para tenerlas guardadas"""
+        def run():
+            for phrase in phrases:
+                try:
+                    self.synthesize(phrase)
+                except TTSUnavailable:
+                    return
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def beep_wav(frequency=880, duration=0.15, sample_rate=22050):
+    """
+    Pitido corto generado en local (alternativa a la confirmación hablada)
+
+    Returns:
+        bytes: Archivo WAV en memoria
+    """
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    envelope = np.minimum(1.0, np.minimum(t, duration - t) * 50)
+    samples = (np.sin(2 * np.pi * frequency * t) * envelope * 12000).astype(np.int16)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.tobytes())
+    return buffer.getvalue()
@@ -0,0 +1,184 @@
+"""
+Caché persistente de audio sintetizado
+
+Muchas respuestas se repiten tal cual: la hora y la fecha con la misma
+plantilla, "Lo siento señor, no he podido obtener una respuesta" o las
+respuestas a preguntas frecuentes. Esta caché guarda en disco el audio de
+cada texto para que, la siguiente vez, suene sin llamar a Google TTS.
+
+- La clave es el SHA-256 del texto limpio junto con la voz, velocidad,
+  tono y codificación: cambiar la voz en config.py no reutiliza audio viejo.
+- Los archivos se reparten en subdirectorios por los dos primeros
+  caracteres de la clave, para no tener miles de archivos en uno solo.
+- El tamaño total se limita a TTS_DISK_CACHE_MAX_BYTES; al pasarse se
+  borran los menos usados (la fecha de modificación se actualiza en cada
+  acierto, así el orden sobrevive a los reinicios).
+- Cada archivo se escribe en un temporal y se renombra, y lleva una
+  cabecera con longitud y CRC: un archivo a medias tras un corte de luz
+  se detecta al leerlo y se descarta.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+from config import Config
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+# Cabecera: marca, longitud del audio y CRC32 del audio
+HEADER = struct.Struct('<4sII')
+MAGIC = b'JTC1'
+SUFFIX = '.tts'
+
+
+class TTSDiskCache:
+    """Audio por clave de contenido en disco, con límite de bytes y expulsión LRU"""
+
+    def __init__(self, directory=None, max_bytes=None):
+        """
+        Args:
+            directory: Carpeta de la caché (por defecto Config.TTS_DISK_CACHE_DIR)
+            max_bytes: Tamaño máximo (por defecto Config.TTS_DISK_CACHE_MAX_BYTES)
+        """
+        self.directory = directory or Config.TTS_DISK_CACHE_DIR
+        self.max_bytes = max_bytes or Config.TTS_DISK_CACHE_MAX_BYTES
+        self._entries = OrderedDict()   # clave -> tamaño en disco, de menos a más reciente
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key(text, *params):
+        """Clave de contenido: texto y parámetros de síntesis (voz, velocidad...)"""
+        material = json.dumps([text, *params], ensure_ascii=False, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + SUFFIX)
+
+    def _load(self):
+        """Índice de lo que ya hay en disco, ordenado por último uso"""
+        found = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    # Escritura interrumpida de una ejecución anterior
+                    self._remove(entry.path)
+                elif entry.name.endswith(SUFFIX):
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name[:-len(SUFFIX)], stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+
+        with self._lock:
+            self._evict()
+        log.info(f"🗄️ Caché de voz en disco: {len(self._entries)} audios, "
+                 f"{self.total_bytes / 1e6:.1f} de {self.max_bytes / 1e6:.0f} MB")
+
+    def get(self, key):
+        """
+        Audio guardado para la clave
+
+        Returns:
+            bytes: Audio, o None si no está (o el archivo estaba dañado)
+        """
+        with self._lock:
+            if key not in self._entries:
+                metrics.inc('tts.disk_cache_misses')
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self._forget(key)
+            metrics.inc('tts.disk_cache_misses')
+            return None
+
+        audio = self._unpack(data)
+        if audio is None:
+            log.warning(f"⚠️ Audio dañado en la caché de voz, se descarta: {path}")
+            metrics.inc('tts.disk_cache_corrupt')
+            self._forget(key)
+            self._remove(path)
+            return None
+
+        metrics.inc('tts.disk_cache_hits')
+        return audio
+
+    def put(self, key, audio):
+        """Guarda el audio (sin efecto si ya estaba o si no cabe en el límite)"""
+        size = HEADER.size + len(audio)
+        with self._lock:
+            if key in self._entries or size > self.max_bytes:
+                return
+
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, len(audio), zlib.crc32(audio)))
+                f.write(audio)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning(f"⚠️ No se pudo guardar audio en la caché de voz: {e}")
+            metrics.inc('tts.disk_cache_errors')
+            self._remove(tmp)
+            return
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = size
+                self.total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Borra los audios menos usados hasta volver al límite (con el lock tomado)"""
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self._remove(self._path(key))
+            metrics.inc('tts.disk_cache_evictions')
+        metrics.set_gauge('tts.disk_cache_bytes', self.total_bytes)
+
+    def _forget(self, key):
+        with self._lock:
+            size = self._entries.pop(key, None)
+            if size is not None:
+                self.total_bytes -= size
+            metrics.set_gauge('tts.disk_cache_bytes', self.total_bytes)
+
+    @staticmethod
+    def _unpack(data):
+        if len(data) < HEADER.size:
+            return None
+        magic, length, crc = HEADER.unpack_from(data)
+        audio = data[HEADER.size:]
+        if magic != MAGIC or length != len(audio) or zlib.crc32(audio) != crc:
+            return None
+        return audio
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,182 @@
+"""
+Síntesis por frases con reproducción encadenada
+
+Una respuesta de cuatro frases sintetizada de una vez no empieza a sonar
+hasta que llega el audio completo. Aquí el texto se divide por frases: la
+primera se pide sola (es la que marca el tiempo hasta el primer audio) y
+las siguientes se agrupan hasta TTS_STREAM_CHUNK_CHARS. El saludo con el
+que empiezan las respuestas ("Señor.", "Buenos días, señor Max.") no cuenta
+como primera frase: va en su propio trozo, casi siempre ya en caché, y la
+primera frase con contenido sigue yendo sola. Hay hasta
+TTS_STREAM_LOOKAHEAD peticiones en vuelo mientras suena el trozo anterior.
+
+Los trozos llegan como WAV y se encadenan en un canal de pygame con
+Channel.queue(), que empieza el siguiente sin hueco en cuanto acaba el
+actual. Si un trozo llega tarde, el hueco se mide (tts.stream.gaps).
+"""
+
+import io
+import logging
+import re
+import time
+from collections import deque
+
+from cancellation import Cancelled
+from config import Config
+from metrics import metrics
+from tts import TTSUnavailable
+
+
+log = logging.getLogger('jarvis')
+
+SENTENCE_END = re.compile(r'(?<=[.!?;:…])\s+')
+CLAUSE_END = re.compile(r'(?<=,)\s+')
+# Saludo de smart_greeting() delante de la respuesta
+GREETING = re.compile(r'(?:buen[oa]s (?:días|tardes|noches), )?señor[^.!?;:…]{0,40}[.!?;:…]$', re.IGNORECASE)
+
+
+def split_sentences(text, max_chars=None):
+    """
+    Divide el texto en trozos para sintetizar por separado
+
+    Args:
+        text: Texto ya limpio para hablar
+        max_chars: Longitud máxima de los trozos que agrupan varias frases
+
+    Returns:
+        list: Trozos; el saludo inicial (si lo hay) y la primera frase van solos
+    """
+    max_chars = max_chars or Config.TTS_STREAM_CHUNK_CHARS
+
+    pieces = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        if len(sentence) > max_chars:
+            # Frase muy larga: se corta por las comas
+            pieces.extend(CLAUSE_END.split(sentence))
+        elif sentence:
+            pieces.append(sentence)
+
+    # Trozos que no se agrupan: el saludo y la primera frase con contenido
+    single = 2 if len(pieces) > 1 and GREETING.match(pieces[0]) else 1
+    chunks = pieces[:single]
+    for piece in pieces[single:]:
+        if len(chunks) > single and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] += ' ' + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+class ChunkPlayer:
+    """Búfer de reproducción: pide los trozos por adelantado y los encadena según llegan"""
+
+    def __init__(self, tts, mixer, chunks, token=None, lookahead=None):
+        """
+        Args:
+            tts: TTSEngine configurado en LINEAR16 (WAV)
+            mixer: pygame.mixer ya inicializado
+            chunks: Trozos de texto en orden
+            token: CancelToken del turno (opcional)
+            lookahead: Trozos sintetizándose a la vez (por defecto Config.TTS_STREAM_LOOKAHEAD)
+        """
+        self.tts = tts
+        self.mixer = mixer
+        self.token = token
+        self.lookahead = lookahead or Config.TTS_STREAM_LOOKAHEAD
+        self.pending = deque(chunks)
+        self.inflight = deque()
+        self.channel = None
+
+        self.started = time.perf_counter()
+        self.first_audio_ms = None
+        self.played = 0
+        self.gaps = 0
+        self.gap_ms = 0.0
+        self._ends_at = 0.0     # Cuándo termina lo que ya está en el canal
+
+        metrics.inc('tts.stream.utterances')
+        self._request_more()
+
+    def _request_more(self):
+        while self.pending and len(self.inflight) < self.lookahead:
+            self.inflight.append(self.tts.submit(self.pending.popleft(), self.token))
+
+    def _has_room(self):
+        """El canal admite un sonido más (el que suena y uno en cola)"""
+        return self.channel is None or not self.channel.get_busy() or self.channel.get_queue() is None
+
+    def pump(self):
+        """
+        Pasa al canal el audio que ya ha llegado (llamar periódicamente)
+
+        Returns:
+            bool: False cuando ya ha sonado todo
+
+        Raises:
+            TTSUnavailable: Si falla el primer trozo
+            Cancelled: Si el turno se cancela durante la síntesis
+        """
+        while self.inflight and self.inflight[0].done() and self._has_room():
+            future = self.inflight.popleft()
+            try:
+                audio = future.result()
+            except Cancelled:
+                raise
+            except TTSUnavailable as e:
+                if not self.played:
+                    raise
+                # Lo que ya ha llegado se oye entero; el resto se pierde
+                log.warning(f"⚠️ Respuesta hablada incompleta: {e}")
+                metrics.inc('tts.stream.truncated')
+                self._discard()
+                break
+            self._request_more()
+            self._enqueue(self.mixer.Sound(file=io.BytesIO(audio)))
+
+        busy = self.channel is not None and self.channel.get_busy()
+        return busy or bool(self.inflight)
+
+    def _enqueue(self, sound):
+        now = time.perf_counter()
+        if self.channel is None:
+            self.channel = self.mixer.find_channel(True)
+
+        if self.channel.get_busy():
+            self.channel.queue(sound)
+            self._ends_at += sound.get_length()
+        else:
+            if self.first_audio_ms is None:
+                self.first_audio_ms = (now - self.started) * 1000
+                metrics.set_gauge('tts.stream.first_audio_ms', self.first_audio_ms)
+            else:
+                # El canal se quedó sin audio: el trozo llegó tarde
+                gap_ms = max(0.0, now - self._ends_at) * 1000
+                self.gaps += 1
+                self.gap_ms += gap_ms
+                metrics.inc('tts.stream.gaps')
+                if gap_ms > metrics.get('tts.stream.gap_ms_max', 0.0):
+                    metrics.set_gauge('tts.stream.gap_ms_max', gap_ms)
+            self.channel.play(sound)
+            self._ends_at = now + sound.get_length()
+        self.played += 1
+
+    def _discard(self):
+        self.pending.clear()
+        for future in self.inflight:
+            future.cancel()
+        self.inflight.clear()
+
+    def stop(self):
+        """Corta la reproducción y descarta lo pendiente"""
+        self._discard()
+        if self.channel is not None:
+            self.channel.stop()
+
+    def stats(self):
+        """Tiempo hasta el primer audio y huecos, para el registro del turno"""
+        return {
+            'first_audio_ms': round(self.first_audio_ms, 1) if self.first_audio_ms is not None else None,
+            'audio_chunks': self.played,
+            'audio_gaps': self.gaps,
+            'audio_gap_ms': round(self.gap_ms, 1)
+        }
@@ -0,0 +1,186 @@
+"""
+Registro estructurado de turnos y salida de consola asíncrona
+
+Cada turno (pregunta, intención, usuario, origen de la respuesta, tiempos
+por etapa, bytes enviados...) se guarda como una línea JSON. El hilo del
+diálogo solo encola el registro: un hilo aparte escribe por lotes, hace
+fsync periódicamente y rota el archivo por tamaño comprimiendo los
+anteriores con gzip. Si la cola se llena, los registros se descartan (y se
+cuentan) en lugar de bloquear el audio.
+
+La consola pasa por logging con QueueHandler, así que los mensajes del
+camino caliente tampoco esperan a que se escriba en la terminal.
+"""
+
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+
+from config import Config
+from metrics import metrics
+
+
+# Contadores cuya variación durante el turno se guarda en el registro
+TURN_COUNTERS = {
+    'bytes_sent': 'upload.sent_bytes',
+    'prefetch_hits': 'prefetch.hits',
+    'knowledge_hits': 'knowledge.hits',
+    'answer_cache_fallbacks': 'answer.cache_fallbacks',
+    'tts_cache_hits': 'tts.phrase_cache_hits',
+    'tts_disk_hits': 'tts.disk_cache_hits',
+    'hedges': 'answer.hedges',
+    'audio_overruns': 'audio.overruns',
+    'playback_stalls': 'audio.playback.stalls'
+}
+
+
+class TurnRecord:
+    """Datos de un turno que se van rellenando según avanza"""
+
+    def __init__(self, turn_id=None):
+        self.fields = {'ts': round(time.time(), 3), 'turn': turn_id}
+        self.stages = {}
+        self.logged = False
+        self._start = time.perf_counter()
+        self._counters = {key: metrics.get(name) for key, name in TURN_COUNTERS.items()}
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def add_stage(self, name, elapsed_ms):
+        """Suma el tiempo de una etapa (un estado puede repetirse en el turno)"""
+        self.stages[name] = round(self.stages.get(name, 0.0) + elapsed_ms, 1)
+
+    def to_dict(self):
+        record = dict(self.fields)
+        record['stages_ms'] = self.stages
+        record['total_ms'] = round((time.perf_counter() - self._start) * 1000, 1)
+        for key, name in TURN_COUNTERS.items():
+            delta = metrics.get(name) - self._counters[key]
+            if delta:
+                record[key] = delta
+        return record
+
+
+class TurnLogWriter:
+    """Escritor JSONL en segundo plano con cola acotada, fsync por lotes y rotación"""
+
+    _STOP = object()
+
+    def __init__(self, path=None, max_bytes=None, backups=None, queue_size=None, fsync_interval=None):
+        self.path = path or Config.TURN_LOG_FILE
+        self.max_bytes = max_bytes or Config.TURN_LOG_MAX_BYTES
+        self.backups = backups or Config.TURN_LOG_BACKUPS
+        self.fsync_interval = fsync_interval or Config.TURN_LOG_FSYNC_INTERVAL
+        self.queue = queue.Queue(maxsize=queue_size or Config.TURN_LOG_QUEUE_SIZE)
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='turn-log', daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        """Encola un registro sin bloquear; si la cola está llena se descarta"""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc('turn_log.dropped')
+
+    def _run(self):
+        last_sync = time.monotonic()
+        pending_sync = False
+
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.fsync_interval)]
+            except queue.Empty:
+                batch = []
+
+            # Vaciar lo que haya acumulado para escribirlo de una vez
+            while len(batch) < Config.TURN_LOG_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(record is self._STOP for record in batch)
+            lines = [
+                json.dumps(record, ensure_ascii=False, default=str)
+                for record in batch if record is not self._STOP
+            ]
+
+            try:
+                if lines:
+                    self._file.write('\n'.join(lines) + '\n')
+                    self._file.flush()
+                    pending_sync = True
+                    metrics.inc('turn_log.written', len(lines))
+
+                if pending_sync and (stop or time.monotonic() - last_sync >= self.fsync_interval):
+                    os.fsync(self._file.fileno())
+                    last_sync = time.monotonic()
+                    pending_sync = False
+
+                if self._file.tell() >= self.max_bytes:
+                    self._rotate()
+            except OSError as e:
+                metrics.inc('turn_log.errors')
+                logging.getLogger('jarvis').warning(f"⚠️ Error escribiendo el registro de turnos: {e}")
+
+            if stop:
+                self._file.close()
+                return
+
+    def _rotate(self):
+        """turns.jsonl -> turns.jsonl.1.gz; los anteriores se desplazan y el último se borra"""
+        self._file.close()
+
+        oldest = f"{self.path}.{self.backups}.gz"
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}.gz"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}.gz")
+
+        with open(self.path, 'rb') as src, gzip.open(f"{self.path}.1.gz", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(self.path)
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+        metrics.inc('turn_log.rotations')
+
+    def close(self, timeout=2.0):
+        """Escribe lo pendiente y cierra el archivo"""
+        try:
+            self.queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+
+def setup_console_logging(level=None):
+    """
+    Envía la consola a través de una cola atendida por otro hilo
+
+    Returns:
+        QueueListener: Hay que llamar a stop() al cerrar para vaciar la cola
+    """
+    log_queue = queue.Queue(-1)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(message)s'))
+
+    logger = logging.getLogger('jarvis')
+    logger.setLevel(getattr(logging, (level or Config.LOG_LEVEL).upper(), logging.INFO))
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, console)
+    listener.start()
+    return listener
@@ -0,0 +1,102 @@
+"""
+Reducción del audio que se sube a la nube
+
+Recorta el silencio inicial y final de la captura usando las decisiones
+del VAD (dejando un pequeño margen) y lleva la cuenta de los bytes
+enviados y del tiempo ahorrado en cada turno.
+"""
+
+import logging
+import threading
+
+from config import Config
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+
+def trim_frames(frames, speech_flags, pad_frames):
+    """
+    Recorta los frames sin voz al principio y al final
+
+    Args:
+        frames: Lista de frames de audio (bytes)
+        speech_flags: Lista paralela de decisiones del VAD (bool)
+        pad_frames: Frames de margen que se conservan a cada lado
+
+    Returns:
+        list: Frames recortados (la lista original si no hay voz)
+    """
+    speech = [i for i, flag in enumerate(speech_flags) if flag]
+    if not speech:
+        return frames
+
+    start = max(0, speech[0] - pad_frames)
+    end = min(len(frames), speech[-1] + 1 + pad_frames)
+    return frames[start:end]
+
+
+class PayloadTracker:
+    """Estadísticas de carga útil por turno: bytes capturados, recortados y enviados"""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.throughput = None  # Bytes/segundo estimados de subida
+        self.captures = {}  # archivo -> (bytes PCM brutos, bytes PCM recortados)
+        self._lock = threading.Lock()
+
+    def record_capture(self, audio_file, raw_bytes, trimmed_bytes):
+        """Registra el recorte aplicado a una captura"""
+        with self._lock:
+            self.captures[audio_file] = (raw_bytes, trimmed_bytes)
+            # Evitar crecer sin límite si un archivo nunca se sube
+            while len(self.captures) > 16:
+                self.captures.pop(next(iter(self.captures)))
+
+        metrics.inc('upload.raw_bytes', raw_bytes)
+        metrics.inc('upload.trimmed_bytes', trimmed_bytes)
+
+        if trimmed_bytes < raw_bytes:
+            bytes_per_second = 2 * Config.SAMPLE_RATE
+            log.info(
+                f"✂️ Audio recortado: {raw_bytes / bytes_per_second:.1f}s → "
+                f"{trimmed_bytes / bytes_per_second:.1f}s"
+            )
+
+    def record_upload(self, audio_file, pcm_bytes, sent_bytes, elapsed, encoding='FLAC'):
+        """
+        Registra una subida y muestra el informe del turno
+
+        Args:
+            audio_file: Archivo subido
+            pcm_bytes: Bytes PCM del audio subido
+            sent_bytes: Bytes realmente enviados (codificados)
+            elapsed: Segundos que tardó la petición
+            encoding: Codificación usada en la subida
+        """
+        if elapsed > 0:
+            rate = sent_bytes / elapsed
+            self.throughput = rate if self.throughput is None else (
+                self.throughput + self.alpha * (rate - self.throughput)
+            )
+
+        with self._lock:
+            raw_bytes, _ = self.captures.pop(audio_file, (pcm_bytes, pcm_bytes))
+
+        # Bytes que se habrían enviado sin recorte (misma tasa de compresión)
+        ratio = sent_bytes / pcm_bytes if pcm_bytes else 1.0
+        untrimmed_sent = raw_bytes * ratio
+        saved_bytes = max(0.0, untrimmed_sent - sent_bytes)
+        saved_ms = saved_bytes / self.throughput * 1000 if self.throughput else 0.0
+
+        metrics.inc('upload.sent_bytes', sent_bytes)
+        metrics.inc('upload.saved_ms', int(saved_ms))
+        if self.throughput:
+            metrics.set_gauge('upload.throughput_kbps', self.throughput * 8 / 1000)
+
+        log.info(
+            f"📦 Subida {encoding}: {sent_bytes / 1024:.1f} KB "
+            f"(WAV sin recortar: {raw_bytes / 1024:.1f} KB), "
+            f"~{saved_ms:.0f} ms ahorrados"
+        )
@@ -4,11 +4,15 @@ Sistema de reconocimiento y gestión de usuarios por voz
 
 import os
 import json
+import logging
 import numpy as np
 import hashlib
 from pathlib import Path
 
 
+log = logging.getLogger('jarvis')
+
+
 class UserManager:
     """Gestiona el registro y reconocimiento de usuarios por características de voz"""
     
@@ -169,7 +173,7 @@ class UserManager:
                 best_score = similarity
                 best_match = user_name
         
-        print(f"🔍 [DEBUG] Mejor coincidencia: {best_match} ({best_score:.1f}%)")
+        log.debug(f"🔍 Mejor coincidencia: {best_match} ({best_score:.1f}%)")
         
         if best_score >= threshold:
             self.current_user = best_match
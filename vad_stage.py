@@ -0,0 +1,162 @@
+"""
+Etapa de VAD por bloques con seguimiento del ruido de fondo
+
+webrtcvad solo decide frame a frame y en una cocina con el extractor en
+marcha dice "voz" casi siempre, así que la grabación no termina hasta el
+máximo y se sube ruido a la nube. Esta etapa procesa varios frames de una
+vez y combina webrtcvad con rasgos calculados con numpy para todo el
+bloque:
+
+- energía frente a un suelo de ruido adaptativo (mínimo de los últimos
+  segundos): un ruido constante deja de contar como voz en cuanto se
+  convierte en el suelo;
+- energía absoluta mínima (Config.SILENCE_THRESHOLD);
+- planitud espectral en la banda de voz: el ruido de banda ancha es plano,
+  la voz no.
+
+Opcionalmente aplica una supresión de ruido ligera (resta espectral) y un
+control automático de ganancia al audio que se envía a transcribir.
+"""
+
+import logging
+
+import numpy as np
+
+from config import Config
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+
+class VadStage:
+    """Decisión de voz por bloques de frames con suelo de ruido, NS y AGC opcionales"""
+
+    def __init__(self, sample_rate=None, frame_samples=480, use_webrtc=True,
+                 noise_suppression=None, agc=None):
+        """
+        Args:
+            sample_rate: Frecuencia de muestreo (por defecto Config.SAMPLE_RATE)
+            frame_samples: Muestras por frame (10, 20 o 30 ms para webrtcvad)
+            use_webrtc: Combinar con webrtcvad si está instalado
+            noise_suppression: Resta espectral (por defecto Config.VAD_NOISE_SUPPRESSION)
+            agc: Control de ganancia (por defecto Config.VAD_AGC)
+        """
+        self.sample_rate = sample_rate or Config.SAMPLE_RATE
+        self.frame_samples = frame_samples
+        self.vad = webrtcvad.Vad(Config.VAD_AGGRESSIVENESS) if use_webrtc and webrtcvad else None
+        self.noise_suppression = Config.VAD_NOISE_SUPPRESSION if noise_suppression is None else noise_suppression
+        self.agc = Config.VAD_AGC if agc is None else agc
+
+        self.window = np.hanning(frame_samples).astype(np.float32)
+        freqs = np.fft.rfftfreq(frame_samples, 1 / self.sample_rate)
+        self.band = (freqs >= 300) & (freqs <= 4000)
+
+        # Energías recientes (dBFS) para el suelo de ruido por mínimos
+        history_frames = max(1, int(Config.VAD_NOISE_WINDOW * self.sample_rate / frame_samples))
+        self.history = np.zeros(0, dtype=np.float32)
+        self.history_frames = history_frames
+        self.noise_floor_db = None
+
+        self.noise_psd = None
+        self.agc_gain = 1.0
+        self.agc_target = 32768 * 10 ** (Config.VAD_AGC_TARGET_DBFS / 20)
+
+        self.errors = 0
+        self.frames = 0
+        self.speech_frames = 0
+
+    def _webrtc(self, frames):
+        """Decisiones de webrtcvad (todo True si no está disponible o falla)"""
+        decisions = np.ones(len(frames), dtype=bool)
+        if self.vad is None:
+            return decisions
+
+        for i, frame in enumerate(frames):
+            try:
+                decisions[i] = self.vad.is_speech(frame, self.sample_rate)
+            except Exception as e:
+                # Frame de tamaño inválido o similar: decide solo la parte numpy
+                self.errors += 1
+                metrics.inc('vad.errors')
+                if self.errors == 1:
+                    log.warning(f"⚠️ Error en webrtcvad ({len(frame)} bytes): {e}")
+        return decisions
+
+    def _update_floor(self, energy_db):
+        """Suelo de ruido: mínimo de la energía en la ventana reciente"""
+        self.history = np.concatenate([self.history, energy_db])[-self.history_frames:]
+        self.noise_floor_db = float(self.history.min())
+
+    def _suppress(self, x, speech):
+        """Resta espectral con ganancia mínima, estimando el ruido en los frames sin voz"""
+        spectrum = np.fft.rfft(x, axis=1)
+        power = np.abs(spectrum) ** 2
+
+        if (~speech).any():
+            noise = power[~speech].mean(axis=0)
+            self.noise_psd = noise if self.noise_psd is None else 0.8 * self.noise_psd + 0.2 * noise
+        if self.noise_psd is None:
+            return x
+
+        gain = np.sqrt(np.clip(1 - self.noise_psd / (power + 1e-10), Config.VAD_NS_MIN_GAIN ** 2, 1))
+        return np.fft.irfft(spectrum * gain, n=self.frame_samples, axis=1)
+
+    def _apply_agc(self, x, rms, speech):
+        """Lleva la voz hacia VAD_AGC_TARGET_DBFS con una ganancia suavizada por bloque"""
+        if speech.any():
+            level = float(np.mean(rms[speech])) + 1e-6
+            wanted = np.clip(self.agc_target / level, 0.5, Config.VAD_AGC_MAX_GAIN)
+            self.agc_gain += 0.3 * (wanted - self.agc_gain)
+        metrics.set_gauge('vad.agc_gain', self.agc_gain)
+        return x * self.agc_gain
+
+    def process(self, frames):
+        """
+        Procesa un bloque de frames
+
+        Args:
+            frames: Lista de frames (bytes int16 de frame_samples muestras)
+
+        Returns:
+            tuple: (frames de salida, np.ndarray bool con la decisión de cada frame)
+        """
+        if not frames:
+            return frames, np.zeros(0, dtype=bool)
+
+        x = np.frombuffer(b''.join(frames), dtype=np.int16).reshape(len(frames), -1).astype(np.float32)
+
+        power = np.mean(x * x, axis=1)
+        rms = np.sqrt(power)
+        energy_db = 10 * np.log10(power / 32768.0 ** 2 + 1e-12)
+
+        band = np.abs(np.fft.rfft(x * self.window, axis=1))[:, self.band] ** 2 + 1e-10
+        flatness = np.exp(np.mean(np.log(band), axis=1)) / np.mean(band, axis=1)
+
+        self._update_floor(energy_db)
+
+        speech = (
+            self._webrtc(frames)
+            & (energy_db > self.noise_floor_db + Config.VAD_NOISE_MARGIN_DB)
+            & (rms > Config.SILENCE_THRESHOLD)
+            & (flatness < Config.VAD_MAX_FLATNESS)
+        )
+
+        self.frames += len(frames)
+        self.speech_frames += int(speech.sum())
+        metrics.set_gauge('vad.noise_floor_db', self.noise_floor_db)
+
+        if self.noise_suppression or self.agc:
+            if self.noise_suppression:
+                x = self._suppress(x, speech)
+            if self.agc:
+                x = self._apply_agc(x, rms, speech)
+            out = np.clip(np.rint(x), -32768, 32767).astype(np.int16)
+            frames = [row.tobytes() for row in out]
+
+        return frames, speech
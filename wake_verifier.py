@@ -0,0 +1,170 @@
+"""
+Verificación local del wake word antes de hacer llamadas a la nube
+
+Cada activación de Porcupine se compara con plantillas del wake word
+grabadas previamente (embeddings log-mel de longitud fija). Si el audio no
+se parece a ninguna plantilla, la activación se descarta sin gastar STT
+ni búsquedas.
+
+Las primeras plantillas se graban a propósito (python wake_verifier.py
+jarvis1.wav ...). Después solo se aprenden activaciones que ya se parecían
+mucho a ellas: sin ese filtro, las falsas activaciones que se aceptan
+mientras no hay plantillas acabarían convertidas en plantillas. Así que,
+sin plantillas grabadas, la verificación no descarta nada (se avisa al
+arrancar).
+"""
+
+import json
+import logging
+import os
+import sys
+import wave
+
+import numpy as np
+
+from audio_features import pcm_to_float, fixed_length_embedding
+from config import Config
+from metrics import metrics
+
+
+log = logging.getLogger('jarvis')
+
+# Llamadas a la nube que provoca cada activación: Google STT (el "¿Señor?"
+# sale de la caché de frases precalentadas, no llama a Google TTS)
+CLOUD_CALLS_PER_TRIGGER = 1
+
+
+class WakeWordVerifier:
+    """Segunda etapa de verificación del wake word por similitud con plantillas"""
+
+    def __init__(self, data_file=None, threshold=None, max_templates=None, enroll_threshold=None):
+        self.data_file = data_file or Config.WAKE_VERIFY_FILE
+        self.threshold = Config.WAKE_VERIFY_THRESHOLD if threshold is None else threshold
+        self.enroll_threshold = Config.WAKE_VERIFY_ENROLL_THRESHOLD if enroll_threshold is None else enroll_threshold
+        self.max_templates = max_templates or Config.WAKE_VERIFY_MAX_TEMPLATES
+        self.templates = []
+        self.last_score = None
+        self.load_templates()
+
+    def load_templates(self):
+        """Carga las plantillas guardadas desde archivo"""
+        self.templates = []
+        if os.path.exists(self.data_file):
+            try:
+                with open(self.data_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.templates = [np.array(t, dtype=np.float32) for t in data.get('templates', [])]
+            except Exception as e:
+                print(f"⚠️ Error cargando plantillas de wake word: {e}")
+
+        if self.templates:
+            print(f"✅ {len(self.templates)} plantillas de wake word cargadas")
+        else:
+            # No se aprende sola: sin plantillas grabadas acepta todas las activaciones
+            log.warning("💡 Verificación del wake word inactiva hasta grabar plantillas: "
+                        "python wake_verifier.py jarvis1.wav ...")
+
+    def save_templates(self):
+        """Guarda las plantillas en archivo"""
+        try:
+            with open(self.data_file, 'w', encoding='utf-8') as f:
+                json.dump(
+                    {'templates': [[round(float(v), 5) for v in t] for t in self.templates]},
+                    f
+                )
+        except Exception as e:
+            log.error(f"❌ Error guardando plantillas de wake word: {e}")
+
+    def _embedding(self, pcm, sample_rate):
+        """Embedding del último tramo del audio (donde está el wake word)"""
+        samples = pcm_to_float(pcm)
+        window = int(Config.WAKE_VERIFY_WINDOW * sample_rate)
+        return fixed_length_embedding(samples[-window:], sample_rate)
+
+    def score(self, pcm, sample_rate=16000):
+        """
+        Similitud máxima del audio con las plantillas
+
+        Returns:
+            float: Similitud coseno (-1 a 1), o None si no hay plantillas
+        """
+        if not self.templates:
+            return None
+
+        embedding = self._embedding(pcm, sample_rate)
+        return float(np.max(np.stack(self.templates) @ embedding))
+
+    def verify(self, pcm, sample_rate=16000):
+        """
+        Decide si una activación de Porcupine es un wake word real
+
+        Args:
+            pcm: Audio (bytes int16) que termina en el wake word
+            sample_rate: Frecuencia de muestreo
+
+        Returns:
+            bool: True si se acepta la activación
+        """
+        metrics.inc('wake.triggers')
+
+        score = self.score(pcm, sample_rate)
+        self.last_score = score
+        if score is None:
+            # Sin plantillas todavía: aceptar todo
+            return True
+
+        if score >= self.threshold:
+            metrics.inc('wake.accepted')
+            return True
+
+        log.info(f"🚫 Activación descartada (similitud {score:.2f} < {self.threshold:.2f})")
+        metrics.inc('wake.rejected')
+        metrics.inc('wake.cloud_calls_saved', CLOUD_CALLS_PER_TRIGGER)
+        return False
+
+    def enroll(self, pcm, sample_rate=16000):
+        """
+        Añade una plantilla a partir de una activación confirmada
+
+        Args:
+            pcm: Audio (bytes int16) que termina en el wake word
+        """
+        self.templates.append(self._embedding(pcm, sample_rate).astype(np.float32))
+
+        # Conservar solo las plantillas más recientes
+        if len(self.templates) > self.max_templates:
+            self.templates = self.templates[-self.max_templates:]
+
+        self.save_templates()
+
+    def enroll_confirmed(self, pcm, score, sample_rate=16000):
+        """
+        Aprende de una activación confirmada por la transcripción
+
+        Solo si su similitud ya era alta: sin plantillas (score None) o con
+        una similitud justa no se añade nada.
+
+        Args:
+            pcm: Audio (bytes int16) que termina en el wake word
+            score: Similitud que obtuvo en verify()
+
+        Returns:
+            bool: True si se ha añadido como plantilla
+        """
+        if score is None or score < self.enroll_threshold:
+            return False
+        self.enroll(pcm, sample_rate)
+        metrics.inc('wake.enrolled')
+        return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python wake_verifier.py jarvis1.wav [jarvis2.wav ...]")
+        sys.exit(1)
+
+    verifier = WakeWordVerifier()
+    for path in sys.argv[1:]:
+        with wave.open(path, 'rb') as wf:
+            verifier.enroll(wf.readframes(wf.getnframes()), wf.getframerate())
+        print(f"✅ Plantilla añadida: {path}")